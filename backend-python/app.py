@@ -3,12 +3,16 @@ HUY CINEMA - Full-stack Python Flask Server
 Sử dụng OOP với các Class theo Class Diagram
 """
 
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import (
+    Flask, render_template, request, redirect, url_for, session, flash,
+    Response, stream_with_context, g
+)
 from flask_cors import CORS
 from functools import wraps
-import sqlite3
 import hashlib
 import os
+import time
+import uuid
 from datetime import datetime
 
 # Import các class từ models
@@ -16,13 +20,50 @@ from models import (
     Admin, Phim, PhongChieu, SuatChieu, Ghe, 
     KhachHang, Ve, DatCho, get_db
 )
+from cache import danh_muc, nguoi_dung, trang as cache_trang_html
+import counters
+import db
+import idempotency
+import metrics
+import migrations
+import movie_search
+import revenue
+import seat_api
+from pagination import KICH_THUOC_TRANG, KICH_THUOC_TRANG_TOI_DA
+from seat_events import bang_tin_ghe
+from seat_map import so_do_ghe, tra_ghe_cua_ve
+from waiting_room import phong_cho
 
 app = Flask(__name__)
 app.secret_key = 'huy-cinema-secret-key-2025'
 CORS(app)
 
-# Database path - using models.py
-DB_PATH = os.path.join(os.path.dirname(__file__), 'database.db')
+# Trả kết nối DB về pool khi kết thúc request
+db.init_app(app)
+
+# Database path - using db.py
+DB_PATH = db.DB_PATH
+
+# ===== METRICS =====
+@app.before_request
+def bat_dau_do_request():
+    """Ghi thời điểm bắt đầu và gắn route cho các câu lệnh SQL của request (xem metrics.py)"""
+    if metrics.BAT:
+        g._bat_dau_request = time.perf_counter()
+        metrics.dat_route(request.endpoint or 'unmatched')
+
+@app.after_request
+def ghi_so_lieu_request(response):
+    bat_dau = g.pop('_bat_dau_request', None)
+    if bat_dau is not None:
+        metrics.ghi_request(request.endpoint or 'unmatched', request.method, response.status_code,
+                            time.perf_counter() - bat_dau)
+    return response
+
+@app.teardown_request
+def ket_thuc_do_request(exc=None):
+    # Với response stream (SSE) chạy khi stream kết thúc
+    metrics.dat_route(None)
 
 # ===== DECORATORS =====
 def login_required(f):
@@ -46,8 +87,59 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def khach_hang_hien_tai():
+    """
+    Khách hàng đang đăng nhập: đọc một lần mỗi request (qua cache người dùng) rồi giữ
+    trong g, các route và model dùng lại đối tượng này thay vì đọc lại bảng users
+    """
+    if 'khach_hang' not in g:
+        g.khach_hang = KhachHang.tim_theo_id(session['user_id']) if 'user_id' in session else None
+    return g.khach_hang
+
+def trang_thai_dang_nhap():
+    """Biến thể navbar của trang: 'anon', 'user' hoặc 'admin'"""
+    if 'user_id' not in session:
+        return 'anon'
+    return 'admin' if session.get('is_admin') else 'user'
+
+def cache_trang(f):
+    """
+    Cache trang HTML theo (route, tham số, query string, trạng thái đăng nhập, phiên bản
+    danh mục). Gửi ETag mạnh (hash nội dung) + Last-Modified; request lặp lại có
+    If-None-Match khớp được trả 304 mà không chạm database. Trang có flash message
+    hoặc không phải 200 (vd. redirect) không được cache.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get('_flashes'):
+            return f(*args, **kwargs)
+        
+        phien_ban = danh_muc.phien_ban
+        khoa = (request.endpoint, tuple(sorted(kwargs.items())), request.query_string,
+                trang_thai_dang_nhap(), phien_ban)
+        muc = cache_trang_html.doc(khoa)
+        if muc is None:
+            response = app.make_response(f(*args, **kwargs))
+            if response.status_code != 200 or session.get('_flashes'):
+                return response
+            body = response.get_data()
+            muc = (body, response.mimetype, hashlib.sha256(body).hexdigest()[:32],
+                   datetime.now().replace(microsecond=0).astimezone())
+            cache_trang_html.ghi(khoa, muc, cache_trang_html.phien_ban)
+        
+        body, mimetype, etag, lan_sua = muc
+        response = Response(body, mimetype=mimetype)
+        response.set_etag(etag)
+        response.last_modified = lan_sua
+        # Nội dung phụ thuộc cookie đăng nhập: trình duyệt tự lưu nhưng phải hỏi lại mỗi lần
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response.make_conditional(request)
+    return decorated_function
+
 # ===== PUBLIC ROUTES =====
 @app.route('/')
+@cache_trang
 def index():
     # Sử dụng class Phim
     phim_list = Phim.lay_tat_ca()
@@ -63,6 +155,7 @@ def search():
     return render_template('index.html', movies=movies, query=query)
 
 @app.route('/movie/<int:movie_id>')
+@cache_trang
 def movie_detail(movie_id):
     # Sử dụng class Phim và SuatChieu
     phim = Phim.tim_theo_id(movie_id)
@@ -136,52 +229,118 @@ def logout():
 
 # ===== HELPER FUNCTIONS =====
 def giai_phong_ghe_het_han():
-    """Tự động giải phóng các ghế đã hết thời gian giữ"""
+    """
+    Dọn các ghế giữ đã hết hạn còn sót trong DB từ lần chạy trước (gọi lúc khởi động).
+    Khi server đang chạy, bộ hẹn giờ trong seat_map giải phóng ghế đúng lúc hết hạn.
+    """
     conn = get_db()
     now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
     
-    # Giải phóng ghế đã hết hạn giữ
-    conn.execute('''
+    # Giải phóng ghế đã hết hạn giữ (suất chiếu lưu ghế thưa: xóa dòng ghế)
+    so_ghe = conn.execute('''
+        DELETE FROM seats
+        WHERE status = 'held' AND held_until < ?
+        AND showtime_id IN (SELECT id FROM showtimes WHERE seat_rows IS NOT NULL)
+    ''', (now,)).rowcount
+    so_ghe += conn.execute('''
         UPDATE seats 
         SET status = 'available', held_by = NULL, held_until = NULL
         WHERE status = 'held' AND held_until < ?
-    ''', (now,))
+    ''', (now,)).rowcount
     
     conn.commit()
     conn.close()
+    return so_ghe
+
+# Phút gần nhất huy_ve_qua_gio() đã chạy trong tiến trình này
+_lan_chay_huy_ve = None
 
 def huy_ve_qua_gio():
-    """Tự động hủy các vé đã quá giờ chiếu"""
-    conn = get_db()
+    """
+    Tự động hủy các vé đã quá giờ chiếu.
+    Chỉ xử lý các suất chiếu vừa qua giờ kể từ mốc lần trước (lưu trong job_state),
+    dựa trên index showtimes(show_date, show_time), nên chi phí không tăng theo lịch sử.
+    Thêm hoặc dời suất chiếu về trước mốc sẽ lùi mốc (SuatChieu.lui_moc_huy_ve).
+    Trả về số dòng đã chạm tới: {'suat_chieu', 've', 'ghe'}.
+    """
+    global _lan_chay_huy_ve
     now = datetime.now()
     current_date = now.strftime('%Y-%m-%d')
     current_time = now.strftime('%H:%M')
+    ket_qua = {'suat_chieu': 0, 've': 0, 'ghe': 0}
     
-    # Tìm và hủy các vé có suất chiếu đã qua
-    expired_bookings = conn.execute('''
-        UPDATE bookings 
-        SET status = 'expired'
-        WHERE status = 'confirmed' 
-        AND showtime_id IN (
-            SELECT id FROM showtimes 
-            WHERE show_date < ? 
-            OR (show_date = ? AND show_time < ?)
-        )
-    ''', (current_date, current_date, current_time)).rowcount
+    # Mốc chỉ đổi theo phút: cùng phút với lần trước thì không có suất chiếu nào mới qua giờ
+    if _lan_chay_huy_ve == (current_date, current_time):
+        return ket_qua
     
-    # Cập nhật ghế về trạng thái available
-    conn.execute('''
-        UPDATE seats 
-        SET status = 'available'
-        WHERE id IN (
-            SELECT seat_id FROM bookings 
-            WHERE status = 'expired'
-        )
-    ''')
+    conn = get_db()
+    conn.isolation_level = 'IMMEDIATE'
     
-    conn.commit()
-    conn.close()
-    return expired_bookings
+    try:
+        moc = conn.execute(
+            "SELECT value FROM job_state WHERE name = 'huy_ve_qua_gio'"
+        ).fetchone()
+        moc_date, moc_time = moc['value'].split(' ') if moc else ('', '')
+        
+        # Các suất chiếu có giờ chiếu trong [mốc cũ, bây giờ)
+        suat_chieu = {r['id']: (r['movie_id'], r['show_date']) for r in conn.execute('''
+            SELECT id, movie_id, show_date FROM showtimes 
+            WHERE (show_date, show_time) >= (?, ?)
+            AND (show_date, show_time) < (?, ?)
+        ''', (moc_date, moc_time, current_date, current_time))}
+        showtime_ids = list(suat_chieu)
+        
+        # Chia lô để không vượt giới hạn số tham số của SQLite ở lần chạy đầu tiên
+        ve_het_han = []
+        for i in range(0, len(showtime_ids), 500):
+            lo = showtime_ids[i:i + 500]
+            # Tìm và hủy các vé có suất chiếu vừa qua
+            expired = conn.execute(f'''
+                UPDATE bookings 
+                SET status = 'expired'
+                WHERE status = 'confirmed' 
+                AND showtime_id IN ({','.join('?' * len(lo))})
+                RETURNING seat_id, showtime_id, seat_number, price
+            ''', lo).fetchall()
+            ket_qua['ve'] += len(expired)
+            counters.cong(conn, tong_ve_dat=-len(expired),
+                          tong_doanh_thu=-sum(r['price'] or 0 for r in expired))
+            # Trừ khỏi bảng tổng hợp theo (phim, ngày chiếu)
+            tru = {}
+            for r in expired:
+                khoa = suat_chieu[r['showtime_id']]
+                so_ve, tien = tru.get(khoa, (0, 0))
+                tru[khoa] = (so_ve + 1, tien + (r['price'] or 0))
+            for (maphim, ngay), (so_ve, tien) in tru.items():
+                revenue.cong(conn, maphim, ngay, ve_ban=-so_ve, doanh_thu=-tien)
+            ve_het_han.extend(expired)
+        
+        # Cập nhật ghế của các vé vừa hết hạn về trạng thái available
+        ket_qua['ghe'] = tra_ghe_cua_ve(conn, ve_het_han)
+        ket_qua['suat_chieu'] = len(showtime_ids)
+        
+        # Đọc mốc ở trên chưa nằm trong transaction ghi: nếu một suất chiếu vừa lùi mốc
+        # trong lúc quét thì giữ mốc đã lùi để lần sau quét lại
+        conn.execute('''
+            INSERT INTO job_state (name, value) VALUES ('huy_ve_qua_gio', ?)
+            ON CONFLICT(name) DO UPDATE SET value = excluded.value WHERE job_state.value IS ?
+        ''', (f'{current_date} {current_time}', moc['value'] if moc else None))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    
+    _lan_chay_huy_ve = (current_date, current_time)
+    
+    # Sơ đồ ghế trong bộ nhớ của các suất chiếu này không còn đúng
+    for showtime_id in showtime_ids:
+        so_do_ghe.xoa(showtime_id)
+    
+    if showtime_ids:
+        app.logger.info('huy_ve_qua_gio: %(suat_chieu)d suất chiếu, %(ve)d vé, %(ghe)d ghế', ket_qua)
+    return ket_qua
 
 def kiem_tra_suat_chieu_hop_le(showtime_id):
     """Kiểm tra xem suất chiếu có còn hợp lệ để đặt vé không"""
@@ -205,8 +364,12 @@ def kiem_tra_suat_chieu_hop_le(showtime_id):
 @app.route('/booking/<int:showtime_id>')
 @login_required
 def booking(showtime_id):
-    # Giải phóng ghế hết hạn và hủy vé quá giờ
-    giai_phong_ghe_het_han()
+    # Suất chiếu đông người: hết lượt chọn ghế thì vào trang chờ (không chạm database)
+    trang_thai = phong_cho.vao(showtime_id, session['user_id'])
+    if not trang_thai['admitted']:
+        return render_template('waiting_room.html', showtime_id=showtime_id, queue=trang_thai)
+    
+    # Hủy vé quá giờ (ghế hết hạn giữ do bộ hẹn giờ nền giải phóng)
     huy_ve_qua_gio()
     
     # Kiểm tra suất chiếu còn hợp lệ không
@@ -218,83 +381,76 @@ def booking(showtime_id):
     suat_chieu = result
     phim = Phim.tim_theo_id(suat_chieu.maphim)
     
-    # Lấy danh sách ghế với thông tin held_by
-    conn = get_db()
-    seats_data = conn.execute('''
-        SELECT id, seat_number, status, held_by, held_until, showtime_id
-        FROM seats WHERE showtime_id = ? ORDER BY seat_number
-    ''', (showtime_id,)).fetchall()
-    conn.close()
+    # Lấy danh sách ghế với thông tin held_by từ sơ đồ ghế trong bộ nhớ
+    so_do = so_do_ghe.lay(showtime_id)
+    seats_data = so_do.danh_sach() if so_do else []
     
     user_id = session.get('user_id')
-    seats = []
-    for s in seats_data:
-        seat_dict = {
-            'id': s['id'],
-            'seat_number': s['seat_number'],
-            'status': s['status'],
-            'showtime_id': s['showtime_id'],
-            'held_by': s['held_by'],
-            'is_held_by_me': s['held_by'] == user_id if s['status'] == 'held' else False
-        }
-        seats.append(seat_dict)
+    seats = [seat_api.dinh_dang_ghe(s, user_id) for s in seats_data]
     
     showtime = suat_chieu.to_dict()
     movie = phim.to_dict() if phim else {}
     
-    return render_template('booking.html', showtime=showtime, movie=movie, seats=seats)
+    # Khóa chống lặp cho form đặt vé: bấm đặt nhiều lần hay gửi lại form chỉ đặt một lần
+    return render_template('booking.html', showtime=showtime, movie=movie, seats=seats,
+                           idempotency_key=uuid.uuid4().hex)
+
+@app.route('/api/waiting-room/<int:showtime_id>')
+@login_required
+def waiting_room(showtime_id):
+    """Trang chờ hỏi vị trí và thời gian chờ ước tính; admitted=true thì chuyển sang trang đặt vé"""
+    from flask import jsonify
+    
+    du_lieu, ma = seat_api.phong_cho_suat_chieu(showtime_id, session.get('user_id'))
+    response = jsonify(du_lieu)
+    response.headers['Cache-Control'] = 'no-store'
+    return response, ma
+
+@app.route('/api/waiting-room/<int:showtime_id>/leave', methods=['POST'])
+@login_required
+def leave_waiting_room(showtime_id):
+    """Rời hàng chờ hoặc trả lượt chọn ghế (rời trang đặt vé) để người sau được vào"""
+    from flask import jsonify
+    
+    phong_cho.roi(showtime_id, session.get('user_id'))
+    return jsonify({'success': True})
 
 # ===== SEAT HOLDING API =====
+# Xử lý nằm trong seat_api, dùng chung với chế độ ASGI (seat_api_async.py)
+
+def du_lieu_json():
+    """
+    Body JSON của API ghế: không phải JSON thì get_json() trả 415, JSON hỏng 400;
+    JSON không phải object coi như rỗng (như chế độ ASGI)
+    """
+    du_lieu = request.get_json()
+    return du_lieu if isinstance(du_lieu, dict) else {}
+
+def du_lieu_giu_ghe():
+    """Body JSON của API giữ ghế, gộp header Idempotency-Key (nếu có) vào idempotency_key"""
+    du_lieu = du_lieu_json()
+    khoa = request.headers.get('Idempotency-Key')
+    if khoa is not None:
+        du_lieu['idempotency_key'] = khoa
+    return du_lieu
+
 @app.route('/api/hold-seat', methods=['POST'])
 @login_required
 def hold_seat():
     """API giữ ghế tạm thời khi user chọn"""
     from flask import jsonify
     
-    data = request.get_json()
-    seat_id = data.get('seat_id')
-    showtime_id = data.get('showtime_id')
-    user_id = session.get('user_id')
-    
-    if not seat_id or not showtime_id:
-        return jsonify({'success': False, 'message': 'Thiếu thông tin ghế'}), 400
-    
-    # Giải phóng ghế hết hạn trước
-    giai_phong_ghe_het_han()
-    
-    conn = get_db()
-    conn.isolation_level = 'IMMEDIATE'
+    du_lieu, ma = seat_api.giu_ghe(du_lieu_giu_ghe(), session.get('user_id'))
+    return jsonify(du_lieu), ma
+
+@app.route('/api/hold-seats', methods=['POST'])
+@login_required
+def hold_seats():
+    """API giữ nhiều ghế trong một transaction (mode = 'all' hoặc 'best_effort')"""
+    from flask import jsonify
     
-    try:
-        # Kiểm tra ghế có available không (hoặc đang được chính user này giữ)
-        seat = conn.execute('''
-            SELECT * FROM seats 
-            WHERE id = ? AND showtime_id = ? 
-            AND (status = 'available' OR (status = 'held' AND held_by = ?))
-        ''', (seat_id, showtime_id, user_id)).fetchone()
-        
-        if not seat:
-            conn.close()
-            return jsonify({'success': False, 'message': 'Ghế đã được người khác chọn'}), 409
-        
-        # Giữ ghế trong 5 phút
-        from datetime import timedelta
-        held_until = (datetime.now() + timedelta(minutes=5)).strftime('%Y-%m-%d %H:%M:%S')
-        
-        conn.execute('''
-            UPDATE seats 
-            SET status = 'held', held_by = ?, held_until = ?
-            WHERE id = ? AND (status = 'available' OR (status = 'held' AND held_by = ?))
-        ''', (user_id, held_until, seat_id, user_id))
-        
-        conn.commit()
-        conn.close()
-        return jsonify({'success': True, 'message': 'Đã giữ ghế', 'held_until': held_until})
-        
-    except Exception as e:
-        conn.rollback()
-        conn.close()
-        return jsonify({'success': False, 'message': str(e)}), 500
+    du_lieu, ma = seat_api.giu_nhieu_ghe(du_lieu_giu_ghe(), session.get('user_id'))
+    return jsonify(du_lieu), ma
 
 @app.route('/api/release-seat', methods=['POST'])
 @login_required
@@ -302,54 +458,51 @@ def release_seat():
     """API bỏ giữ ghế khi user bỏ chọn"""
     from flask import jsonify
     
-    data = request.get_json()
-    seat_id = data.get('seat_id')
-    user_id = session.get('user_id')
-    
-    if not seat_id:
-        return jsonify({'success': False, 'message': 'Thiếu thông tin ghế'}), 400
-    
-    conn = get_db()
-    
-    # Chỉ cho phép bỏ ghế do chính user đang giữ
-    conn.execute('''
-        UPDATE seats 
-        SET status = 'available', held_by = NULL, held_until = NULL
-        WHERE id = ? AND held_by = ?
-    ''', (seat_id, user_id))
-    
-    conn.commit()
-    conn.close()
-    
-    return jsonify({'success': True, 'message': 'Đã bỏ giữ ghế'})
+    du_lieu, ma = seat_api.bo_giu_ghe(du_lieu_json(), session.get('user_id'))
+    return jsonify(du_lieu), ma
 
 @app.route('/api/get-seats/<int:showtime_id>')
 @login_required
 def get_seats(showtime_id):
-    """API lấy trạng thái ghế realtime"""
+    """
+    API lấy trạng thái ghế realtime (dự phòng khi trình duyệt không dùng được SSE).
+    ?since=<version>, ?format=compact và &layout=0: xem seat_api.lay_ghe
+    """
     from flask import jsonify
     
-    # Giải phóng ghế hết hạn trước
-    giai_phong_ghe_het_han()
+    du_lieu, ma = seat_api.lay_ghe(
+        showtime_id, session.get('user_id'), since=request.args.get('since'),
+        dinh_dang=request.args.get('format'), bo_cuc=request.args.get('layout')
+    )
+    if du_lieu is None:
+        return '', ma, {'Cache-Control': 'no-store'}
     
+    response = jsonify(du_lieu)
+    response.headers['Cache-Control'] = 'no-store'
+    return response, ma
+
+@app.route('/api/seat-stream/<int:showtime_id>')
+@login_required
+def seat_stream(showtime_id):
+    """
+    Server-Sent Events: gửi ảnh chụp ghế một lần rồi chỉ đẩy các ghế đổi trạng thái.
+    Người xem không thao tác không tạo truy vấn DB nào.
+    """
     user_id = session.get('user_id')
-    conn = get_db()
-    seats_data = conn.execute('''
-        SELECT id, seat_number, status, held_by
-        FROM seats WHERE showtime_id = ? ORDER BY seat_number
-    ''', (showtime_id,)).fetchall()
-    conn.close()
+    last_event_id = request.headers.get('Last-Event-ID')
     
-    seats = []
-    for s in seats_data:
-        seats.append({
-            'id': s['id'],
-            'seat_number': s['seat_number'],
-            'status': s['status'],
-            'is_held_by_me': s['held_by'] == user_id if s['status'] == 'held' else False
-        })
+    def stream():
+        phien_ban, thay_doi = seat_api.tiep_tuc_sse(showtime_id, last_event_id)
+        
+        while True:
+            phien_ban, khung = seat_api.khung_sse(showtime_id, user_id, phien_ban, thay_doi)
+            yield khung
+            phien_ban, thay_doi = bang_tin_ghe.cho(showtime_id, phien_ban, seat_api.SSE_KEEPALIVE)
     
-    return jsonify({'seats': seats})
+    return Response(stream_with_context(stream()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
 
 @app.route('/book', methods=['POST'])
 @login_required
@@ -361,29 +514,56 @@ def book_seat():
         flash('Vui lòng chọn ít nhất một ghế.', 'warning')
         return redirect(url_for('booking', showtime_id=showtime_id))
     
-    # Kiểm tra lại suất chiếu trước khi đặt
-    hop_le, result = kiem_tra_suat_chieu_hop_le(int(showtime_id))
-    if not hop_le:
-        flash(result, 'error')
-        return redirect(url_for('index'))
+    user_id = session['user_id']
     
-    # Sử dụng class KhachHang
-    khach_hang = KhachHang.tim_theo_id(session['user_id'])
-    if khach_hang:
+    def dat_ve():
+        """(thông báo, loại, chuyển tới, lưu cho lần gửi lại hay không)"""
+        # Chỉ người đang có lượt trong phòng chờ mới được đặt
+        if not phong_cho.vao(int(showtime_id), user_id)['admitted']:
+            return ('Suất chiếu đang có nhiều người đặt vé, vui lòng chờ đến lượt.', 'warning',
+                    url_for('booking', showtime_id=showtime_id), False)
+        
+        # Kiểm tra lại suất chiếu trước khi đặt
+        hop_le, result = kiem_tra_suat_chieu_hop_le(int(showtime_id))
+        if not hop_le:
+            return result, 'error', url_for('index'), False
+        
+        # Sử dụng class KhachHang
+        khach_hang = khach_hang_hien_tai()
+        if not khach_hang:
+            return 'Không tìm thấy thông tin khách hàng.', 'error', url_for('my_bookings'), False
+        
         so_ghe_yeu_cau = len(seat_ids)
         ve_list = khach_hang.dat_ve(int(showtime_id), [int(sid) for sid in seat_ids])
         
         if len(ve_list) == 0:
-            flash('Không thể đặt vé. Các ghế đã được người khác đặt trước.', 'error')
-            return redirect(url_for('booking', showtime_id=showtime_id))
-        elif len(ve_list) < so_ghe_yeu_cau:
-            flash(f'Chỉ đặt được {len(ve_list)}/{so_ghe_yeu_cau} ghế. Một số ghế đã được người khác đặt trước.', 'warning')
-        else:
-            flash(f'Đặt vé thành công! Đã đặt {len(ve_list)} ghế.', 'success')
-    else:
-        flash('Không tìm thấy thông tin khách hàng.', 'error')
+            return ('Không thể đặt vé. Các ghế đã được người khác đặt trước.', 'error',
+                    url_for('booking', showtime_id=showtime_id), True)
+        
+        # Đặt xong: trả lượt chọn ghế cho người đang xếp hàng
+        phong_cho.roi(int(showtime_id), user_id)
+        if len(ve_list) < so_ghe_yeu_cau:
+            return (f'Chỉ đặt được {len(ve_list)}/{so_ghe_yeu_cau} ghế. Một số ghế đã được người khác đặt trước.',
+                    'warning', url_for('my_bookings'), True)
+        return f'Đặt vé thành công! Đã đặt {len(ve_list)} ghế.', 'success', url_for('my_bookings'), True
+    
+    # Form gửi lại cùng khóa (mạng chập chờn, bấm đặt nhiều lần) nhận kết quả lần đầu,
+    # không đặt lại; lần gửi trùng đến khi lần đầu chưa xong thì chờ lần đầu
+    khoa = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+    try:
+        thong_bao, loai, chuyen_toi, _ = idempotency.kho_chong_lap.thuc_hien(
+            ('book', user_id), khoa, (showtime_id, sorted(seat_ids)), dat_ve,
+            nen_luu=lambda ket_qua: ket_qua[3]
+        )
+    except (idempotency.KhoaKhongHopLe, idempotency.KhoaKhongKhop):
+        flash('Yêu cầu đặt vé không hợp lệ, vui lòng chọn ghế lại.', 'error')
+        return redirect(url_for('booking', showtime_id=showtime_id))
+    except idempotency.KhoaDangXuLy:
+        flash('Đơn đặt vé đang được xử lý, vui lòng kiểm tra lại sau.', 'warning')
+        return redirect(url_for('my_bookings'))
     
-    return redirect(url_for('my_bookings'))
+    flash(thong_bao, loai)
+    return redirect(chuyen_toi)
 
 @app.route('/my-bookings')
 @login_required
@@ -424,7 +604,7 @@ def cancel_booking(booking_id):
 @login_required
 def account():
     # Sử dụng class KhachHang
-    khach_hang = KhachHang.tim_theo_id(session['user_id'])
+    khach_hang = khach_hang_hien_tai()
     user = khach_hang.to_dict() if khach_hang else {}
     return render_template('account.html', user=user)
 
@@ -436,7 +616,7 @@ def update_profile():
     phone = request.form.get('phone')
     
     # Sử dụng class KhachHang
-    khach_hang = KhachHang.tim_theo_id(session['user_id'])
+    khach_hang = khach_hang_hien_tai()
     if khach_hang:
         khach_hang.cap_nhat_thong_tin(email=email, ten=full_name, sdt=phone)
         flash('Cập nhật thông tin thành công!', 'success')
@@ -455,28 +635,16 @@ def change_password():
         return redirect(url_for('account'))
     
     # Sử dụng class KhachHang
-    khach_hang = KhachHang.tim_theo_id(session['user_id'])
+    khach_hang = khach_hang_hien_tai()
     if not khach_hang:
         flash('Không tìm thấy tài khoản.', 'error')
         return redirect(url_for('account'))
     
-    # Kiểm tra mật khẩu hiện tại
-    conn = get_db()
-    user = conn.execute(
-        'SELECT * FROM users WHERE id = ? AND password = ?',
-        (session['user_id'], KhachHang.hash_password(current))
-    ).fetchone()
-    
-    if not user:
+    # Mật khẩu hiện tại được kiểm tra trong câu UPDATE của doi_mat_khau
+    if not khach_hang.doi_mat_khau(current, new):
         flash('Mật khẩu hiện tại không đúng.', 'error')
-        conn.close()
         return redirect(url_for('account'))
     
-    conn.execute('UPDATE users SET password = ? WHERE id = ?', 
-                (KhachHang.hash_password(new), session['user_id']))
-    conn.commit()
-    conn.close()
-    
     flash('Đổi mật khẩu thành công!', 'success')
     return redirect(url_for('account'))
 
@@ -491,34 +659,119 @@ def admin():
     phim_list = Phim.lay_tat_ca()
     movies = [p.to_dict() for p in phim_list]
     
-    conn = get_db()
-    showtimes = conn.execute('''
-        SELECT s.*, m.title FROM showtimes s
-        JOIN movies_info m ON s.movie_id = m.id
-        ORDER BY s.show_date DESC
-    ''').fetchall()
-    
-    bookings = conn.execute('''
-        SELECT b.*, u.username, m.title, se.seat_number, st.show_date
-        FROM bookings b
-        JOIN users u ON b.user_id = u.id
-        JOIN showtimes st ON b.showtime_id = st.id
-        JOIN movies_info m ON st.movie_id = m.id
-        JOIN seats se ON b.seat_id = se.id
-        ORDER BY b.booking_time DESC
-    ''').fetchall()
-    
-    khach_hang_list = KhachHang.lay_tat_ca()
-    users = [kh.to_dict() for kh in khach_hang_list]
-    conn.close()
+    # Suất chiếu, đặt vé, người dùng được tải theo trang qua /api/admin/* khi mở tab
     
     # Thống kê tổng quan (sử dụng class Admin)
     admin_user = Admin(session['username'], '')
     stats = admin_user.xem_thong_ke_tong_quan()
-    top_phim = admin_user.lay_top_phim_doanh_thu(10)
     
-    return render_template('admin.html', movies=movies, showtimes=showtimes, 
-                          bookings=bookings, users=users, stats=stats, top_phim=top_phim)
+    # Tab doanh thu lọc theo khoảng ngày chiếu (?from=&to=), đọc từ bảng revenue_daily
+    khoang_ngay, tong_khoang = None, None
+    try:
+        tu_ngay, den_ngay = doc_khoang_ngay()
+    except ValueError:
+        flash('Ngày không hợp lệ.', 'error')
+        tu_ngay = den_ngay = None
+    if tu_ngay or den_ngay:
+        khoang_ngay = {'from': tu_ngay or '', 'to': den_ngay or ''}
+        ngay_list = admin_user.lay_doanh_thu_theo_ngay(tu_ngay, den_ngay)
+        tong_khoang = {
+            'so_ve_ban': sum(d['so_ve_ban'] for d in ngay_list),
+            'doanh_thu': sum(d['doanh_thu'] for d in ngay_list)
+        }
+    top_phim = admin_user.lay_top_phim_doanh_thu(10, tu_ngay, den_ngay)
+    
+    return render_template('admin.html', movies=movies, stats=stats, top_phim=top_phim,
+                           khoang_ngay=khoang_ngay, tong_khoang=tong_khoang)
+
+def doc_khoang_ngay():
+    """Khoảng ngày ?from=&to= (YYYY-MM-DD, có thể bỏ trống); ValueError nếu không hợp lệ"""
+    khoang = []
+    for ten in ('from', 'to'):
+        ngay = request.args.get(ten) or None
+        if ngay:
+            datetime.strptime(ngay, '%Y-%m-%d')
+        khoang.append(ngay)
+    return tuple(khoang)
+
+def doc_tham_so_trang():
+    """Tham số chung của các API danh sách admin; ValueError nếu không hợp lệ"""
+    gioi_han = request.args.get('limit', KICH_THUOC_TRANG, type=int)
+    if not 1 <= gioi_han <= KICH_THUOC_TRANG_TOI_DA:
+        raise ValueError(f'limit phải từ 1 đến {KICH_THUOC_TRANG_TOI_DA}')
+    
+    tu_ngay, den_ngay = doc_khoang_ngay()
+    return {'con_tro': request.args.get('cursor'), 'gioi_han': gioi_han,
+            'tu_ngay': tu_ngay, 'den_ngay': den_ngay}
+
+def tra_trang(lay_trang, **loc):
+    """Gọi hàm lay_trang_admin của model và trả JSON {items, next_cursor}"""
+    from flask import jsonify
+    
+    try:
+        items, con_tro_sau = lay_trang(**doc_tham_so_trang(), **loc)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'items': items, 'next_cursor': con_tro_sau})
+
+@app.route('/api/admin/bookings')
+@admin_required
+def admin_api_bookings():
+    """Danh sách vé theo trang: ?cursor, limit, from, to (ngày đặt), movie_id, status"""
+    return tra_trang(Ve.lay_trang_admin,
+                     maphim=request.args.get('movie_id', type=int),
+                     trangthai=request.args.get('status') or None)
+
+@app.route('/api/admin/showtimes')
+@admin_required
+def admin_api_showtimes():
+    """Danh sách suất chiếu theo trang: ?cursor, limit, from, to (ngày chiếu), movie_id"""
+    return tra_trang(SuatChieu.lay_trang_admin, maphim=request.args.get('movie_id', type=int))
+
+@app.route('/api/admin/users')
+@admin_required
+def admin_api_users():
+    """Danh sách người dùng theo trang: ?cursor, limit, from, to (ngày tạo), q (tiền tố username)"""
+    return tra_trang(KhachHang.lay_trang_admin, tu_khoa=request.args.get('q') or None)
+
+@app.route('/api/admin/revenue')
+@admin_required
+def admin_api_revenue():
+    """Doanh thu theo ngày chiếu và top phim trong khoảng ngày: ?from, to (ngày chiếu), movie_id, limit"""
+    from flask import jsonify
+    
+    try:
+        tu_ngay, den_ngay = doc_khoang_ngay()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Ngày phải có dạng YYYY-MM-DD'}), 400
+    gioi_han = min(max(request.args.get('limit', 10, type=int), 1), KICH_THUOC_TRANG_TOI_DA)
+    
+    admin_user = Admin(session['username'], '')
+    return jsonify({
+        'days': admin_user.lay_doanh_thu_theo_ngay(tu_ngay, den_ngay, request.args.get('movie_id', type=int)),
+        'top_movies': admin_user.lay_top_phim_doanh_thu(gioi_han, tu_ngay, den_ngay)
+    })
+
+@app.route('/admin/cache-stats')
+@admin_required
+def admin_cache_stats():
+    """Số lần trúng/trượt của các cache (danh mục, người dùng, trang), để chọn kích thước và TTL"""
+    from flask import jsonify
+    
+    return jsonify({'caches': [danh_muc.thong_ke(), nguoi_dung.thong_ke(), cache_trang_html.thong_ke()]})
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """
+    Số liệu cho Prometheus (text format 0.0.4): request theo route, thời gian SQLite theo
+    route và hàm gọi, chờ pool/khóa ghi, pool kết nối, cache. Chỉ cho admin hoặc request
+    gửi thẳng từ localhost (request qua reverse proxy có X-Forwarded-For không tính)
+    """
+    tu_localhost = request.remote_addr in ('127.0.0.1', '::1') and 'X-Forwarded-For' not in request.headers
+    if not tu_localhost and not session.get('is_admin'):
+        return 'Forbidden', 403
+    
+    return Response(metrics.xuat(), headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
 
 @app.route('/admin/add-movie', methods=['POST'])
 @admin_required
@@ -610,6 +863,46 @@ def admin_add_showtime():
     flash('Đã thêm suất chiếu với 50 ghế!', 'success')
     return redirect(url_for('admin'))
 
+@app.route('/api/admin/showtimes/bulk', methods=['POST'])
+@admin_required
+def admin_api_bulk_showtimes():
+    """
+    Xếp lịch hàng loạt. JSON: {movie_id, theaters: [...], from, to, times: ["HH:MM", ...],
+    price, weekdays: [0-6] (tùy chọn, 0 = thứ Hai)}.
+    Trả về số suất chiếu/ghế đã tạo, các suất bị bỏ qua vì trùng và thời gian xử lý.
+    """
+    from flask import jsonify
+    
+    data = request.get_json(silent=True) or {}
+    try:
+        if not data.get('movie_id'):
+            raise ValueError('Thiếu movie_id')
+        try:
+            khung_gio = sorted({datetime.strptime(gio, '%H:%M').strftime('%H:%M') for gio in data.get('times') or []})
+        except (TypeError, ValueError):
+            raise ValueError('Giờ chiếu phải có dạng HH:MM')
+        danh_sach_phong = list(dict.fromkeys(p.strip() for p in data.get('theaters') or [] if p and p.strip()))
+        thu_trong_tuan = data.get('weekdays')
+        if thu_trong_tuan is not None:
+            thu_trong_tuan = {int(thu) for thu in thu_trong_tuan}
+            if not thu_trong_tuan <= set(range(7)):
+                raise ValueError('weekdays phải trong khoảng 0-6')
+        ket_qua = SuatChieu.xep_lich_hang_loat(
+            maphim=int(data.get('movie_id')),
+            danh_sach_phong=danh_sach_phong,
+            tu_ngay=data.get('from') or '',
+            den_ngay=data.get('to') or data.get('from') or '',
+            khung_gio=khung_gio,
+            giave=float(data.get('price') or 75000),
+            thu_trong_tuan=thu_trong_tuan
+        )
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    app.logger.info('xep_lich_hang_loat: %(showtimes)d suất chiếu, %(capacity)d chỗ ngồi, '
+                    '%(seats)d dòng ghế, %(elapsed_ms).1f ms', ket_qua)
+    return jsonify({'success': True, **ket_qua}), 201
+
 @app.route('/admin/delete-showtime/<int:showtime_id>', methods=['POST'])
 @admin_required
 def admin_delete_showtime(showtime_id):
@@ -634,101 +927,8 @@ def admin_cancel_booking(booking_id):
 def init_db():
     conn = get_db()
     
-    # Create tables
-    conn.executescript('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE NOT NULL,
-            email TEXT,
-            password TEXT NOT NULL,
-            full_name TEXT,
-            phone TEXT,
-            is_admin INTEGER DEFAULT 0,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-        
-        CREATE TABLE IF NOT EXISTS movies_info (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            genre TEXT,
-            duration INTEGER,
-            poster_url TEXT,
-            trailer_url TEXT,
-            description TEXT,
-            director TEXT,
-            cast_members TEXT
-        );
-        
-        CREATE TABLE IF NOT EXISTS theaters (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            seat_rows INTEGER DEFAULT 5,
-            seats_per_row INTEGER DEFAULT 10,
-            total_seats INTEGER DEFAULT 50
-        );
-        
-        CREATE TABLE IF NOT EXISTS showtimes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            movie_id INTEGER,
-            theater TEXT,
-            show_date TEXT,
-            show_time TEXT,
-            price REAL DEFAULT 75000,
-            FOREIGN KEY (movie_id) REFERENCES movies_info(id)
-        );
-        
-        CREATE TABLE IF NOT EXISTS seats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            showtime_id INTEGER,
-            seat_number TEXT,
-            status TEXT DEFAULT 'available',
-            held_by INTEGER DEFAULT NULL,
-            held_until TEXT DEFAULT NULL,
-            FOREIGN KEY (showtime_id) REFERENCES showtimes(id),
-            FOREIGN KEY (held_by) REFERENCES users(id)
-        );
-        
-        CREATE TABLE IF NOT EXISTS bookings (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            showtime_id INTEGER,
-            seat_id INTEGER,
-            seat_number TEXT,
-            price REAL,
-            status TEXT DEFAULT 'confirmed',
-            booking_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (showtime_id) REFERENCES showtimes(id),
-            FOREIGN KEY (seat_id) REFERENCES seats(id)
-        );
-    ''')
-
-    # Ensure columns exist for older databases
-    try:
-        conn.execute('ALTER TABLE movies_info ADD COLUMN trailer_url TEXT')
-    except sqlite3.OperationalError:
-        pass
-    
-    try:
-        conn.execute('ALTER TABLE movies_info ADD COLUMN director TEXT')
-    except sqlite3.OperationalError:
-        pass
-    
-    try:
-        conn.execute('ALTER TABLE movies_info ADD COLUMN cast_members TEXT')
-    except sqlite3.OperationalError:
-        pass
-    
-    # Thêm cột held_by và held_until cho bảng seats (migration)
-    try:
-        conn.execute('ALTER TABLE seats ADD COLUMN held_by INTEGER DEFAULT NULL')
-    except sqlite3.OperationalError:
-        pass
-    
-    try:
-        conn.execute('ALTER TABLE seats ADD COLUMN held_until TEXT DEFAULT NULL')
-    except sqlite3.OperationalError:
-        pass
+    # Tạo/nâng cấp schema (không làm gì nếu đã ở phiên bản mới nhất)
+    migrations.nang_cap(conn)
     
     # Check if data exists - kiểm tra CẢ users VÀ movies để tránh lặp
     users_count = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
@@ -762,6 +962,7 @@ def init_db():
                 conn.execute('INSERT INTO movies_info (title, genre, duration, poster_url, trailer_url, director, cast_members) VALUES (?, ?, ?, ?, ?, ?, ?)', m)
             else:
                 conn.execute('INSERT INTO movies_info (title, genre, duration, poster_url, trailer_url) VALUES (?, ?, ?, ?, ?)', m)
+        movie_search.dung_lai_chi_muc(conn)
         
         # Add sample showtimes
         showtimes_data = [
@@ -772,17 +973,14 @@ def init_db():
             (4, 'Rạp 2', '2025-12-16', '20:00', 85000),
         ]
         
-        for st in showtimes_data:
-            cursor = conn.execute('INSERT INTO showtimes (movie_id, theater, show_date, show_time, price) VALUES (?, ?, ?, ?, ?)', st)
-            showtime_id = cursor.lastrowid
-            
-            # Create seats
-            for row in ['A', 'B', 'C', 'D', 'E']:
-                for num in range(1, 11):
-                    conn.execute('INSERT INTO seats (showtime_id, seat_number, status) VALUES (?, ?, "available")',
-                               (showtime_id, f'{row}{num}'))
+        # Thêm suất chiếu cùng ghế theo bố cục phòng chiếu
+        SuatChieu.chen_suat_chieu(conn, showtimes_data)
         
+        # Dữ liệu mẫu được chèn trực tiếp: tính lại bộ đếm
+        counters.ghi_de(conn, counters.tinh_tu_dau(conn))
+        revenue.xay_lai(conn)
         conn.commit()
+        danh_muc.xoa_tat_ca()
         print('✅ Database initialized with sample data!')
     
     conn.close()
@@ -790,6 +988,7 @@ def init_db():
 # ===== RUN =====
 if __name__ == '__main__':
     init_db()
+    giai_phong_ghe_het_han()
     
     print('''
 ╔═══════════════════════════════════════════════════════════╗
@@ -0,0 +1,117 @@
+"""
+Benchmark: thời gian giữ lock ghi (BEGIN IMMEDIATE -> COMMIT) của KhachHang.dat_ve theo số ghế
+
+So sánh cách cũ (SELECT + UPDATE + INSERT cho từng ghế) với cách gộp hiện tại
+(một UPDATE có điều kiện + một INSERT nhiều dòng), và cách gộp trên suất chiếu lưu ghế
+thưa (INSERT ... ON CONFLICT cho ghế chưa có dòng). Cách cũ đọc ghế theo seats.id nên
+chỉ chạy trên suất chiếu lưu ghế đầy đủ.
+
+Chạy:  python benchmarks/bench_dat_ve.py --repeat 20
+"""
+
+import argparse
+import sqlite3
+import statistics
+import threading
+import time
+
+from common import tao_db_tam, tao_suat_chieu_sap_toi
+
+import db
+import models
+import seat_map
+
+
+class DoThoiGianLock:
+    """Đo khoảng BEGIN -> COMMIT/ROLLBACK trên các connection mở sau khi bật"""
+
+    def __init__(self):
+        self.thoi_gian = []
+        self._bat_dau = threading.local()
+        self._connect_goc = sqlite3.connect
+
+    def _trace(self, sql):
+        lenh = sql.lstrip().upper()
+        if lenh.startswith('BEGIN'):
+            self._bat_dau.t = time.perf_counter()
+        elif lenh.startswith(('COMMIT', 'ROLLBACK')) and getattr(self._bat_dau, 't', None):
+            self.thoi_gian.append(time.perf_counter() - self._bat_dau.t)
+            self._bat_dau.t = None
+
+    def bat(self):
+        connect_goc = self._connect_goc
+
+        def connect(*args, **kwargs):
+            conn = connect_goc(*args, **kwargs)
+            conn.set_trace_callback(self._trace)
+            return conn
+
+        sqlite3.connect = connect
+        db.cau_hinh()
+        return self
+
+    def tat(self):
+        sqlite3.connect = self._connect_goc
+
+
+def dat_ve_tung_ghe(khach_hang, masuatchieu, danh_sach_ghe):
+    """Cách đặt vé cũ: mỗi ghế một SELECT, một UPDATE và một INSERT trong transaction"""
+    suat_chieu = models.SuatChieu.tim_theo_id(masuatchieu)
+    conn = models.get_db()
+    conn.isolation_level = 'IMMEDIATE'
+    for maghe in danh_sach_ghe:
+        ghe_row = conn.execute('''
+            SELECT * FROM seats
+            WHERE id = ? AND (status = "available" OR (status = "held" AND held_by = ?))
+        ''', (maghe, khach_hang.maKH)).fetchone()
+        if ghe_row:
+            result = conn.execute('''
+                UPDATE seats SET status = "booked", held_by = NULL, held_until = NULL
+                WHERE id = ? AND (status = "available" OR (status = "held" AND held_by = ?))
+            ''', (maghe, khach_hang.maKH))
+            if result.rowcount > 0:
+                conn.execute('''
+                    INSERT INTO bookings (user_id, showtime_id, seat_id, seat_number, price, status)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (khach_hang.maKH, masuatchieu, ghe_row['id'], ghe_row['seat_number'],
+                      suat_chieu.giave, 'confirmed'))
+    conn.commit()
+    conn.close()
+
+
+def do(ham, khach_hang, so_ghe, repeat, che_do='dense'):
+    """Thời gian giữ lock (ms) của mỗi lần đặt so_ghe ghế trên một suất chiếu mới"""
+    seat_map.CHE_DO_LUU_GHE = che_do
+    dong_ho = DoThoiGianLock().bat()
+    ket_qua = []
+    for _ in range(repeat):
+        masuatchieu = tao_suat_chieu_sap_toi()
+        ghe = [g.maghe for g in models.Ghe.lay_theo_suat_chieu(masuatchieu)[:so_ghe]]
+        dong_ho.thoi_gian.clear()
+        ham(khach_hang, masuatchieu, ghe)
+        ket_qua.append(dong_ho.thoi_gian[-1] * 1000)
+    dong_ho.tat()
+    return ket_qua
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tao_db_tam()
+    khach_hang = models.KhachHang.tim_theo_id(2)
+
+    def dat_ve(kh, st, ds):
+        return kh.dat_ve(st, ds)
+
+    print(f'{"số ghế":>7} | {"từng ghế (ms)":>14} | {"gộp (ms)":>9} | {"gộp, thưa (ms)":>15}')
+    for so_ghe in (1, 2, 5, 10, 20, 50):
+        cu = statistics.median(do(dat_ve_tung_ghe, khach_hang, so_ghe, args.repeat))
+        moi = statistics.median(do(dat_ve, khach_hang, so_ghe, args.repeat))
+        thua = statistics.median(do(dat_ve, khach_hang, so_ghe, args.repeat, 'sparse'))
+        print(f'{so_ghe:>7} | {cu:>14.3f} | {moi:>9.3f} | {thua:>15.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark: băng thông và thời gian xử lý của vòng poll /api/get-seats mỗi giây
+
+So sánh poll toàn bộ sơ đồ ghế (cách cũ) với poll có ?since=<version>
+(304 khi không đổi, chỉ ghế đổi khi có thay đổi), trên suất chiếu yên tĩnh và
+suất chiếu có một ghế đổi trạng thái sau mỗi --doi-moi lần poll.
+
+Chạy:  python benchmarks/bench_get_seats.py --polls 2000
+"""
+
+import argparse
+import time
+
+from common import tao_db_tam, tao_suat_chieu_sap_toi
+
+import models
+
+
+def poll(client, showtime_id, so_lan, dung_version, doi_moi, khach_hang):
+    """Trả về (tổng byte body, thời gian ms mỗi request)"""
+    ghe = [g.maghe for g in models.Ghe.lay_theo_suat_chieu(showtime_id)]
+    version, tong_byte = None, 0
+    bat_dau = time.perf_counter()
+    for lan in range(so_lan):
+        if doi_moi and lan % doi_moi == 0:
+            maghe = ghe[(lan // doi_moi) % len(ghe)]
+            so_do = models.so_do_ghe.lay(showtime_id)
+            if so_do.giu_ghe(maghe, khach_hang)[0]:
+                so_do.bo_giu_ghe(maghe, khach_hang)
+        url = f'/api/get-seats/{showtime_id}'
+        if dung_version and version:
+            url += f'?since={version}'
+        response = client.get(url)
+        tong_byte += len(response.data)
+        if response.status_code == 200:
+            version = response.get_json()['version']
+    return tong_byte, (time.perf_counter() - bat_dau) * 1000 / so_lan
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--polls', type=int, default=2000)
+    parser.add_argument('--doi-moi', type=int, default=10)
+    args = parser.parse_args()
+
+    tao_db_tam()
+    import app
+    client = app.app.test_client()
+    client.post('/login', data={'username': 'user1', 'password': '123456'})
+
+    print(f'{args.polls} lần poll, 50 ghế')
+    print(f'{"kịch bản":<28} | {"KB (toàn bộ)":>12} | {"KB (since)":>10} | {"ms/req":>13}')
+    for ten, doi_moi in (('yên tĩnh', 0), (f'1 ghế đổi / {args.doi_moi} poll', args.doi_moi)):
+        showtime_id = tao_suat_chieu_sap_toi()
+        cu, ms_cu = poll(client, showtime_id, args.polls, False, doi_moi, 1)
+        moi, ms_moi = poll(client, showtime_id, args.polls, True, doi_moi, 1)
+        print(f'{ten:<28} | {cu / 1024:>12.1f} | {moi / 1024:>10.1f} | {ms_cu:>5.3f} -> {ms_moi:.3f}'
+              f'   ({100 - moi * 100 / cu:.1f}% ít byte hơn)')
+
+
+if __name__ == '__main__':
+    main()
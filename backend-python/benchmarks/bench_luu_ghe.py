@@ -0,0 +1,129 @@
+"""
+Benchmark: lưu ghế đầy đủ (mỗi suất chiếu một dòng cho từng ghế) so với lưu thưa (chỉ ghế
+đã giữ/đặt, bố cục lấy từ rạp)
+
+Mỗi chế độ dùng một database mới: xếp lịch một năm cho các rạp (chia lô tối đa
+SO_SUAT_CHIEU_HANG_LOAT_TOI_DA suất), đặt một phần ghế của vài suất chiếu, rồi đo
+kích thước bảng seats, kích thước file sau VACUUM và thời gian đọc sơ đồ ghế.
+
+Chạy:  python benchmarks/bench_luu_ghe.py --days 365 --theaters 3 --slots 5
+"""
+
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from common import tao_db_tam
+
+import models
+import seat_map
+from seat_map import SoDoGhe, so_do_ghe
+
+
+def xep_lich_ca_nam(so_ngay, danh_sach_phong, khung_gio):
+    """Xếp lịch so_ngay ngày theo từng lô, trả về (ms, danh sách id suất chiếu)"""
+    so_ngay_moi_lo = max(1, models.SO_SUAT_CHIEU_HANG_LOAT_TOI_DA
+                         // (len(danh_sach_phong) * len(khung_gio)))
+    bat_dau = datetime(2031, 1, 1)
+    ma, tong_ms = [], 0.0
+    for dau in range(0, so_ngay, so_ngay_moi_lo):
+        cuoi = min(dau + so_ngay_moi_lo, so_ngay) - 1
+        ket_qua = models.SuatChieu.xep_lich_hang_loat(
+            1, danh_sach_phong, (bat_dau + timedelta(days=dau)).strftime('%Y-%m-%d'),
+            (bat_dau + timedelta(days=cuoi)).strftime('%Y-%m-%d'), khung_gio
+        )
+        tong_ms += ket_qua['elapsed_ms']
+        ma += ket_qua['ids']
+    return tong_ms, ma
+
+
+def dat_mot_phan(ngau_nhien, danh_sach_suat, ti_le):
+    """Đặt ti_le số ghế của từng suất chiếu trong danh_sach_suat qua KhachHang.dat_ve"""
+    khach_hang = models.KhachHang.dang_nhap('user1', '123456')
+    so_ve = 0
+    for ma in danh_sach_suat:
+        trong = [g['id'] for g in so_do_ghe.lay(ma).danh_sach() if g['status'] == 'available']
+        so_ve += len(khach_hang.dat_ve(ma, ngau_nhien.sample(trong, int(len(trong) * ti_le))))
+    return so_ve
+
+
+def kich_thuoc(duong_dan):
+    """(byte của bảng seats + index, byte cả file sau VACUUM)"""
+    conn = models.get_db()
+    try:
+        bang_seats = conn.execute('''
+            SELECT COALESCE(SUM(pgsize), 0) FROM dbstat
+            WHERE name = 'seats' OR name IN (SELECT name FROM sqlite_master WHERE tbl_name = 'seats')
+        ''').fetchone()[0]
+    except Exception:
+        bang_seats = None  # SQLite build không có dbstat
+    conn.close()
+    conn = models.get_db()
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    conn.isolation_level = None
+    conn.execute('VACUUM')
+    conn.close()
+    return bang_seats, os.path.getsize(duong_dan)
+
+
+def do_doc_so_do(danh_sach_suat, repeat):
+    """Median ms của SoDoGhe.doc_db trên danh_sach_suat"""
+    thoi_gian = []
+    for _ in range(repeat):
+        bat_dau = time.perf_counter()
+        for ma in danh_sach_suat:
+            SoDoGhe.doc_db(ma)
+        thoi_gian.append((time.perf_counter() - bat_dau) * 1000 / len(danh_sach_suat))
+    return statistics.median(thoi_gian)
+
+
+def chay(che_do, args):
+    seat_map.CHE_DO_LUU_GHE = che_do
+    duong_dan = tao_db_tam()
+    danh_sach_phong = [f'Rạp {i + 1}' for i in range(args.theaters)]
+    khung_gio = [f'{9 + 3 * i:02d}:00' for i in range(args.slots)]
+
+    ms_xep_lich, ma = xep_lich_ca_nam(args.days, danh_sach_phong, khung_gio)
+    ngau_nhien = random.Random(1)
+    mau = ngau_nhien.sample(ma, min(args.booked_showtimes, len(ma)))
+    so_ve = dat_mot_phan(ngau_nhien, mau, args.fill)
+
+    conn = models.get_db()
+    so_dong = conn.execute('SELECT COUNT(*) FROM seats').fetchone()[0]
+    conn.close()
+    byte_seats, byte_file = kich_thuoc(duong_dan)
+    ms_doc = do_doc_so_do(mau[:50], args.repeat)
+    # Chế độ sau dùng database mới với cùng mã suất chiếu: bỏ sơ đồ đã nạp khỏi bộ nhớ
+    for masuatchieu in mau:
+        so_do_ghe.xoa(masuatchieu)
+    return {
+        'che_do': che_do, 'suat': len(ma), 've': so_ve, 'dong_seats': so_dong,
+        'mb_seats': byte_seats / 2 ** 20 if byte_seats is not None else float('nan'),
+        'mb_file': byte_file / 2 ** 20, 'ms_xep_lich': ms_xep_lich, 'ms_doc': ms_doc,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--theaters', type=int, default=3)
+    parser.add_argument('--slots', type=int, default=5)
+    parser.add_argument('--booked-showtimes', type=int, default=200)
+    parser.add_argument('--fill', type=float, default=0.3, help='tỉ lệ ghế được đặt ở các suất có vé')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    ket_qua = [chay(che_do, args) for che_do in ('dense', 'sparse')]
+    print(f'{ket_qua[0]["suat"]} suất chiếu, đặt {args.fill:.0%} ghế của {args.booked_showtimes} suất')
+    print(f'{"lưu ghế":<8} | {"vé":>6} | {"dòng seats":>10} | {"seats MB":>8} | {"file MB":>8} | '
+          f'{"xếp lịch ms":>11} | {"đọc sơ đồ ms":>12}')
+    for kq in ket_qua:
+        print(f'{kq["che_do"]:<8} | {kq["ve"]:>6} | {kq["dong_seats"]:>10} | {kq["mb_seats"]:>8.2f} | {kq["mb_file"]:>8.2f} | '
+              f'{kq["ms_xep_lich"]:>11.0f} | {kq["ms_doc"]:>12.3f}')
+
+
+if __name__ == '__main__':
+    main()
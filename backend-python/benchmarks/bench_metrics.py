@@ -0,0 +1,74 @@
+"""
+Benchmark: chi phí đo đạc metrics (metrics.py) trên request và câu lệnh SQL
+
+So sánh thời gian mỗi request (Flask test client, không qua mạng) và mỗi câu lệnh
+SELECT qua get_db() khi tắt metrics, bật metrics và bật thêm nhãn hàm gọi
+(CINEMA_METRICS_CALLER=1), rồi in các (route, hàm gọi) tốn thời gian SQLite nhất -
+cùng dữ liệu /metrics trả cho Prometheus.
+
+Chạy:  python benchmarks/bench_metrics.py --requests 500
+"""
+
+import argparse
+import time
+
+from common import tao_db_tam, tao_suat_chieu_sap_toi
+
+import db
+import metrics
+
+
+def do_request(client, duong_dan, so_lan):
+    bat_dau = time.perf_counter()
+    for _ in range(so_lan):
+        response = client.get(duong_dan)
+        assert response.status_code == 200, (duong_dan, response.status_code)
+    return (time.perf_counter() - bat_dau) / so_lan * 1e6
+
+
+def do_cau_lenh(so_lan):
+    conn = db.get_db()
+    bat_dau = time.perf_counter()
+    for i in range(so_lan):
+        conn.execute('SELECT id, title FROM movies_info WHERE id = ?', (i % 5 + 1,)).fetchone()
+    conn.close()
+    return (time.perf_counter() - bat_dau) / so_lan * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--statements', type=int, default=50000)
+    args = parser.parse_args()
+
+    tao_db_tam()
+    import app
+    showtime_id = tao_suat_chieu_sap_toi()
+    client = app.app.test_client()
+    client.post('/login', data={'username': 'user1', 'password': '123456'})
+    duong_dan = ['/movie/1', f'/booking/{showtime_id}', f'/api/get-seats/{showtime_id}', '/my-bookings']
+
+    # (metrics.BAT, metrics.THEO_HAM_GOI) của từng cột
+    che_do = [(False, False), (True, False), (True, True)]
+    print(f'{"":<28} | {"tắt µs":>9} | {"bật µs":>9} | {"chênh":>7} | {"+hàm gọi µs":>11} | {"chênh":>7}')
+    for ten, do in [(d, lambda d=d: do_request(client, d, args.requests)) for d in duong_dan] + \
+                   [('SELECT qua get_db()', lambda: do_cau_lenh(args.statements))]:
+        do()    # làm nóng cache, sơ đồ ghế
+        ket_qua = dict.fromkeys(che_do, float('inf'))
+        for _ in range(3):
+            for bat, theo_ham_goi in che_do:
+                metrics.BAT, metrics.THEO_HAM_GOI = bat, theo_ham_goi
+                ket_qua[bat, theo_ham_goi] = min(ket_qua[bat, theo_ham_goi], do())
+        tat, bat, ham_goi = (ket_qua[c] for c in che_do)
+        print(f'{ten:<28} | {tat:>9.1f} | {bat:>9.1f} | {(bat / tat - 1) * 100:>+6.1f}% | '
+              f'{ham_goi:>11.1f} | {(ham_goi / tat - 1) * 100:>+6.1f}%')
+
+    so_cau_lenh = metrics.sql_so_cau_lenh.doc()
+    thoi_gian = sorted(metrics.sql_thoi_gian.doc().items(), key=lambda muc: -muc[1])
+    print('\nThời gian SQLite theo (route, hàm gọi):')
+    for (route, ham_goi), giay in [muc for muc in thoi_gian if muc[0][1] != metrics.KHONG_RO][:10]:
+        print(f'  {route:<14} {ham_goi:<40} {so_cau_lenh.get((route, ham_goi), 0):>8} lệnh {giay * 1000:>9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
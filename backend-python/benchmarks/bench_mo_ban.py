@@ -0,0 +1,360 @@
+"""
+Benchmark: mở bán - N người dùng đồng thời tranh ghế của một suất chiếu hot
+
+Chạy Flask app (server werkzeug threaded, cùng tiến trình) trên database tạm. Mỗi người
+dùng là một thread với phiên đăng nhập riêng, lặp lại: poll /api/get-seats (gửi ?since),
+chọn ngẫu nhiên một ghế còn trống, /api/hold-seat, rồi /api/release-seat (bỏ chọn) hoặc
+POST /book - đến khi hết ghế hoặc hết thời gian. Với --slots, người không có lượt trong
+phòng chờ (giữ ghế bị 429) hỏi /api/waiting-room đến khi được vào.
+
+Báo cáo p50/p95/p99 độ trễ từng endpoint, throughput, số lỗi 'database is locked', tỉ lệ
+xung đột (giữ/đặt ghế người khác vừa lấy) và số vi phạm toàn vẹn sau khi chạy (một ghế
+hai vé, ghế đã đặt không có vé, vé không có ghế đã đặt, sơ đồ ghế trong bộ nhớ lệch DB).
+Kết quả ghi ra file JSON để so sánh giữa các lần chạy (--compare <file cũ>).
+
+Client và server cùng một tiến trình Python nên số liệu tuyệt đối thấp hơn khi chạy
+thật; dùng để so sánh giữa các lần chạy trên cùng máy.
+
+Chạy:  python benchmarks/bench_mo_ban.py --users 50 --seconds 20
+       python benchmarks/bench_mo_ban.py --users 50 --compare benchmarks/results/mo_ban-<...>.json
+       python benchmarks/bench_mo_ban.py --users 200 --slots 20
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import sqlite3
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from urllib.parse import urlencode
+
+from common import chay_server, dang_nhap, tao_db_tam, tao_suat_chieu_sap_toi
+
+import db
+import models
+import seat_map
+import waiting_room
+from seat_map import SoDoGhe, so_do_ghe
+
+THU_MUC_KET_QUA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+ENDPOINT = ('get-seats', 'hold-seat', 'release-seat', 'book', 'waiting-room')
+
+
+class KetQua:
+    """Gom số đo của mọi người dùng (an toàn đa luồng)"""
+
+    def __init__(self):
+        self._khoa = threading.Lock()
+        self.do_tre = defaultdict(list)       # endpoint -> [ms]
+        self.ma_http = defaultdict(Counter)   # endpoint -> {status: n}
+        self.dem = Counter()                  # giu_ok, giu_xung_dot, dat_ok, dat_xung_dot, ...
+        self.loi_khoa_db = 0
+
+    def ghi(self, endpoint, ma, ms, body=b''):
+        with self._khoa:
+            self.do_tre[endpoint].append(ms)
+            self.ma_http[endpoint][ma] += 1
+            if ma >= 500 and b'database is locked' in body:
+                self.loi_khoa_db += 1
+
+    def cong(self, ten, so=1):
+        with self._khoa:
+            self.dem[ten] += so
+
+
+class NguoiDung:
+    """Một người dùng mô phỏng với cookie phiên và trạng thái ghế đã poll"""
+
+    def __init__(self, port, cookie, showtime_id, ket_qua, args, seed):
+        self.port = port
+        self.cookie = cookie
+        self.showtime_id = showtime_id
+        self.ket_qua = ket_qua
+        self.args = args
+        self.ngau_nhien = random.Random(seed)
+        self.phien_ban = None
+        self.ghe = {}
+        self.conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+    def goi(self, endpoint, phuong_thuc, duong_dan, body=None, headers=None):
+        headers = dict(headers or {}, Cookie=self.cookie)
+        bat_dau = time.perf_counter()
+        try:
+            self.conn.request(phuong_thuc, duong_dan, body=body, headers=headers)
+            response = self.conn.getresponse()
+            noi_dung = response.read()
+        except (ConnectionError, http.client.HTTPException):
+            # Server đóng kết nối keep-alive: mở lại và thử một lần
+            self.conn.close()
+            self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+            self.conn.request(phuong_thuc, duong_dan, body=body, headers=headers)
+            response = self.conn.getresponse()
+            noi_dung = response.read()
+        ms = (time.perf_counter() - bat_dau) * 1000
+        cookie_moi = response.getheader('Set-Cookie')
+        if cookie_moi and cookie_moi.startswith('session='):
+            self.cookie = cookie_moi.split(';')[0]
+        self.ket_qua.ghi(endpoint, response.status, ms, noi_dung)
+        return response, noi_dung
+
+    def poll(self):
+        duong_dan = f'/api/get-seats/{self.showtime_id}'
+        if self.phien_ban:
+            duong_dan += f'?since={self.phien_ban}'
+        response, noi_dung = self.goi('get-seats', 'GET', duong_dan)
+        if response.status != 200:
+            return
+        du_lieu = json.loads(noi_dung)
+        if du_lieu['full']:
+            self.ghe = {}
+        for ghe in du_lieu['seats']:
+            self.ghe[ghe['id']] = ghe['status']
+        self.phien_ban = du_lieu['version']
+
+    def gui_json(self, endpoint, duong_dan, du_lieu):
+        return self.goi(endpoint, 'POST', duong_dan, json.dumps(du_lieu), {'Content-Type': 'application/json'})
+
+    def cho_den_luot(self, het_gio, het_ghe):
+        """Hỏi phòng chờ như trang chờ (nhưng dày hơn retry_after) đến khi được vào"""
+        bat_dau = time.perf_counter()
+        while time.monotonic() < het_gio and not het_ghe.is_set():
+            response, noi_dung = self.goi('waiting-room', 'GET', f'/api/waiting-room/{self.showtime_id}')
+            if response.status == 200 and json.loads(noi_dung)['admitted']:
+                break
+            time.sleep(0.1)
+        self.ket_qua.cong('cho_ms', (time.perf_counter() - bat_dau) * 1000)
+
+    def chay(self, het_gio, het_ghe):
+        while time.monotonic() < het_gio and not het_ghe.is_set():
+            for _ in range(self.args.polls):
+                self.poll()
+            trong = [maghe for maghe, trang_thai in self.ghe.items() if trang_thai == 'available']
+            if not trong:
+                if self.ghe and all(tt == 'booked' for tt in self.ghe.values()):
+                    het_ghe.set()
+                time.sleep(self.args.think / 1000)
+                continue
+
+            maghe = self.ngau_nhien.choice(trong)
+            response, noi_dung = self.gui_json('hold-seat', '/api/hold-seat',
+                                               {'seat_id': maghe, 'showtime_id': self.showtime_id})
+            if response.status == 409:
+                self.ket_qua.cong('giu_xung_dot')
+                continue
+            if response.status == 429:
+                self.ket_qua.cong('giu_cho')
+                self.cho_den_luot(het_gio, het_ghe)
+                continue
+            if response.status != 200:
+                self.ket_qua.cong('giu_loi')
+                continue
+            self.ket_qua.cong('giu_ok')
+
+            time.sleep(self.ngau_nhien.uniform(0, self.args.think) / 1000)
+            if self.ngau_nhien.random() < self.args.release_rate:
+                self.gui_json('release-seat', '/api/release-seat',
+                              {'seat_id': maghe, 'showtime_id': self.showtime_id})
+                continue
+
+            response, _ = self.goi('book', 'POST', '/book', urlencode(
+                {'showtime_id': self.showtime_id, 'seat_ids': maghe}
+            ), {'Content-Type': 'application/x-www-form-urlencoded'})
+            vi_tri = response.getheader('Location') or ''
+            if response.status == 302 and vi_tri.endswith('/my-bookings'):
+                self.ket_qua.cong('dat_ok')
+            elif response.status == 302 and '/booking/' in vi_tri:
+                self.ket_qua.cong('dat_xung_dot')
+            else:
+                self.ket_qua.cong('dat_loi')
+        self.conn.close()
+
+
+def phan_vi(danh_sach, p):
+    if not danh_sach:
+        return None
+    return round(danh_sach[min(len(danh_sach) - 1, int(len(danh_sach) * p))], 3)
+
+
+def kiem_tra_toan_ven(showtime_id):
+    """Các vi phạm sau khi chạy: đọc thẳng từ DB và so với sơ đồ ghế trong bộ nhớ"""
+    ve = Counter()
+    conn = models.get_db()
+    for row in conn.execute('''
+        SELECT seat_number FROM bookings WHERE showtime_id = ? AND status IN ('confirmed', 'paid')
+    ''', (showtime_id,)):
+        ve[row['seat_number']] += 1
+    conn.close()
+    trong_db = SoDoGhe.doc_db(showtime_id)
+    da_dat = {g['seat_number'] for g in trong_db if g['status'] == 'booked'}
+
+    so_do = so_do_ghe.lay(showtime_id)
+    trong_bo_nho = {(g['id'], g['status'], g['held_by']) for g in so_do.danh_sach()} if so_do else set()
+    return {
+        'double_booked': sum(1 for so_ve in ve.values() if so_ve > 1),
+        'booked_without_ticket': len(da_dat - set(ve)),
+        'ticket_without_booked_seat': len(set(ve) - da_dat),
+        'seat_map_mismatch': len(trong_bo_nho ^ {(g['id'], g['status'], g['held_by']) for g in trong_db}),
+    }, len(da_dat), len(trong_db)
+
+
+def phien_ban_git():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def tong_hop(args, ket_qua, giay, vi_pham, da_ban, tong_ghe, loi_server):
+    tong_request = sum(len(v) for v in ket_qua.do_tre.values())
+    endpoint = {}
+    for ten in ENDPOINT:
+        do_tre = sorted(ket_qua.do_tre.get(ten, []))
+        endpoint[ten] = {
+            'count': len(do_tre),
+            'rps': round(len(do_tre) / giay, 1),
+            'p50_ms': phan_vi(do_tre, 0.50),
+            'p95_ms': phan_vi(do_tre, 0.95),
+            'p99_ms': phan_vi(do_tre, 0.99),
+            'max_ms': round(do_tre[-1], 3) if do_tre else None,
+            'status': {str(k): v for k, v in sorted(ket_qua.ma_http[ten].items())},
+        }
+    dem = ket_qua.dem
+    so_giu = dem['giu_ok'] + dem['giu_xung_dot'] + dem['giu_loi'] + dem['giu_cho']
+    so_dat = dem['dat_ok'] + dem['dat_xung_dot'] + dem['dat_loi']
+    return {
+        'benchmark': 'mo_ban',
+        'time': datetime.now().isoformat(timespec='seconds'),
+        'git': phien_ban_git(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('out', 'compare')},
+        'env': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'seat_storage': seat_map.CHE_DO_LUU_GHE,
+            'db_pool_size': db.POOL_SIZE,
+        },
+        'duration_s': round(giay, 3),
+        'requests': tong_request,
+        'throughput_rps': round(tong_request / giay, 1),
+        'endpoints': endpoint,
+        'holds': {'attempts': so_giu, 'ok': dem['giu_ok'], 'conflicts': dem['giu_xung_dot'],
+                  'errors': dem['giu_loi'], 'conflict_rate': round(dem['giu_xung_dot'] / so_giu, 4) if so_giu else 0},
+        'waiting_room': {'queued': dem['giu_cho'],
+                         'avg_wait_ms': round(dem['cho_ms'] / dem['giu_cho'], 1) if dem['giu_cho'] else 0},
+        'books': {'attempts': so_dat, 'ok': dem['dat_ok'], 'conflicts': dem['dat_xung_dot'],
+                  'errors': dem['dat_loi'], 'conflict_rate': round(dem['dat_xung_dot'] / so_dat, 4) if so_dat else 0},
+        'db_locked_errors': ket_qua.loi_khoa_db + loi_server['locked'],
+        'server_errors': loi_server['tat_ca'],
+        'seats_total': tong_ghe,
+        'seats_sold': da_ban,
+        'violations': vi_pham,
+    }
+
+
+def in_bao_cao(bao_cao, cu=None):
+    print(f'{bao_cao["config"]["users"]} người dùng, {bao_cao["duration_s"]:.1f} s, '
+          f'{bao_cao["requests"]} request ({bao_cao["throughput_rps"]} req/s), '
+          f'bán {bao_cao["seats_sold"]}/{bao_cao["seats_total"]} ghế')
+    print(f'{"endpoint":<13} | {"số":>6} | {"req/s":>7} | {"p50 ms":>8} | {"p95 ms":>8} | {"p99 ms":>8}'
+          + (f' | {"p99 cũ":>8}' if cu else ''))
+    for ten, e in bao_cao['endpoints'].items():
+        dong = (f'{ten:<13} | {e["count"]:>6} | {e["rps"]:>7} | {e["p50_ms"] or 0:>8.2f} | '
+                f'{e["p95_ms"] or 0:>8.2f} | {e["p99_ms"] or 0:>8.2f}')
+        if cu:
+            dong += f' | {cu["endpoints"].get(ten, {}).get("p99_ms") or 0:>8.2f}'
+        print(dong)
+    for ten in ('holds', 'books'):
+        g = bao_cao[ten]
+        print(f'{ten:<6}: {g["attempts"]} lần, {g["ok"]} thành công, {g["conflicts"]} xung đột '
+              f'({g["conflict_rate"]:.1%}), {g["errors"]} lỗi')
+    cho = bao_cao.get('waiting_room') or {}
+    if cho.get('queued'):
+        print(f'phòng chờ: {cho["queued"]} lần phải xếp hàng, chờ trung bình {cho["avg_wait_ms"]:.0f} ms')
+    print(f'database is locked: {bao_cao["db_locked_errors"]}, lỗi server: {bao_cao["server_errors"]}')
+    print(f'vi phạm: {bao_cao["violations"]}')
+    if cu:
+        print(f'so với {cu["time"]} ({cu.get("git")}): throughput {cu["throughput_rps"]} -> '
+              f'{bao_cao["throughput_rps"]} req/s, locked {cu["db_locked_errors"]} -> {bao_cao["db_locked_errors"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=20, help='dừng sớm hơn nếu bán hết ghế')
+    parser.add_argument('--rows', type=int, default=10, help='số hàng ghế của phòng chiếu (tối đa 26)')
+    parser.add_argument('--cols', type=int, default=20, help='số ghế mỗi hàng')
+    parser.add_argument('--polls', type=int, default=2, help='số lần poll get-seats trước mỗi lần chọn ghế')
+    parser.add_argument('--think', type=float, default=50, help='thời gian suy nghĩ tối đa (ms)')
+    parser.add_argument('--release-rate', type=float, default=0.3, help='tỉ lệ bỏ chọn thay vì đặt')
+    parser.add_argument('--slots', type=int, default=waiting_room.SO_LUOT,
+                        help='số người chọn ghế cùng lúc trong phòng chờ (0 = tắt)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--out', help='file JSON kết quả (mặc định benchmarks/results/mo_ban-<thời gian>.json)')
+    parser.add_argument('--compare', help='file JSON của lần chạy trước để so sánh')
+    args = parser.parse_args()
+
+    tao_db_tam()
+    waiting_room.phong_cho.so_luot = args.slots
+    import app
+    from flask import got_request_exception
+
+    loi_server = Counter()
+
+    def ghi_loi(sender, exception, **extra):
+        loi_server['tat_ca'] += 1
+        if 'database is locked' in str(exception):
+            loi_server['locked'] += 1
+    got_request_exception.connect(ghi_loi, app.app)
+
+    # Phòng chiếu riêng cho suất chiếu hot với bố cục --rows x --cols
+    conn = models.get_db()
+    conn.execute('INSERT INTO theaters (name, seat_rows, seats_per_row, total_seats) VALUES (?, ?, ?, ?)',
+                 ('Rạp mở bán', args.rows, args.cols, args.rows * args.cols))
+    conn.commit()
+    conn.close()
+    showtime_id = tao_suat_chieu_sap_toi(maphong='Rạp mở bán')
+    for i in range(args.users):
+        models.KhachHang.dang_ky(f'rush{i}', 'pw')
+    server, port = chay_server(app.app)
+
+    ket_qua = KetQua()
+    nguoi_dung = [NguoiDung(port, dang_nhap(port, f'rush{i}', 'pw'), showtime_id, ket_qua, args, args.seed + i)
+                  for i in range(args.users)]
+    het_ghe = threading.Event()
+    het_gio = time.monotonic() + args.seconds
+    threads = [threading.Thread(target=nd.chay, args=(het_gio, het_ghe)) for nd in nguoi_dung]
+    bat_dau = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    giay = time.perf_counter() - bat_dau
+    server.shutdown()
+
+    vi_pham, da_ban, tong_ghe = kiem_tra_toan_ven(showtime_id)
+    bao_cao = tong_hop(args, ket_qua, giay, vi_pham, da_ban, tong_ghe, loi_server)
+
+    duong_dan = args.out or os.path.join(THU_MUC_KET_QUA, f'mo_ban-{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(os.path.abspath(duong_dan)), exist_ok=True)
+    with open(duong_dan, 'w', encoding='utf-8') as f:
+        json.dump(bao_cao, f, ensure_ascii=False, indent=2)
+
+    cu = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            cu = json.load(f)
+    in_bao_cao(bao_cao, cu)
+    print(f'→ {duong_dan}')
+    if any(vi_pham.values()):
+        raise SystemExit('✗ Có vi phạm toàn vẹn')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Benchmark: số người xem sơ đồ ghế (SSE /api/seat-stream) một tiến trình giữ được
+
+Chạy server trong một tiến trình con trên database tạm (chế độ ASGI seat_api_async.py
+với uvicorn, hoặc Flask/werkzeug threaded để so sánh), mở --viewers kết nối SSE tới
+cùng một suất chiếu, rồi giữ/bỏ giữ ghế qua /api/hold-seat và /api/release-seat và đo
+thời gian đến khi mọi người xem nhận được thay đổi. In số thread và RSS của server.
+
+Chạy:  python benchmarks/bench_nguoi_xem.py --viewers 5000 --rounds 5
+       python benchmarks/bench_nguoi_xem.py --server flask --viewers 1000
+"""
+
+import argparse
+import asyncio
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from common import dang_nhap, tao_db_tam, tao_suat_chieu_sap_toi
+
+THU_MUC = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Server Flask threaded trong tiến trình con (để so sánh)
+LENH_FLASK = '''
+import sys, logging
+from werkzeug.serving import make_server
+import app
+logging.getLogger('werkzeug').setLevel(logging.ERROR)
+make_server('127.0.0.1', int(sys.argv[1]), app.app, threaded=True).serve_forever()
+'''
+
+
+def cong_trong():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def chay_server(loai, duong_dan, port):
+    env = dict(os.environ, CINEMA_DB_PATH=duong_dan)
+    if loai == 'asgi':
+        lenh = [sys.executable, 'seat_api_async.py', '--host', '127.0.0.1', '--port', str(port)]
+    else:
+        lenh = [sys.executable, '-c', LENH_FLASK, str(port)]
+    tien_trinh = subprocess.Popen(lenh, cwd=THU_MUC, env=env, stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+            return tien_trinh
+        except OSError:
+            time.sleep(0.1)
+    tien_trinh.kill()
+    raise RuntimeError('Server không khởi động được')
+
+
+def thong_tin_tien_trinh(pid):
+    """(số thread, RSS MB) từ /proc"""
+    gia_tri = {}
+    with open(f'/proc/{pid}/status') as f:
+        for dong in f:
+            ten, _, con_lai = dong.partition(':')
+            gia_tri[ten] = con_lai.split()
+    return int(gia_tri['Threads'][0]), int(gia_tri['VmRSS'][0]) / 1024
+
+
+def goi_api(port, cookie, duong_dan, du_lieu):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.request('POST', duong_dan, body=json.dumps(du_lieu),
+                 headers={'Content-Type': 'application/json', 'Cookie': cookie})
+    response = conn.getresponse()
+    ket_qua = response.status, json.loads(response.read())
+    conn.close()
+    return ket_qua
+
+
+class NguoiXem:
+    """Một kết nối SSE, ghi lại thời điểm nhận ảnh chụp và các lần nhận thay đổi"""
+
+    def __init__(self):
+        self.da_ket_noi = asyncio.Event()
+        self.lan_nhan = []
+        self.loi = None
+
+    async def chay(self, port, cookie, showtime_id):
+        try:
+            reader, writer = await asyncio.open_connection('127.0.0.1', port, limit=2 ** 20)
+            writer.write((f'GET /api/seat-stream/{showtime_id} HTTP/1.1\r\nHost: localhost\r\n'
+                          f'Cookie: {cookie}\r\nAccept: text/event-stream\r\n\r\n').encode())
+            await writer.drain()
+            dong_trang_thai = await reader.readline()
+            if b' 200 ' not in dong_trang_thai:
+                raise RuntimeError(dong_trang_thai.decode().strip())
+            chunked = False
+            while (dong := await reader.readline()) not in (b'\r\n', b''):
+                chunked |= dong.lower().startswith(b'transfer-encoding: chunked')
+
+            bo_dem = b''
+            while True:
+                if chunked:
+                    kich_thuoc = int((await reader.readline()).strip() or b'0', 16)
+                    if kich_thuoc == 0:
+                        return
+                    bo_dem += await reader.readexactly(kich_thuoc)
+                    await reader.readexactly(2)
+                else:
+                    phan = await reader.read(65536)
+                    if not phan:
+                        return
+                    bo_dem += phan
+                while b'\n\n' in bo_dem:
+                    su_kien, bo_dem = bo_dem.split(b'\n\n', 1)
+                    if su_kien.startswith(b'event: snapshot'):
+                        self.da_ket_noi.set()
+                    elif su_kien.startswith(b'event: seats'):
+                        self.lan_nhan.append(time.perf_counter())
+        except Exception as e:  # noqa: BLE001 - ghi lại để báo cáo
+            self.loi = repr(e)
+            self.da_ket_noi.set()
+
+
+async def do(args, port, cookie, showtime_id, ma_ghe, pid):
+    nguoi_xem = [NguoiXem() for _ in range(args.viewers)]
+    tac_vu = []
+    bat_dau = time.perf_counter()
+    for i in range(0, args.viewers, args.ramp):
+        for nx in nguoi_xem[i:i + args.ramp]:
+            tac_vu.append(asyncio.ensure_future(nx.chay(port, cookie, showtime_id)))
+        await asyncio.gather(*(nx.da_ket_noi.wait() for nx in nguoi_xem[i:i + args.ramp]))
+    ms_ket_noi = (time.perf_counter() - bat_dau) * 1000
+    loi = [nx.loi for nx in nguoi_xem if nx.loi]
+    so_ket_noi = args.viewers - len(loi)
+    so_thread, rss = thong_tin_tien_trinh(pid)
+    print(f'{so_ket_noi}/{args.viewers} người xem đã nhận ảnh chụp sau {ms_ket_noi:.0f} ms'
+          f' | server: {so_thread} thread, {rss:.0f} MB RSS')
+    if loi:
+        print(f'  lỗi kết nối: {len(loi)} (vd. {loi[0]})')
+
+    vong = []
+    for lan in range(args.rounds):
+        duong_dan = '/api/hold-seat' if lan % 2 == 0 else '/api/release-seat'
+        da_nhan = [len(nx.lan_nhan) for nx in nguoi_xem]
+        t0 = time.perf_counter()
+        ma, ket_qua = await asyncio.get_running_loop().run_in_executor(
+            None, goi_api, port, cookie, duong_dan, {'seat_id': ma_ghe, 'showtime_id': showtime_id}
+        )
+        assert ma == 200, ket_qua
+        het_han = time.monotonic() + 30
+        while time.monotonic() < het_han:
+            con_cho = sum(1 for nx, n in zip(nguoi_xem, da_nhan) if not nx.loi and len(nx.lan_nhan) <= n)
+            if not con_cho:
+                break
+            await asyncio.sleep(0.01)
+        tre = sorted((nx.lan_nhan[n] - t0) * 1000 for nx, n in zip(nguoi_xem, da_nhan)
+                     if len(nx.lan_nhan) > n)
+        vong.append((duong_dan, len(tre), tre))
+
+    print(f'{"vòng":<20} | {"nhận":>6} | {"p50 ms":>8} | {"p99 ms":>8} | {"max ms":>8}')
+    for duong_dan, so_nhan, tre in vong:
+        p99 = tre[min(len(tre) - 1, int(len(tre) * 0.99))] if tre else float('nan')
+        print(f'{duong_dan:<20} | {so_nhan:>6} | {statistics.median(tre) if tre else float("nan"):>8.1f} | '
+              f'{p99:>8.1f} | {tre[-1] if tre else float("nan"):>8.1f}')
+
+    for t in tac_vu:
+        t.cancel()
+    await asyncio.gather(*tac_vu, return_exceptions=True)
+    return so_ket_noi, vong
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices=('asgi', 'flask'), default='asgi')
+    parser.add_argument('--viewers', type=int, default=5000)
+    parser.add_argument('--rounds', type=int, default=4)
+    parser.add_argument('--ramp', type=int, default=500, help='số kết nối mở mỗi đợt')
+    args = parser.parse_args()
+
+    duong_dan = tao_db_tam()
+    showtime_id = tao_suat_chieu_sap_toi()
+    port = cong_trong()
+    server = chay_server(args.server, duong_dan, port)
+    try:
+        cookie = dang_nhap(port)
+        conn = http.client.HTTPConnection('127.0.0.1', port)
+        conn.request('GET', f'/api/get-seats/{showtime_id}', headers={'Cookie': cookie})
+        ma_ghe = json.loads(conn.getresponse().read())['seats'][0]['id']
+        conn.close()
+        print(f'server {args.server}, suất chiếu {showtime_id}')
+        so_ket_noi, vong = asyncio.run(do(args, port, cookie, showtime_id, ma_ghe, server.pid))
+        assert so_ket_noi == args.viewers, 'không giữ được đủ người xem'
+        assert all(so_nhan == args.viewers for _, so_nhan, _ in vong), 'có người xem không nhận được thay đổi'
+        print(f'✓ {args.viewers} người xem đều nhận đủ {args.rounds} lần thay đổi')
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark: số request/giây của /movie/<id> và /api/get-seats có và không có pool kết nối
+
+Không pool: mỗi lần gọi model mở sqlite3.connect mới (cách cũ).
+Có pool:    kết nối được tái sử dụng và đã áp dụng PRAGMA (WAL, busy_timeout, ...).
+
+Chạy:  python benchmarks/bench_pool.py --requests 2000 --threads 8
+"""
+
+import argparse
+import http.client
+import threading
+import time
+
+from common import chay_server, dang_nhap, tao_db_tam, tao_suat_chieu_sap_toi
+
+import db
+
+
+def ban_request(port, duong_dan, cookie, so_request, so_thread):
+    """Gửi so_request request chia cho so_thread thread, trả về số request/giây"""
+    moi_thread = so_request // so_thread
+
+    def chay():
+        for _ in range(moi_thread):
+            conn = http.client.HTTPConnection('127.0.0.1', port)
+            conn.request('GET', duong_dan, headers={'Cookie': cookie})
+            response = conn.getresponse()
+            response.read()
+            assert response.status == 200, response.status
+            conn.close()
+
+    threads = [threading.Thread(target=chay) for _ in range(so_thread)]
+    bat_dau = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return moi_thread * so_thread / (time.perf_counter() - bat_dau)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=8)
+    args = parser.parse_args()
+
+    duong_dan_db = tao_db_tam()
+    import app
+    showtime_id = tao_suat_chieu_sap_toi()
+    server, port = chay_server(app.app)
+    cookie = dang_nhap(port)
+
+    print(f'{args.requests} request, {args.threads} thread')
+    for ten, kich_thuoc in (('không pool', 0), (f'pool {args.pool_size}', args.pool_size)):
+        db.cau_hinh(duong_dan_db, kich_thuoc)
+        for duong_dan in ('/movie/1', f'/api/get-seats/{showtime_id}'):
+            rps = ban_request(port, duong_dan, cookie, args.requests, args.threads)
+            print(f'  {ten:<12} {duong_dan:<22} {rps:>8.0f} req/s')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
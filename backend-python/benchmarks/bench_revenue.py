@@ -0,0 +1,168 @@
+"""
+Benchmark: báo cáo top phim theo doanh thu từ bảng revenue_daily so với gộp toàn bảng bookings
+
+Phần 1 chạy một loạt thao tác qua model (đặt vé, hủy, thanh toán, đổi ngày/phim của suất
+chiếu, xóa suất chiếu, hết hạn vé) rồi kiểm tra bảng tổng hợp khớp với phép gộp trực tiếp
+và top phim khớp với câu truy vấn cũ. Phần 2 chèn thêm lịch sử vé, dựng lại bảng
+(backfill) và so thời gian hai cách.
+
+Chạy:  python benchmarks/bench_revenue.py --ops 300 --bookings 200000 --repeat 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+
+from common import tao_db_tam
+
+import models
+import revenue
+from seat_map import so_do_ghe
+
+
+def top_phim_cu(conn, gioi_han=10):
+    """Câu truy vấn trước đây của Admin.lay_top_phim_doanh_thu"""
+    return conn.execute('''
+        SELECT m.id, m.title, m.poster_url,
+               COUNT(b.id) as so_ve_ban, COALESCE(SUM(b.price), 0) as doanh_thu
+        FROM movies_info m
+        LEFT JOIN showtimes s ON m.id = s.movie_id
+        LEFT JOIN bookings b ON s.id = b.showtime_id AND b.status = 'confirmed'
+        GROUP BY m.id
+        ORDER BY doanh_thu DESC
+        LIMIT ?
+    ''', (gioi_han,)).fetchall()
+
+
+def tao_suat_chieu(ngau_nhien, so_luong):
+    ngay_mai = datetime.now() + timedelta(days=1)
+    ma = []
+    for _ in range(so_luong):
+        ngay = (ngay_mai + timedelta(days=ngau_nhien.randint(0, 20))).strftime('%Y-%m-%d')
+        ma.append(models.SuatChieu(
+            maphim=ngau_nhien.randint(1, 5), maphong='Rạp 1', ngaychieu=ngay, giochieu='20:00',
+            giave=ngau_nhien.choice([75000, 85000, 95000])
+        ).them_suat_chieu())
+    return ma
+
+
+def chay_thao_tac(so_thao_tac):
+    """Thao tác ngẫu nhiên qua model, trả về số lần mỗi loại"""
+    import app
+
+    ngau_nhien = random.Random(7)
+    khach_hang = [models.KhachHang.dang_ky(f'bench{i}', 'pw') for i in range(5)]
+    suat_chieu = tao_suat_chieu(ngau_nhien, 20)
+    ve = []
+    dem = {}
+
+    for _ in range(so_thao_tac):
+        loai = ngau_nhien.choices(['dat', 'huy', 'thanh_toan', 'doi_suat', 'xoa_suat'],
+                                  weights=[10, 4, 2, 1, 0.3])[0]
+        if loai == 'dat' and suat_chieu:
+            ma = ngau_nhien.choice(suat_chieu)
+            so_do = so_do_ghe.lay(ma)
+            trong = [g['id'] for g in so_do.danh_sach() if g['status'] == 'available'] if so_do else []
+            if trong:
+                ve += ngau_nhien.choice(khach_hang).dat_ve(ma, ngau_nhien.sample(trong, min(len(trong), 3)))
+        elif loai in ('huy', 'thanh_toan') and ve:
+            mot_ve = ngau_nhien.choice(ve)
+            mot_ve.huy_don_dat_ve() if loai == 'huy' else mot_ve.xac_nhan_thanh_toan()
+        elif loai == 'doi_suat' and suat_chieu:
+            sc = models.SuatChieu.tim_theo_id(ngau_nhien.choice(suat_chieu))
+            sc.maphim = ngau_nhien.randint(1, 5)
+            sc.ngaychieu = (datetime.now() + timedelta(days=ngau_nhien.randint(1, 20))).strftime('%Y-%m-%d')
+            sc.cap_nhat_suat_chieu()
+        elif loai == 'xoa_suat' and len(suat_chieu) > 5:
+            ma = suat_chieu.pop(ngau_nhien.randrange(len(suat_chieu)))
+            models.SuatChieu.tim_theo_id(ma).xoa_suat_chieu()
+        else:
+            continue
+        dem[loai] = dem.get(loai, 0) + 1
+
+    # Đưa vài suất chiếu về quá khứ (cùng dời phần tổng hợp như cap_nhat_suat_chieu) rồi cho vé hết hạn
+    conn = models.get_db()
+    for ma in suat_chieu[:3]:
+        sc = models.SuatChieu.tim_theo_id(ma)
+        sc.ngaychieu = '2000-01-01'
+        sc.cap_nhat_suat_chieu()
+    conn.execute("UPDATE job_state SET value = '1999-12-31 00:00' WHERE name = 'huy_ve_qua_gio'")
+    conn.commit()
+    conn.close()
+    app._lan_chay_huy_ve = None
+    dem['het_han'] = app.huy_ve_qua_gio()['ve']
+    return dem
+
+
+def chen_lich_su(so_ve):
+    """Chèn trực tiếp so_ve vé cũ (bỏ qua model) cho phần đo thời gian"""
+    ngau_nhien = random.Random(42)
+    suat_chieu = tao_suat_chieu(ngau_nhien, 200)
+    conn = models.get_db()
+    conn.executemany(
+        'INSERT INTO bookings (user_id, showtime_id, seat_number, price, status) VALUES (?, ?, ?, ?, ?)',
+        [(2, ngau_nhien.choice(suat_chieu), 'A1', ngau_nhien.choice([75000, 85000, 95000]),
+          ngau_nhien.choices(['confirmed', 'cancelled', 'expired'], weights=[8, 1, 1])[0])
+         for _ in range(so_ve)]
+    )
+    conn.commit()
+    conn.close()
+
+
+def kiem_tra_khop(conn):
+    lech = revenue.doi_soat(conn)
+    assert not lech, f'revenue_daily lệch: {lech[:5]}'
+    cu = {r['id']: (r['so_ve_ban'], r['doanh_thu']) for r in top_phim_cu(conn, 1000)}
+    moi = {r['id']: (r['so_ve_ban'], r['doanh_thu']) for r in revenue.top_phim(conn, 1000)}
+    assert cu == moi, f'top phim khác nhau: {cu} != {moi}'
+
+
+def do(ham, repeat):
+    conn = models.get_db()
+    thoi_gian = []
+    for _ in range(repeat):
+        bat_dau = time.perf_counter()
+        ham(conn)
+        thoi_gian.append((time.perf_counter() - bat_dau) * 1000)
+    conn.close()
+    return statistics.median(thoi_gian)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ops', type=int, default=300)
+    parser.add_argument('--bookings', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tao_db_tam()
+    dem = chay_thao_tac(args.ops)
+    conn = models.get_db()
+    kiem_tra_khop(conn)
+    conn.close()
+    print(f'Thao tác: {dem}')
+    print('✓ revenue_daily khớp với bookings, top phim khớp với truy vấn cũ')
+
+    chen_lich_su(args.bookings)
+    conn = models.get_db()
+    bat_dau = time.perf_counter()
+    revenue.xay_lai(conn)
+    conn.commit()
+    ms_backfill = (time.perf_counter() - bat_dau) * 1000
+    kiem_tra_khop(conn)
+    so_dong = conn.execute('SELECT COUNT(*) FROM revenue_daily').fetchone()[0]
+    conn.close()
+    print(f'✓ Backfill {args.bookings} vé -> {so_dong} dòng tổng hợp: {ms_backfill:.0f} ms')
+
+    print(f'{"truy vấn":<28} | {"ms":>8}')
+    print(f'{"top 10: gộp bookings (cũ)":<28} | {do(top_phim_cu, args.repeat):>8.2f}')
+    print(f'{"top 10: revenue_daily":<28} | {do(revenue.top_phim, args.repeat):>8.2f}')
+    tu, den = datetime.now().strftime('%Y-%m-%d'), (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d')
+    print(f'{"top 10 trong 7 ngày":<28} | {do(lambda c: revenue.top_phim(c, 10, tu, den), args.repeat):>8.2f}')
+    print(f'{"doanh thu theo ngày (7 ngày)":<28} | {do(lambda c: revenue.theo_ngay(c, tu, den), args.repeat):>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark: tìm kiếm phim bằng LIKE (cách cũ) so với chỉ mục FTS5 trên 50k phim giả lập
+
+Chạy:  python benchmarks/bench_search.py --movies 50000 --repeat 20
+"""
+
+import argparse
+import random
+import statistics
+import time
+
+from common import tao_db_tam
+
+import models
+import movie_search
+
+TU_TEN = ['Bóng', 'Đêm', 'Huyền', 'Thoại', 'Chiến', 'Binh', 'Người', 'Sắt', 'Thành', 'Phố',
+          'Ký', 'Ức', 'Ánh', 'Sáng', 'Rồng', 'Lửa', 'Biển', 'Xanh', 'Mặt', 'Trời', 'Avengers',
+          'Dune', 'Galaxy', 'Mission', 'Impossible', 'Wick', 'Batman', 'Hành', 'Tinh', 'Cát']
+THE_LOAI = ['Hành động', 'Phiêu lưu', 'Hài', 'Tội phạm', 'Sci-Fi', 'Gia đình', 'Tiểu sử', 'Kinh dị']
+HO = ['Nguyễn', 'Trần', 'Lê', 'Phạm', 'Hoàng', 'Đặng', 'Nolan', 'Villeneuve', 'Cameron', 'Russo']
+TEN = ['Anh', 'Bình', 'Châu', 'Dũng', 'Đức', 'Hùng', 'Christopher', 'Denis', 'James', 'Joe']
+
+TRUY_VAN = ['hanh dong', 'Hành động', 'dang', 'nol', 'rong lua', 'Avengers', 'xyz khong co']
+
+
+def tao_danh_muc(so_phim):
+    ngau_nhien = random.Random(42)
+
+    def ten_nguoi():
+        return f'{ngau_nhien.choice(HO)} {ngau_nhien.choice(TEN)}'
+
+    conn = models.get_db()
+    conn.executemany(
+        'INSERT INTO movies_info (title, genre, duration, description, director, cast_members) VALUES (?, ?, ?, ?, ?, ?)',
+        [(' '.join(ngau_nhien.sample(TU_TEN, 3)), ', '.join(ngau_nhien.sample(THE_LOAI, 2)),
+          ngau_nhien.randint(90, 180), ' '.join(ngau_nhien.choices(TU_TEN, k=20)),
+          ten_nguoi(), ', '.join(ten_nguoi() for _ in range(3)))
+         for _ in range(so_phim)]
+    )
+    movie_search.dung_lai_chi_muc(conn)
+    conn.commit()
+    conn.close()
+
+
+def tim_like_cu(conn, tu_khoa):
+    """Câu truy vấn trước đây của Phim.tim_kiem: không giới hạn, không xếp hạng"""
+    mau = f'%{tu_khoa}%'
+    return conn.execute(
+        'SELECT * FROM movies_info WHERE title LIKE ? OR genre LIKE ? OR director LIKE ? OR cast_members LIKE ?',
+        (mau, mau, mau, mau)
+    ).fetchall()
+
+
+def do(ham, tu_khoa, repeat):
+    conn = models.get_db()
+    thoi_gian = []
+    for _ in range(repeat):
+        bat_dau = time.perf_counter()
+        rows = ham(conn, tu_khoa)
+        thoi_gian.append((time.perf_counter() - bat_dau) * 1000)
+    conn.close()
+    return len(rows), statistics.median(thoi_gian)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--movies', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    tao_db_tam()
+    tao_danh_muc(args.movies)
+
+    print(f'{args.movies} phim')
+    print(f'{"từ khóa":<14} | {"LIKE: kết quả":>13} | {"ms":>8} | {"FTS5: kết quả":>13} | {"ms":>6}')
+    for tu_khoa in TRUY_VAN:
+        so_cu, ms_cu = do(tim_like_cu, tu_khoa, args.repeat)
+        so_moi, ms_moi = do(movie_search.tim_kiem, tu_khoa, args.repeat)
+        print(f'{tu_khoa:<14} | {so_cu:>13} | {ms_cu:>8.2f} | {so_moi:>13} | {ms_moi:>6.2f}')
+
+
+if __name__ == '__main__':
+    main()
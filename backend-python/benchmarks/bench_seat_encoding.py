@@ -0,0 +1,74 @@
+"""
+Benchmark: kích thước payload và thời gian server của /api/get-seats theo cách mã hóa
+
+So sánh danh sách dict mỗi ghế (mặc định) với format=compact (chuỗi mã trạng thái +
+bitmask ghế của tôi, có và không kèm bố cục) ở suất chiếu 50, 300 và 800 ghế.
+Khoảng 1/3 số ghế đã đặt, 1/10 đang được giữ (một nửa trong đó do chính user giữ).
+
+Chạy:  python benchmarks/bench_seat_encoding.py --repeat 200
+"""
+
+import argparse
+import statistics
+import time
+
+from common import tao_db_tam, tao_suat_chieu_sap_toi
+
+import models
+
+
+def tao_suat_chieu_co_ghe(so_ghe):
+    """Suất chiếu ngày mai với so_ghe ghế (hàng A..Z, 30 ghế mỗi hàng)"""
+    showtime_id = tao_suat_chieu_sap_toi()
+    conn = models.get_db()
+    conn.execute('DELETE FROM seats WHERE showtime_id = ?', (showtime_id,))
+    conn.executemany(
+        'INSERT INTO seats (showtime_id, seat_number, status) VALUES (?, ?, ?)',
+        [(showtime_id, f'{chr(65 + i // 30)}{i % 30 + 1}', 'booked' if i % 3 == 0 else 'available')
+         for i in range(so_ghe)]
+    )
+    conn.commit()
+    conn.close()
+    models.so_do_ghe.xoa(showtime_id)
+
+    so_do = models.so_do_ghe.lay(showtime_id)
+    for i, maghe in enumerate(so_do.ma_ghe):
+        if i % 10 == 1:
+            so_do.giu_ghe(maghe, 2 if i % 20 == 1 else 1)
+    return showtime_id
+
+
+def do(client, url, repeat):
+    """Trả về (byte body, ms trung vị mỗi request)"""
+    thoi_gian = []
+    for _ in range(repeat):
+        bat_dau = time.perf_counter()
+        response = client.get(url)
+        thoi_gian.append((time.perf_counter() - bat_dau) * 1000)
+        assert response.status_code == 200, response.status_code
+    return len(response.data), statistics.median(thoi_gian)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    tao_db_tam()
+    import app
+    client = app.app.test_client()
+    client.post('/login', data={'username': 'user1', 'password': '123456'})
+
+    print(f'{"số ghế":>6} | {"cách mã hóa":<22} | {"byte":>7} | {"ms/req":>7}')
+    for so_ghe in (50, 300, 800):
+        showtime_id = tao_suat_chieu_co_ghe(so_ghe)
+        url = f'/api/get-seats/{showtime_id}'
+        for ten, tham_so in (('danh sách dict', ''),
+                             ('compact + bố cục', '?format=compact'),
+                             ('compact (đã có bố cục)', '?format=compact&layout=0')):
+            byte, ms = do(client, url + tham_so, args.repeat)
+            print(f'{so_ghe:>6} | {ten:<22} | {byte:>7} | {ms:>7.3f}')
+
+
+if __name__ == '__main__':
+    main()
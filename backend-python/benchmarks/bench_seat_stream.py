@@ -0,0 +1,84 @@
+"""
+Benchmark: số câu lệnh SQL mỗi phút cho N người xem trang đặt vé không thao tác gì
+
+- polling: mỗi người xem gọi /api/get-seats mỗi giây (cách cũ, nay là dự phòng)
+- sse:     mỗi người xem giữ một kết nối /api/seat-stream
+
+Chạy:  python benchmarks/bench_seat_stream.py --viewers 500 --seconds 10
+"""
+
+import argparse
+import socket
+import time
+
+from common import BoDemTruyVan, chay_server, dang_nhap, tao_db_tam, tao_suat_chieu_sap_toi
+
+
+def do_polling(flask_app, showtime_id, viewers, so_lan=200):
+    """Đo số câu lệnh của một lần poll rồi nhân lên cho viewers người xem, 1 lần/giây"""
+    dem = BoDemTruyVan().bat()
+    client = flask_app.test_client()
+    client.post('/login', data={'username': 'user1', 'password': '123456'})
+
+    dem.dat_lai()
+    for _ in range(so_lan):
+        client.get(f'/api/get-seats/{showtime_id}')
+    moi_lan = dem.dat_lai() / so_lan
+    dem.tat()
+    return moi_lan, moi_lan * 60 * viewers
+
+
+def mo_stream(port, cookie, showtime_id):
+    """Mở một kết nối SSE và đọc xong sự kiện snapshot"""
+    sock = socket.create_connection(('127.0.0.1', port))
+    sock.sendall((f'GET /api/seat-stream/{showtime_id} HTTP/1.1\r\n'
+                  f'Host: 127.0.0.1\r\nCookie: {cookie}\r\nAccept: text/event-stream\r\n\r\n').encode())
+    du_lieu = b''
+    while b'\n\n' not in du_lieu.partition(b'event: snapshot')[2]:
+        phan = sock.recv(65536)
+        if not phan:
+            raise RuntimeError('Stream đóng trước khi nhận snapshot')
+        du_lieu += phan
+    return sock
+
+
+def do_sse(flask_app, showtime_id, viewers, giay):
+    """Mở viewers kết nối SSE, đếm câu lệnh SQL trong giay giây không ai thao tác"""
+    dem = BoDemTruyVan().bat()
+    server, port = chay_server(flask_app)
+    cookie = dang_nhap(port)
+
+    dem.dat_lai()
+    ket_noi = [mo_stream(port, cookie, showtime_id) for _ in range(viewers)]
+    snapshot = dem.dat_lai()
+
+    time.sleep(giay)
+    nhan_roi = dem.dat_lai()
+
+    for sock in ket_noi:
+        sock.close()
+    server.shutdown()
+    dem.tat()
+    return snapshot / viewers, nhan_roi * 60 / giay
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--viewers', type=int, default=500)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    tao_db_tam()
+    import app
+    showtime_id = tao_suat_chieu_sap_toi()
+
+    moi_lan, poll_phut = do_polling(app.app, showtime_id, args.viewers)
+    snapshot, sse_phut = do_sse(app.app, showtime_id, args.viewers, args.seconds)
+
+    print(f'{args.viewers} người xem không thao tác, suất chiếu {showtime_id}')
+    print(f'  polling 1s : {moi_lan:.1f} câu lệnh/lần poll -> {poll_phut:,.0f} câu lệnh/phút')
+    print(f'  SSE        : {snapshot:.1f} câu lệnh/kết nối (snapshot) -> {sse_phut:,.0f} câu lệnh/phút khi rảnh')
+
+
+if __name__ == '__main__':
+    main()
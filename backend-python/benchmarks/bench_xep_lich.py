@@ -0,0 +1,73 @@
+"""
+Benchmark: xếp lịch một khoảng ngày cho nhiều rạp, từng suất một (form cũ) so với
+SuatChieu.xep_lich_hang_loat (một transaction, INSERT nhiều dòng + executemany ghế)
+
+Chạy:  python benchmarks/bench_xep_lich.py --days 7 --theaters 3 --slots 5
+"""
+
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from common import tao_db_tam
+
+import models
+import seat_map
+from seat_map import BO_CUC_MAC_DINH, ghe_theo_bo_cuc
+
+
+def xep_tung_suat(maphim, danh_sach_phong, danh_sach_ngay, khung_gio):
+    """Cách cũ: mỗi suất chiếu một lần them_suat_chieu, mỗi ghế một INSERT, mỗi suất một commit"""
+    for ngay in danh_sach_ngay:
+        for phong in danh_sach_phong:
+            for gio in khung_gio:
+                suat_chieu = models.SuatChieu(maphim=maphim, maphong=phong, ngaychieu=ngay, giochieu=gio)
+                conn = models.get_db()
+                suat_chieu.masuatchieu = conn.execute(
+                    'INSERT INTO showtimes (movie_id, theater, show_date, show_time, price) VALUES (?, ?, ?, ?, ?)',
+                    (maphim, phong, ngay, gio, suat_chieu.giave)
+                ).lastrowid
+                for _, soghe in ghe_theo_bo_cuc(*BO_CUC_MAC_DINH):
+                    conn.execute(
+                        'INSERT INTO seats (showtime_id, seat_number, status) VALUES (?, ?, "available")',
+                        (suat_chieu.masuatchieu, soghe)
+                    )
+                conn.commit()
+                conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--theaters', type=int, default=3)
+    parser.add_argument('--slots', type=int, default=5)
+    args = parser.parse_args()
+
+    tao_db_tam()
+    danh_sach_phong = [f'Rạp {i + 1}' for i in range(args.theaters)]
+    khung_gio = [f'{9 + 3 * i:02d}:00' for i in range(args.slots)]
+    so_suat = args.days * args.theaters * args.slots
+
+    # Hai khoảng ngày khác nhau để hai cách không trùng suất chiếu của nhau
+    bat_dau = datetime(2030, 1, 1)
+    ngay_cu = [(bat_dau + timedelta(days=i)).strftime('%Y-%m-%d') for i in range(args.days)]
+    t = time.perf_counter()
+    xep_tung_suat(1, danh_sach_phong, ngay_cu, khung_gio)
+    ms_cu = (time.perf_counter() - t) * 1000
+
+    bat_dau = datetime(2031, 1, 1)
+    ket_qua = models.SuatChieu.xep_lich_hang_loat(
+        1, danh_sach_phong, bat_dau.strftime('%Y-%m-%d'),
+        (bat_dau + timedelta(days=args.days - 1)).strftime('%Y-%m-%d'), khung_gio
+    )
+    assert ket_qua['showtimes'] == so_suat
+
+    print(f'{so_suat} suất chiếu, {ket_qua["capacity"]} chỗ ngồi, {ket_qua["seats"]} dòng ghế, '
+          f'lưu ghế: {seat_map.CHE_DO_LUU_GHE}')
+    print(f'{"cách":<22} | {"ms":>8} | {"commit":>6}')
+    print(f'{"từng suất chiếu (cũ)":<22} | {ms_cu:>8.1f} | {so_suat:>6}')
+    print(f'{"xep_lich_hang_loat":<22} | {ket_qua["elapsed_ms"]:>8.1f} | {1:>6}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+HUY CINEMA - Tiện ích dùng chung cho các benchmark
+Tạo database tạm, đếm câu lệnh SQL và chạy server Flask thật trong một thread.
+"""
+
+import http.client
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+# Cho phép import app/models khi chạy: python benchmarks/<script>.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+import models  # noqa: E402
+
+
+def tao_db_tam():
+    """Trỏ ứng dụng tới một database tạm đã có dữ liệu mẫu, trả về đường dẫn"""
+    duong_dan = os.path.join(tempfile.mkdtemp(prefix='cinema-bench-'), 'database.db')
+    db.cau_hinh(duong_dan)
+
+    import app
+    app.DB_PATH = duong_dan
+    app.init_db()
+    return duong_dan
+
+
+def tao_suat_chieu_sap_toi(maphim=1, maphong='Rạp 1'):
+    """Tạo một suất chiếu ngày mai để đặt vé được, trả về id"""
+    ngay_mai = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    suat_chieu = models.SuatChieu(maphim=maphim, maphong=maphong, ngaychieu=ngay_mai, giochieu='20:00')
+    return suat_chieu.them_suat_chieu()
+
+
+class BoDemTruyVan:
+    """Đếm mọi câu lệnh SQL chạy trên các connection mở sau khi bật"""
+
+    def __init__(self):
+        self.so_cau_lenh = 0
+        self._khoa = threading.Lock()
+        self._connect_goc = sqlite3.connect
+
+    def _dem(self, _sql):
+        with self._khoa:
+            self.so_cau_lenh += 1
+
+    def bat(self):
+        connect_goc = self._connect_goc
+
+        def connect(*args, **kwargs):
+            conn = connect_goc(*args, **kwargs)
+            conn.set_trace_callback(self._dem)
+            return conn
+
+        sqlite3.connect = connect
+        # Bỏ các kết nối đang nằm trong pool để kết nối mở lại đều được đếm
+        db.cau_hinh()
+        return self
+
+    def tat(self):
+        sqlite3.connect = self._connect_goc
+
+    def dat_lai(self):
+        with self._khoa:
+            so_cau_lenh, self.so_cau_lenh = self.so_cau_lenh, 0
+        return so_cau_lenh
+
+
+def chay_server(flask_app):
+    """Chạy Flask app (threaded) trên một cổng ngẫu nhiên, trả về (server, port)"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, server.server_port
+
+
+def dang_nhap(port, username='user1', password='123456'):
+    """Đăng nhập qua HTTP, trả về header Cookie của phiên"""
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    conn.request('POST', '/login', body=urlencode({'username': username, 'password': password}),
+                 headers={'Content-Type': 'application/x-www-form-urlencoded'})
+    response = conn.getresponse()
+    response.read()
+    cookie = response.getheader('Set-Cookie', '').split(';')[0]
+    conn.close()
+    return cookie
@@ -0,0 +1,138 @@
+"""
+HUY CINEMA - Bộ nhớ đệm danh mục (phim, suất chiếu), người dùng và trang đã render
+Danh mục chỉ đổi khi admin sửa nhưng được đọc ở mỗi lần xem trang. Bộ nhớ đệm đọc
+xuyên (read-through) có TTL và giới hạn số mục (LRU); các hàm ghi của Phim/SuatChieu
+xóa bộ nhớ đệm sau khi commit. Thông tin người dùng đăng nhập được cache theo id với
+TTL ngắn và bị xóa khi khách hàng sửa thông tin hoặc đổi mật khẩu.
+
+Chỉ lưu dữ liệu dòng (tuple các dict) chứ không lưu đối tượng Phim/SuatChieu, để code
+gọi sửa đối tượng không làm hỏng bản trong bộ nhớ đệm.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import metrics
+
+
+class BoNhoDem:
+    """
+    Class BộNhớĐệm - Cache TTL + LRU an toàn đa luồng
+    Attributes:
+        - ten: str
+        - kich_thuoc: int (số mục tối đa)
+        - ttl: float (giây)
+        - phien_ban: int (tăng mỗi lần xóa, dùng làm phiên bản dữ liệu)
+    Methods:
+        + Lay(): Lấy theo khóa, gọi hàm nạp nếu chưa có hoặc đã hết hạn
+        + Doc()/Ghi(): Đọc/ghi trực tiếp khi không phải kết quả nào cũng được lưu
+        + Xoa(): Xóa một khóa khi dữ liệu gốc của khóa đó thay đổi
+        + XoaTatCa(): Xóa toàn bộ khi dữ liệu gốc thay đổi
+        + ThongKe(): Số lần trúng/trượt/loại bỏ
+    """
+
+    def __init__(self, ten: str, kich_thuoc: int = 1024, ttl: float = 300):
+        self.ten = ten
+        self.kich_thuoc = kich_thuoc
+        self.ttl = ttl
+        self.phien_ban = 0
+        self._muc: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._khoa = threading.Lock()
+        self.trung = 0
+        self.truot = 0
+        self.loai_bo = 0
+
+    def doc(self, khoa: Hashable) -> Optional[Any]:
+        """Giá trị còn hạn của khóa, None nếu không có (có tính trúng/trượt)"""
+        with self._khoa:
+            muc = self._muc.get(khoa)
+            if muc is not None and muc[0] > time.monotonic():
+                self._muc.move_to_end(khoa)
+                self.trung += 1
+                return muc[1]
+            self.truot += 1
+            return None
+
+    def ghi(self, khoa: Hashable, gia_tri: Any, phien_ban: int):
+        """
+        Lưu giá trị đã đọc khi cache ở phiên bản phien_ban. Nếu cache đã bị xóa trong
+        lúc đọc thì giá trị có thể đã cũ nên bỏ qua.
+        """
+        with self._khoa:
+            if phien_ban != self.phien_ban:
+                return
+            self._muc[khoa] = (time.monotonic() + self.ttl, gia_tri)
+            self._muc.move_to_end(khoa)
+            while len(self._muc) > self.kich_thuoc:
+                self._muc.popitem(last=False)
+                self.loai_bo += 1
+
+    def lay(self, khoa: Hashable, nap: Callable[[], Any]) -> Any:
+        """Đọc xuyên: trả giá trị trong cache hoặc gọi nap() rồi lưu lại"""
+        phien_ban = self.phien_ban
+        gia_tri = self.doc(khoa)
+        if gia_tri is None:
+            gia_tri = nap()
+            self.ghi(khoa, gia_tri, phien_ban)
+        return gia_tri
+
+    def xoa(self, khoa: Hashable):
+        with self._khoa:
+            self._muc.pop(khoa, None)
+            # Tăng phiên bản để lần đọc đang chạy dở không ghi lại giá trị cũ
+            self.phien_ban += 1
+
+    def xoa_tat_ca(self):
+        with self._khoa:
+            self._muc.clear()
+            self.phien_ban += 1
+
+    def thong_ke(self) -> Dict[str, Any]:
+        with self._khoa:
+            tong = self.trung + self.truot
+            return {
+                'name': self.ten,
+                'size': len(self._muc),
+                'max_size': self.kich_thuoc,
+                'ttl': self.ttl,
+                'hits': self.trung,
+                'misses': self.truot,
+                'evictions': self.loai_bo,
+                'hit_ratio': round(self.trung / tong, 4) if tong else 0.0,
+                'version': self.phien_ban
+            }
+
+
+# Cache danh mục dùng chung (Phim.lay_tat_ca/tim_theo_id, SuatChieu.lay_theo_phim/tim_theo_id)
+danh_muc = BoNhoDem(
+    'danh_muc',
+    kich_thuoc=int(os.environ.get('CINEMA_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('CINEMA_CACHE_TTL', 300))
+)
+
+# Người dùng theo id (KhachHang.tim_theo_id), TTL ngắn vì process khác có thể sửa
+nguoi_dung = BoNhoDem(
+    'nguoi_dung',
+    kich_thuoc=int(os.environ.get('CINEMA_USER_CACHE_SIZE', 4096)),
+    ttl=float(os.environ.get('CINEMA_USER_CACHE_TTL', 30))
+)
+
+# Trang HTML đã render (index, movie_detail), khóa có kèm danh_muc.phien_ban
+trang = BoNhoDem(
+    'trang',
+    kich_thuoc=int(os.environ.get('CINEMA_PAGE_CACHE_SIZE', 256)),
+    ttl=float(os.environ.get('CINEMA_CACHE_TTL', 300))
+)
+
+
+def _dem_cache(truong: str):
+    return lambda: {(c.ten,): getattr(c, truong) for c in (danh_muc, nguoi_dung, trang)}
+
+
+for _ten, _truong, _mo_ta in (('hits', 'trung', 'trúng'), ('misses', 'truot', 'trượt'),
+                              ('evictions', 'loai_bo', 'bị loại bỏ')):
+    metrics.dang_ky(metrics.DocKhiXuat(
+        f'cinema_cache_{_ten}_total', f'Số lần {_mo_ta} của các cache', 'counter', ('cache',), _dem_cache(_truong)))
@@ -0,0 +1,98 @@
+"""
+HUY CINEMA - Bộ đếm thống kê tổng quan
+Bảng counters giữ sẵn các số liệu của trang admin (số phim, suất chiếu, vé đã xác nhận,
+doanh thu, khách hàng) để Admin.xem_thong_ke_tong_quan chỉ đọc vài dòng thay vì
+COUNT/SUM toàn bảng. Mỗi thao tác ghi làm đổi số liệu gọi cong() trên cùng connection,
+trước commit, nên bộ đếm đổi cùng transaction với dữ liệu.
+
+Đối soát (tính lại từ đầu, báo chênh lệch):  python counters.py [--fix]
+"""
+
+import sqlite3
+import sys
+from typing import Dict, Tuple
+
+# Tên bộ đếm -> câu lệnh tính lại từ đầu
+CAU_LENH_TINH = {
+    'tong_phim': 'SELECT COUNT(*) FROM movies_info',
+    'tong_suat_chieu': 'SELECT COUNT(*) FROM showtimes',
+    'tong_ve_dat': "SELECT COUNT(*) FROM bookings WHERE status = 'confirmed'",
+    'tong_doanh_thu': "SELECT COALESCE(SUM(price), 0) FROM bookings WHERE status = 'confirmed'",
+    'tong_khach_hang': 'SELECT COUNT(*) FROM users WHERE is_admin = 0',
+}
+
+# Doanh thu là số thực: chênh lệch nhỏ hơn mức này do làm tròn, không tính là lệch
+SAI_SO = 1e-6
+
+
+def cong(conn: sqlite3.Connection, **thay_doi: float):
+    """Cộng dồn vào các bộ đếm, vd. cong(conn, tong_ve_dat=2, tong_doanh_thu=150000)"""
+    thay_doi = {ten: gia_tri for ten, gia_tri in thay_doi.items() if gia_tri}
+    if not thay_doi:
+        return
+    conn.executemany('''
+        INSERT INTO counters (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+    ''', thay_doi.items())
+
+
+def _dinh_dang(ten: str, gia_tri: float):
+    return gia_tri if ten == 'tong_doanh_thu' else int(gia_tri)
+
+
+def doc(conn: sqlite3.Connection) -> Dict[str, float]:
+    """Giá trị hiện tại của tất cả bộ đếm"""
+    luu = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+    return {ten: _dinh_dang(ten, luu.get(ten, 0)) for ten in CAU_LENH_TINH}
+
+
+def tinh_tu_dau(conn: sqlite3.Connection) -> Dict[str, float]:
+    """Tính lại các bộ đếm bằng COUNT/SUM toàn bảng"""
+    return {ten: _dinh_dang(ten, conn.execute(sql).fetchone()[0]) for ten, sql in CAU_LENH_TINH.items()}
+
+
+def ghi_de(conn: sqlite3.Connection, gia_tri: Dict[str, float]):
+    conn.executemany('''
+        INSERT INTO counters (name, value) VALUES (?, ?)
+        ON CONFLICT(name) DO UPDATE SET value = excluded.value
+    ''', gia_tri.items())
+
+
+def doi_soat(conn: sqlite3.Connection, sua: bool = False) -> Dict[str, Tuple[float, float]]:
+    """
+    So bộ đếm với giá trị tính lại trong cùng một transaction.
+    Trả về {tên: (đang lưu, thực tế)} của các bộ đếm lệch; sua=True thì ghi đè giá trị đúng.
+    """
+    isolation_cu = conn.isolation_level
+    conn.isolation_level = None
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        luu = doc(conn)
+        thuc_te = tinh_tu_dau(conn)
+        lech = {ten: (luu[ten], thuc_te[ten]) for ten in thuc_te
+                if abs(luu[ten] - thuc_te[ten]) > SAI_SO}
+        if sua and lech:
+            ghi_de(conn, thuc_te)
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.isolation_level = isolation_cu
+    return lech
+
+
+if __name__ == '__main__':
+    import db
+
+    conn = sqlite3.connect(db.DB_PATH)
+    sua = '--fix' in sys.argv[1:]
+    lech = doi_soat(conn, sua=sua)
+    conn.close()
+    if not lech:
+        print('✓ Bộ đếm khớp với dữ liệu')
+        sys.exit(0)
+    for ten, (luu, thuc_te) in lech.items():
+        print(f'✗ {ten}: đang lưu {luu}, thực tế {thuc_te}')
+    print('Đã sửa.' if sua else 'Chạy lại với --fix để sửa.')
+    sys.exit(0 if sua else 1)
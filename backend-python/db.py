@@ -0,0 +1,357 @@
+"""
+HUY CINEMA - Quản lý kết nối SQLite
+Giữ một pool kết nối có giới hạn, tái sử dụng giữa các request thay vì mở
+sqlite3.connect mới cho mỗi lần gọi model. Mỗi kết nối được áp dụng các PRAGMA
+cho môi trường production khi mở.
+
+Code gọi vẫn dùng như cũ: conn = get_db() ... conn.close() - close() trả kết nối
+về pool. Kết nối request quên trả sẽ được thu hồi khi Flask teardown.
+
+execute()/executemany()/executescript()/commit() của kết nối mượn từ pool được đo
+thời gian và con trỏ trả về đếm số dòng đọc được, cho metrics (metrics.py) và
+slow-query log (slow_query.py).
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from flask import g, has_app_context
+
+import metrics
+import slow_query
+
+# Database path
+DB_PATH = os.environ.get('CINEMA_DB_PATH', os.path.join(os.path.dirname(__file__), 'database.db'))
+
+# Số kết nối tối đa; 0 = không dùng pool (mỗi lần gọi mở một kết nối mới như trước)
+POOL_SIZE = int(os.environ.get('CINEMA_DB_POOL_SIZE', 8))
+
+# Thời gian chờ tối đa (giây) khi pool đã cho mượn hết kết nối
+POOL_TIMEOUT = 30
+
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA busy_timeout = 5000',
+    'PRAGMA synchronous = NORMAL',
+    'PRAGMA cache_size = -16000',      # 16 MB
+    'PRAGMA mmap_size = 268435456',    # 256 MB
+)
+
+
+class ConTro:
+    """
+    Class ConTrỏ - sqlite3.Cursor của kết nối mượn khi bật đo đạc: cộng thời gian đọc
+    kết quả và số dòng vào (route, hàm gọi) của câu lệnh đã tạo ra nó, và ghi
+    slow-query log một lần khi tổng thời gian thực thi + đọc vượt ngưỡng.
+    ham_goi = None khi không theo dõi hàm gọi: chỉ tìm trên stack lúc phải ghi log chậm
+    """
+
+    __slots__ = ('_cur', '_ket_noi', '_loai', '_lenh', '_route', '_ham_goi', '_tong', '_da_ghi_cham')
+
+    def __init__(self, cur: sqlite3.Cursor, ket_noi: sqlite3.Connection, loai: str, lenh: tuple,
+                 route: str, ham_goi: Optional[str], giay: float):
+        self._cur = cur
+        self._ket_noi = ket_noi
+        self._loai = loai
+        self._lenh = lenh
+        self._route = route
+        self._ham_goi = ham_goi
+        # Thời gian thực thi đã được KetNoi tính vào metrics, ở đây chỉ cộng cho slow-query log
+        self._tong = giay
+        self._da_ghi_cham = False
+        self._kiem_tra_cham()
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+    def _kiem_tra_cham(self):
+        if slow_query.BAT and not self._da_ghi_cham and self._tong * 1000 >= slow_query.NGUONG_MS:
+            self._da_ghi_cham = True
+            slow_query.ghi(self._ket_noi, self._loai, self._lenh, self._tong, self._route,
+                           self._ham_goi or metrics.ham_goi())
+
+    def _cong(self, giay: float, so_dong: int):
+        if metrics.BAT:
+            metrics.ghi_doc_ket_qua(self._route, self._ham_goi or metrics.KHONG_RO, giay, so_dong)
+        self._tong += giay
+        self._kiem_tra_cham()
+
+    def fetchone(self):
+        bat_dau = time.perf_counter()
+        dong = self._cur.fetchone()
+        self._cong(time.perf_counter() - bat_dau, dong is not None)
+        return dong
+
+    def fetchall(self):
+        bat_dau = time.perf_counter()
+        dong = self._cur.fetchall()
+        self._cong(time.perf_counter() - bat_dau, len(dong))
+        return dong
+
+    def fetchmany(self, *args):
+        bat_dau = time.perf_counter()
+        dong = self._cur.fetchmany(*args)
+        self._cong(time.perf_counter() - bat_dau, len(dong))
+        return dong
+
+    def __next__(self):
+        dong = self.fetchone()
+        if dong is None:
+            raise StopIteration
+        return dong
+
+    def __iter__(self):
+        # Chỉ tính thời gian lấy từng dòng, không tính thời gian code gọi xử lý dòng
+        so_dong, thoi_gian = 0, 0.0
+        try:
+            while True:
+                bat_dau = time.perf_counter()
+                dong = self._cur.fetchone()
+                thoi_gian += time.perf_counter() - bat_dau
+                if dong is None:
+                    return
+                so_dong += 1
+                yield dong
+        finally:
+            self._cong(thoi_gian, so_dong)
+
+
+class KetNoi:
+    """
+    Class KếtNối - Kết nối mượn từ pool, dùng như sqlite3.Connection.
+    close() trả kết nối về pool thay vì đóng thật.
+    """
+
+    __slots__ = ('_conn', '_pool', '_da_tra')
+
+    def __init__(self, pool: 'BeKetNoi', conn: sqlite3.Connection):
+        object.__setattr__(self, '_conn', conn)
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_da_tra', False)
+
+    def __getattr__(self, name):
+        if self._da_tra:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def _do(self, loai: str, *args):
+        """Gọi hàm loai của sqlite3.Connection, ghi số liệu và slow-query log theo route/hàm gọi"""
+        if self._da_tra:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        ham = getattr(self._conn, loai)
+        if not metrics.BAT and not slow_query.BAT:
+            return ham(*args)
+
+        route = metrics.route_hien_tai()
+        # Duyệt stack tìm hàm gọi tốn thời gian: mỗi câu lệnh chỉ khi bật CINEMA_METRICS_CALLER,
+        # còn lại chỉ lúc ghi slow-query log
+        ham_goi = metrics.ham_goi() if metrics.THEO_HAM_GOI else None
+        nhan_goi = ham_goi or metrics.KHONG_RO
+        mo_transaction = not self._conn.in_transaction
+        bat_dau = time.perf_counter()
+        try:
+            ket_qua = ham(*args)
+        except sqlite3.Error as e:
+            giay = time.perf_counter() - bat_dau
+            if metrics.BAT:
+                metrics.ghi_cau_lenh(route, nhan_goi, giay)
+                metrics.ghi_loi_sql(route, e)
+                if 'locked' in str(e):
+                    metrics.sql_cho_khoa.cong(route, gia_tri=giay)
+            if slow_query.BAT and giay * 1000 >= slow_query.NGUONG_MS:
+                slow_query.ghi(self._conn, loai, args, giay, route, ham_goi or metrics.ham_goi(), loi=e)
+            raise
+        giay = time.perf_counter() - bat_dau
+        if metrics.BAT:
+            metrics.ghi_cau_lenh(route, nhan_goi, giay)
+            # Câu lệnh mở transaction ghi (BEGIN IMMEDIATE hoặc lệnh ghi đầu tiên) chờ khóa ghi
+            if mo_transaction and self._conn.in_transaction:
+                metrics.sql_cho_khoa.cong(route, gia_tri=giay)
+        if isinstance(ket_qua, sqlite3.Cursor):
+            return ConTro(ket_qua, self._conn, loai, args, route, ham_goi, giay)
+        if slow_query.BAT and giay * 1000 >= slow_query.NGUONG_MS:
+            slow_query.ghi(self._conn, loai, args, giay, route, ham_goi or metrics.ham_goi())
+        return ket_qua
+
+    def execute(self, *args):
+        return self._do('execute', *args)
+
+    def executemany(self, *args):
+        return self._do('executemany', *args)
+
+    def executescript(self, *args):
+        return self._do('executescript', *args)
+
+    def commit(self):
+        return self._do('commit')
+
+    def __enter__(self):
+        # Trả proxy (không phải sqlite3.Connection) để câu lệnh trong khối with vẫn được đo
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        if not self._da_tra:
+            object.__setattr__(self, '_da_tra', True)
+            self._pool.tra_lai(self._conn)
+
+
+def mo_ket_noi(duong_dan: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """Mở kết nối SQLite mới với các PRAGMA production (dùng cho pool và khi tắt pool)"""
+    conn = sqlite3.connect(duong_dan, check_same_thread=check_same_thread)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class BeKetNoi:
+    """
+    Class BểKếtNối - Pool kết nối SQLite có giới hạn
+    Methods:
+        + Lay(): Mượn một kết nối (mở mới nếu pool chưa đầy, chờ nếu đã đầy)
+        + TraLai(): Trả kết nối về pool (đóng luôn nếu pool đã đóng)
+        + DongTatCa(): Đóng pool: đóng các kết nối đang rảnh, kết nối đang mượn đóng khi trả
+    """
+
+    def __init__(self, duong_dan: str, kich_thuoc: int):
+        self.duong_dan = duong_dan
+        self.kich_thuoc = kich_thuoc
+        self._ranh = []            # LIFO: kết nối vừa trả (cache còn nóng) được dùng lại trước
+        self._da_mo = 0
+        self._da_dong = False
+        self._dieu_kien = threading.Condition()
+
+    def _mo(self) -> sqlite3.Connection:
+        return mo_ket_noi(self.duong_dan, check_same_thread=False)
+
+    def lay(self) -> KetNoi:
+        with self._dieu_kien:
+            bat_dau = time.monotonic()
+            het_han = bat_dau + POOL_TIMEOUT
+            da_cho = False
+            while not self._ranh and self._da_mo >= self.kich_thuoc:
+                da_cho = True
+                con_lai = het_han - time.monotonic()
+                if con_lai <= 0 or not self._dieu_kien.wait(con_lai):
+                    metrics.sql_cho_pool.cong(metrics.route_hien_tai(), gia_tri=time.monotonic() - bat_dau)
+                    raise sqlite3.OperationalError('Hết kết nối trong pool')
+            if da_cho:
+                metrics.sql_cho_pool.cong(metrics.route_hien_tai(), gia_tri=time.monotonic() - bat_dau)
+            if self._ranh:
+                conn = self._ranh.pop()
+            else:
+                self._da_mo += 1
+                conn = None
+
+        if conn is None:
+            try:
+                conn = self._mo()
+            except Exception:
+                with self._dieu_kien:
+                    self._da_mo -= 1
+                    self._dieu_kien.notify()
+                raise
+
+        conn.row_factory = sqlite3.Row
+        return KetNoi(self, conn)
+
+    def tra_lai(self, conn: sqlite3.Connection):
+        try:
+            # Không để transaction dở dang hay cấu hình riêng lọt sang lần mượn sau
+            if conn.in_transaction:
+                conn.rollback()
+            conn.isolation_level = ''
+            loi = False
+        except sqlite3.Error:
+            loi = True
+
+        with self._dieu_kien:
+            # Pool đã bị thay (cau_hinh): kết nối mượn từ trước không quay về _ranh
+            giu_lai = not loi and not self._da_dong
+            if giu_lai:
+                self._ranh.append(conn)
+            else:
+                self._da_mo -= 1
+            self._dieu_kien.notify()
+        if not giu_lai:
+            conn.close()
+
+    def dong_tat_ca(self):
+        with self._dieu_kien:
+            self._da_dong = True
+            ranh, self._ranh = self._ranh, []
+            self._da_mo -= len(ranh)
+        for conn in ranh:
+            conn.close()
+
+
+_pool: Optional[BeKetNoi] = None
+_khoa_pool = threading.Lock()
+
+
+def cau_hinh(duong_dan: str = None, kich_thuoc: int = None):
+    """Đổi database hoặc kích thước pool (dùng cho benchmark/database tạm)"""
+    global DB_PATH, POOL_SIZE, _pool
+    with _khoa_pool:
+        if duong_dan is not None:
+            DB_PATH = duong_dan
+        if kich_thuoc is not None:
+            POOL_SIZE = kich_thuoc
+        if _pool is not None:
+            _pool.dong_tat_ca()
+        _pool = None
+
+
+def _lay_pool() -> BeKetNoi:
+    global _pool
+    if _pool is None:
+        with _khoa_pool:
+            if _pool is None:
+                _pool = BeKetNoi(DB_PATH, POOL_SIZE)
+    return _pool
+
+
+def get_db():
+    """Kết nối database"""
+    if POOL_SIZE <= 0:
+        conn = mo_ket_noi(DB_PATH)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    conn = _lay_pool().lay()
+    if has_app_context():
+        g.setdefault('_ket_noi_db', []).append(conn)
+    return conn
+
+
+def _tra_ket_noi_request(exc=None):
+    """Thu hồi các kết nối request đã mượn nhưng chưa close()"""
+    for conn in g.pop('_ket_noi_db', []):
+        conn.close()
+
+
+def _so_ket_noi_pool():
+    pool = _pool
+    if pool is None:
+        return {}
+    with pool._dieu_kien:
+        ranh = len(pool._ranh)
+        return {('idle',): ranh, ('in_use',): pool._da_mo - ranh}
+
+
+metrics.dang_ky(metrics.DocKhiXuat(
+    'cinema_db_pool_connections', 'Số kết nối của pool theo trạng thái', 'gauge', ('state',), _so_ket_noi_pool))
+
+
+def init_app(app):
+    """Đăng ký thu hồi kết nối khi Flask teardown"""
+    app.teardown_appcontext(_tra_ket_noi_request)
@@ -0,0 +1,77 @@
+"""
+HUY CINEMA - Bộ hẹn giờ giải phóng ghế hết hạn giữ
+Thay cho việc chạy UPDATE toàn bảng seats ở đầu mỗi request: mỗi lần giữ ghế đăng ký
+một mốc (held_until, suất chiếu, ghế) vào min-heap, một thread nền ngủ đến mốc sớm nhất
+rồi chỉ giải phóng đúng những ghế đã hết hạn.
+"""
+
+import heapq
+import logging
+import threading
+import time
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Thử lại sau bao nhiêu giây nếu giải phóng thất bại (vd. database is locked)
+THU_LAI_SAU = 5
+
+
+class BoHenGioGiaiPhong:
+    """
+    Class BộHẹnGiờGiảiPhóng - Lập lịch giải phóng ghế giữ quá hạn
+    Attributes:
+        - xu_ly: callable(masuatchieu, danh_sach_ghe) giải phóng các ghế đến hạn
+    Methods:
+        + Hen(): Đăng ký mốc hết hạn cho một ghế
+    """
+
+    def __init__(self, xu_ly: Callable[[int, List[int]], None]):
+        self._xu_ly = xu_ly
+        self._heap = []
+        self._dieu_kien = threading.Condition()
+        self._thread = None
+
+    def hen(self, han: float, masuatchieu: int, maghe: int):
+        """
+        Hẹn kiểm tra ghế vào thời điểm han (epoch). Mốc cũ của ghế không cần hủy:
+        lúc đến hạn, xu_ly tự bỏ qua ghế đã được giữ lại, bỏ giữ hoặc đã đặt.
+        """
+        with self._dieu_kien:
+            heapq.heappush(self._heap, (han, masuatchieu, maghe))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._chay, name='hold-expiry', daemon=True)
+                self._thread.start()
+            # Đánh thức thread để tính lại mốc sớm nhất
+            self._dieu_kien.notify()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def _lay_den_han(self) -> list:
+        with self._dieu_kien:
+            while True:
+                now = time.time()
+                if self._heap and self._heap[0][0] <= now:
+                    break
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._dieu_kien.wait(timeout)
+
+            den_han = []
+            while self._heap and self._heap[0][0] <= now:
+                den_han.append(heapq.heappop(self._heap))
+            return den_han
+
+    def _chay(self):
+        while True:
+            theo_suat_chieu = {}
+            for _, masuatchieu, maghe in self._lay_den_han():
+                theo_suat_chieu.setdefault(masuatchieu, []).append(maghe)
+
+            for masuatchieu, danh_sach_ghe in theo_suat_chieu.items():
+                try:
+                    self._xu_ly(masuatchieu, danh_sach_ghe)
+                except Exception:
+                    logger.exception('Không giải phóng được ghế hết hạn của suất chiếu %s', masuatchieu)
+                    for maghe in danh_sach_ghe:
+                        self.hen(time.time() + THU_LAI_SAU, masuatchieu, maghe)
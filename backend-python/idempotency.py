@@ -0,0 +1,215 @@
+"""
+HUY CINEMA - Khóa chống lặp (Idempotency-Key) cho đặt vé và giữ ghế
+Client mạng chập chờn gửi lại POST /book hay /api/hold-seat khi không nhận được
+response. Nếu request có khóa (header Idempotency-Key, hoặc trường idempotency_key của
+form/JSON), kết quả lần đầu được lưu theo (endpoint, user, khóa) trong CINEMA_IDEMPOTENCY_TTL
+giây: lần gửi lại nhận đúng kết quả đó mà không chạm bảng seats. Request trùng khóa
+đến khi lần đầu chưa xong thì chờ lần đầu thay vì chạy song song: tối đa SO_CHO_TOI_DA
+thread chờ mỗi khóa, quá số đó trả ngay KhoaDangXuLy (409) để client gửi lại dồn dập
+không chiếm hết thread. Chế độ ASGI chờ trên event loop (cho_async) trước khi chuyển
+request sang thread pool DB.
+
+Cùng khóa nhưng nội dung khác (vd. ghế khác) là lỗi của client: KhoaKhongKhop.
+Không có khóa thì chạy như cũ. Kho nằm trong bộ nhớ của tiến trình.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple, TypeVar
+
+import metrics
+from cache import BoNhoDem
+
+# Thời gian giữ kết quả (giây) và số khóa tối đa
+TTL = float(os.environ.get('CINEMA_IDEMPOTENCY_TTL', 15 * 60))
+KICH_THUOC = int(os.environ.get('CINEMA_IDEMPOTENCY_SIZE', 10000))
+
+# Thời gian tối đa một request trùng khóa chờ lần đầu (giây)
+CHO_TOI_DA = 30
+
+# Số thread tối đa cùng chờ lần đầu của một khóa
+SO_CHO_TOI_DA = int(os.environ.get('CINEMA_IDEMPOTENCY_WAITERS', 4))
+
+DO_DAI_KHOA_TOI_DA = 255
+
+T = TypeVar('T')
+
+
+class KhoaKhongHopLe(ValueError):
+    """Khóa rỗng hoặc dài quá DO_DAI_KHOA_TOI_DA"""
+
+
+class KhoaKhongKhop(ValueError):
+    """Khóa đã dùng cho một request có nội dung khác"""
+
+
+class KhoaDangXuLy(RuntimeError):
+    """Lần đầu của khóa chạy quá CHO_TOI_DA giây mà chưa xong, hoặc đã đủ SO_CHO_TOI_DA request chờ"""
+
+
+class _DangChay:
+    __slots__ = ('van_tay', 'xong', 'co_ket_qua', 'ket_qua', 'so_cho', 'cho_async')
+
+    def __init__(self, van_tay: str):
+        self.van_tay = van_tay
+        self.xong = threading.Event()
+        self.co_ket_qua = False
+        self.ket_qua = None
+        # Số thread đang chờ và coroutine đang chờ (Future -> event loop)
+        self.so_cho = 0
+        self.cho_async: Dict[asyncio.Future, asyncio.AbstractEventLoop] = {}
+
+
+def _danh_thuc(tuong_lai: asyncio.Future):
+    if not tuong_lai.done():
+        tuong_lai.set_result(None)
+
+
+def van_tay(noi_dung: Any) -> str:
+    """Băm nội dung request để nhận ra cùng khóa nhưng khác nội dung"""
+    return hashlib.sha256(json.dumps(noi_dung, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class KhoChongLap:
+    """
+    Class KhoChốngLặp - Kết quả theo khóa chống lặp (TTL + LRU) và các lần chạy dở
+    Methods:
+        + ThucHien(): Chạy ham() một lần cho mỗi khóa, lần lặp lại nhận kết quả đã lưu
+        + ChoAsync(): Coroutine chờ lần đầu đang chạy của khóa xong, không giữ thread
+        + ThongKe(): Thống kê của cache kết quả
+        + XoaTatCa(): Bỏ mọi kết quả đã lưu
+    """
+
+    def __init__(self, kich_thuoc: int = KICH_THUOC, ttl: float = TTL):
+        self._ket_qua = BoNhoDem('idempotency', kich_thuoc=kich_thuoc, ttl=ttl)
+        self._dang_chay: Dict[Hashable, _DangChay] = {}
+        self._khoa = threading.Lock()
+
+    def thuc_hien(self, pham_vi: Hashable, khoa: Optional[str], noi_dung: Any, ham: Callable[[], T],
+                  nen_luu: Callable[[T], bool] = lambda ket_qua: True) -> T:
+        """
+        pham_vi: (endpoint, user_id) để khóa của người này không trùng người khác.
+        nen_luu(ket_qua) = False cho kết quả tạm thời (đang xếp hàng, lỗi server): lần
+        gửi lại được chạy lại. Request trùng khóa đang chờ vẫn nhận kết quả đó.
+        """
+        if khoa is None:
+            return ham()
+        if not khoa or len(khoa) > DO_DAI_KHOA_TOI_DA:
+            raise KhoaKhongHopLe(khoa)
+
+        muc_khoa = (pham_vi, khoa)
+        dau = van_tay(noi_dung)
+        while True:
+            with self._khoa:
+                da_luu = self._ket_qua.doc(muc_khoa)
+                if da_luu is None:
+                    dang_chay = self._dang_chay.get(muc_khoa)
+                    la_lan_dau = dang_chay is None
+                    if la_lan_dau:
+                        dang_chay = self._dang_chay[muc_khoa] = _DangChay(dau)
+
+            if da_luu is not None:
+                if da_luu[0] != dau:
+                    dem_khoa.cong('mismatch')
+                    raise KhoaKhongKhop(khoa)
+                dem_khoa.cong('replay')
+                return da_luu[1]
+            if la_lan_dau:
+                break
+
+            if dang_chay.van_tay != dau:
+                dem_khoa.cong('mismatch')
+                raise KhoaKhongKhop(khoa)
+            with self._khoa:
+                du_cho = dang_chay.so_cho >= SO_CHO_TOI_DA
+                if not du_cho:
+                    dang_chay.so_cho += 1
+            if du_cho:
+                dem_khoa.cong('busy')
+                raise KhoaDangXuLy(khoa)
+            dem_khoa.cong('waited')
+            try:
+                da_xong = dang_chay.xong.wait(CHO_TOI_DA)
+            finally:
+                with self._khoa:
+                    dang_chay.so_cho -= 1
+            if not da_xong:
+                raise KhoaDangXuLy(khoa)
+            if dang_chay.co_ket_qua:
+                return dang_chay.ket_qua
+            # Lần đầu bị lỗi (exception): thử lại từ đầu, có thể trở thành lần đầu mới
+
+        dem_khoa.cong('new')
+        try:
+            ket_qua = ham()
+        except BaseException:
+            with self._khoa:
+                del self._dang_chay[muc_khoa]
+            self._xong(dang_chay)
+            raise
+
+        with self._khoa:
+            if nen_luu(ket_qua):
+                self._ket_qua.ghi(muc_khoa, (dau, ket_qua), self._ket_qua.phien_ban)
+            del self._dang_chay[muc_khoa]
+        dang_chay.ket_qua = ket_qua
+        dang_chay.co_ket_qua = True
+        self._xong(dang_chay)
+        return ket_qua
+
+    def _xong(self, dang_chay: _DangChay):
+        """Đánh thức thread và coroutine đang chờ lần chạy này"""
+        dang_chay.xong.set()
+        with self._khoa:
+            cho_async = list(dang_chay.cho_async.items())
+            dang_chay.cho_async.clear()
+        for tuong_lai, loop in cho_async:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_danh_thuc, tuong_lai)
+
+    async def cho_async(self, pham_vi: Hashable, khoa: Optional[str], noi_dung: Any) -> Tuple[bool, Any]:
+        """
+        Nếu lần đầu của khóa đang chạy (cùng nội dung) thì chờ nó xong trên event loop
+        đang chạy, trả về (True, kết quả của nó). Ngược lại trả về (False, None): gọi
+        thuc_hien() như thường (trả kết quả đã lưu, chạy lần đầu hoặc báo lỗi khóa).
+        """
+        if not khoa or len(khoa) > DO_DAI_KHOA_TOI_DA:
+            return False, None
+        dau = van_tay(noi_dung)
+        tuong_lai = None
+        with self._khoa:
+            dang_chay = self._dang_chay.get((pham_vi, khoa))
+            if dang_chay is not None and dang_chay.van_tay == dau and not dang_chay.xong.is_set():
+                loop = asyncio.get_running_loop()
+                tuong_lai = loop.create_future()
+                dang_chay.cho_async[tuong_lai] = loop
+        if tuong_lai is None:
+            return False, None
+        dem_khoa.cong('waited')
+        try:
+            await asyncio.wait_for(tuong_lai, CHO_TOI_DA)
+        except asyncio.TimeoutError:
+            raise KhoaDangXuLy(khoa) from None
+        finally:
+            with self._khoa:
+                dang_chay.cho_async.pop(tuong_lai, None)
+        # Lần đầu bị lỗi (exception): không có kết quả, thuc_hien() chạy lại
+        return dang_chay.co_ket_qua, dang_chay.ket_qua
+
+    def thong_ke(self) -> Dict[str, Any]:
+        return self._ket_qua.thong_ke()
+
+    def xoa_tat_ca(self):
+        """Bỏ mọi kết quả đã lưu; lần chạy dở vẫn chạy xong và đánh thức request đang chờ"""
+        with self._khoa:
+            self._ket_qua.xoa_tat_ca()
+
+
+dem_khoa = metrics.dang_ky(metrics.BoDem(
+    'cinema_idempotency_requests_total',
+    "Request có khóa chống lặp theo kết quả ('new', 'replay', 'waited', 'busy', 'mismatch')", ('result',)))
+
+kho_chong_lap = KhoChongLap()
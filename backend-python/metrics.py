@@ -0,0 +1,237 @@
+"""
+HUY CINEMA - Số liệu vận hành (metrics) theo định dạng text của Prometheus
+Mỗi request được đếm theo (route, method, mã HTTP) và đo thời gian bằng histogram.
+Kết nối mượn từ db.get_db() đếm số câu lệnh, thời gian trong SQLite và số dòng trả về
+theo (route, hàm gọi). Nhãn hàm gọi (hàm đầu tiên ngoài db.py trên stack, vd.
+'app.huy_ve_qua_gio' hay 'seat_map.SoDoGhe.giu_ghe') cần duyệt stack cho mỗi câu lệnh
+nên chỉ bật khi cần tìm một route tốn thời gian DB ở đâu (CINEMA_METRICS_CALLER=1);
+mặc định nhãn là '-'. Slow-query log vẫn luôn ghi hàm gọi. Thời gian chờ mượn kết nối từ pool, chờ khóa ghi và lỗi 'database is locked'
+được đếm riêng theo route.
+
+Route của thread hiện tại được đặt bởi Flask (before_request) hoặc chế độ ASGI; việc
+chạy ngoài request (bộ hẹn giờ giải phóng ghế, khởi động) mang route 'background'.
+Tắt bằng CINEMA_METRICS=0. Xem tại /metrics (localhost hoặc admin).
+"""
+
+import bisect
+import os
+import sys
+import threading
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Bật/tắt đo đạc (tắt thì kết nối DB không bọc thêm gì)
+BAT = os.environ.get('CINEMA_METRICS', '1') != '0'
+
+# Gắn nhãn hàm gọi cho số liệu SQL (duyệt stack mỗi câu lệnh)
+THEO_HAM_GOI = os.environ.get('CINEMA_METRICS_CALLER', '0') == '1'
+
+# Nhãn hàm gọi khi không theo dõi
+KHONG_RO = '-'
+
+# Mốc histogram thời gian request (giây)
+MOC_THOI_GIAN = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Route khi không ở trong request nào
+NGOAI_REQUEST = 'background'
+
+_cuc_bo = threading.local()
+
+
+def dat_route(ten: str = None):
+    """Đặt route cho thread hiện tại (None = đã ra khỏi request)"""
+    _cuc_bo.route = ten
+
+
+def route_hien_tai() -> str:
+    return getattr(_cuc_bo, 'route', None) or NGOAI_REQUEST
+
+
+# File bỏ qua khi tìm hàm gọi: lớp bọc kết nối và chính module này
+_FILE_BO_QUA = {os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db.py'), os.path.abspath(__file__)}
+
+# Frame của list/dict comprehension, generator: tính cho hàm chứa nó
+_BIEU_THUC_LAP = {'<listcomp>', '<dictcomp>', '<setcomp>', '<genexpr>'}
+
+
+def ham_goi(bo_qua: int = 2) -> str:
+    """'module.Hàm' của frame đầu tiên ngoài db.py/metrics.py trên stack"""
+    frame = sys._getframe(bo_qua)
+    while frame is not None and (frame.f_code.co_filename in _FILE_BO_QUA
+                                 or frame.f_code.co_name in _BIEU_THUC_LAP):
+        frame = frame.f_back
+    if frame is None:
+        return KHONG_RO
+    # co_qualname có từ Python 3.11
+    ten = getattr(frame.f_code, 'co_qualname', frame.f_code.co_name)
+    return f"{frame.f_globals.get('__name__', '?')}.{ten}"
+
+
+def _escape(gia_tri) -> str:
+    return str(gia_tri).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _nhan(ten_nhan: Sequence[str], gia_tri: Tuple) -> str:
+    cap = [f'{k}="{_escape(v)}"' for k, v in zip(ten_nhan, gia_tri)]
+    return '{' + ','.join(cap) + '}' if cap else ''
+
+
+def _so(gia_tri: float) -> str:
+    if gia_tri == int(gia_tri) and abs(gia_tri) < 1e15:
+        return str(int(gia_tri))
+    return repr(float(gia_tri))
+
+
+class BoDem:
+    """
+    Class BộĐếm - Counter Prometheus có nhãn, an toàn đa luồng
+    Methods:
+        + Cong(): Cộng giá trị cho một bộ nhãn
+        + Dong(): Các dòng text Prometheus
+    """
+
+    loai = 'counter'
+
+    def __init__(self, ten: str, mo_ta: str, nhan: Sequence[str] = ()):
+        self.ten = ten
+        self.mo_ta = mo_ta
+        self.nhan = tuple(nhan)
+        self._gia_tri: Dict[Tuple, float] = {}
+        self._khoa = threading.Lock()
+
+    def cong(self, *nhan, gia_tri: float = 1):
+        with self._khoa:
+            self._gia_tri[nhan] = self._gia_tri.get(nhan, 0) + gia_tri
+
+    def doc(self) -> Dict[Tuple, float]:
+        with self._khoa:
+            return dict(self._gia_tri)
+
+    def dong(self) -> Iterator[str]:
+        for nhan, gia_tri in sorted(self.doc().items()):
+            yield f'{self.ten}{_nhan(self.nhan, nhan)} {_so(gia_tri)}'
+
+
+class BieuDo:
+    """
+    Class BiểuĐồ - Histogram Prometheus có nhãn (bucket tích lũy, _sum, _count)
+    Methods:
+        + QuanSat(): Ghi một giá trị cho một bộ nhãn
+        + Dong(): Các dòng text Prometheus
+    """
+
+    loai = 'histogram'
+
+    def __init__(self, ten: str, mo_ta: str, nhan: Sequence[str] = (), moc: Sequence[float] = MOC_THOI_GIAN):
+        self.ten = ten
+        self.mo_ta = mo_ta
+        self.nhan = tuple(nhan)
+        self.moc = tuple(moc)
+        # nhãn -> [số lần rơi vào từng bucket..., +Inf, tổng giá trị]
+        self._gia_tri: Dict[Tuple, List[float]] = {}
+        self._khoa = threading.Lock()
+
+    def quan_sat(self, gia_tri: float, *nhan):
+        vi_tri = bisect.bisect_left(self.moc, gia_tri)
+        with self._khoa:
+            dem = self._gia_tri.get(nhan)
+            if dem is None:
+                dem = self._gia_tri[nhan] = [0] * (len(self.moc) + 1) + [0.0]
+            dem[vi_tri] += 1
+            dem[-1] += gia_tri
+
+    def dong(self) -> Iterator[str]:
+        with self._khoa:
+            muc = sorted((nhan, list(dem)) for nhan, dem in self._gia_tri.items())
+        for nhan, dem in muc:
+            tich_luy = 0
+            for moc, so_lan in zip(self.moc + (float('inf'),), dem):
+                tich_luy += so_lan
+                le = '+Inf' if moc == float('inf') else repr(moc)
+                yield f'{self.ten}_bucket{_nhan(self.nhan + ("le",), nhan + (le,))} {tich_luy}'
+            yield f'{self.ten}_sum{_nhan(self.nhan, nhan)} {_so(dem[-1])}'
+            yield f'{self.ten}_count{_nhan(self.nhan, nhan)} {tich_luy}'
+
+
+class DocKhiXuat:
+    """
+    Class ĐọcKhiXuất - Số liệu lấy từ nơi khác lúc xuất (pool kết nối, cache)
+    ham() trả về {bộ nhãn: giá trị}
+    """
+
+    def __init__(self, ten: str, mo_ta: str, loai: str, nhan: Sequence[str], ham: Callable[[], Dict[Tuple, float]]):
+        self.ten = ten
+        self.mo_ta = mo_ta
+        self.loai = loai
+        self.nhan = tuple(nhan)
+        self.ham = ham
+
+    def dong(self) -> Iterator[str]:
+        for nhan, gia_tri in sorted(self.ham().items()):
+            yield f'{self.ten}{_nhan(self.nhan, nhan)} {_so(gia_tri)}'
+
+
+_so_lieu: List = []
+
+
+def dang_ky(so_lieu):
+    _so_lieu.append(so_lieu)
+    return so_lieu
+
+
+def xuat() -> str:
+    """Toàn bộ số liệu theo định dạng text của Prometheus (version 0.0.4)"""
+    dong = []
+    for so_lieu in _so_lieu:
+        dong.append(f'# HELP {so_lieu.ten} {so_lieu.mo_ta}')
+        dong.append(f'# TYPE {so_lieu.ten} {so_lieu.loai}')
+        dong.extend(so_lieu.dong())
+    return '\n'.join(dong) + '\n'
+
+
+# ===== HTTP =====
+http_so_request = dang_ky(BoDem(
+    'cinema_http_requests_total', 'Số request HTTP theo route, method và mã trạng thái',
+    ('route', 'method', 'status')))
+http_thoi_gian = dang_ky(BieuDo(
+    'cinema_http_request_duration_seconds', 'Thời gian xử lý request (tới khi trả response)',
+    ('route',)))
+
+
+def ghi_request(route: str, method: str, status: int, giay: float):
+    http_so_request.cong(route, method, str(status))
+    http_thoi_gian.quan_sat(giay, route)
+
+
+# ===== SQLITE =====
+sql_so_cau_lenh = dang_ky(BoDem(
+    'cinema_sql_queries_total', 'Số câu lệnh SQL (kể cả COMMIT) theo route và hàm gọi',
+    ('route', 'caller')))
+sql_thoi_gian = dang_ky(BoDem(
+    'cinema_sql_seconds_total', 'Thời gian trong SQLite (thực thi + đọc kết quả) theo route và hàm gọi',
+    ('route', 'caller')))
+sql_so_dong = dang_ky(BoDem(
+    'cinema_sql_rows_total', 'Số dòng kết quả đã đọc theo route và hàm gọi',
+    ('route', 'caller')))
+sql_cho_khoa = dang_ky(BoDem(
+    'cinema_sql_lock_wait_seconds_total',
+    'Thời gian các câu lệnh mở transaction ghi, gồm thời gian chờ khóa ghi (busy_timeout)',
+    ('route',)))
+sql_cho_pool = dang_ky(BoDem(
+    'cinema_sql_pool_wait_seconds_total', 'Thời gian chờ mượn kết nối từ pool', ('route',)))
+sql_loi = dang_ky(BoDem(
+    'cinema_sql_errors_total', "Số lỗi SQLite theo loại ('locked' hoặc 'other')", ('route', 'error')))
+
+
+def ghi_cau_lenh(route: str, caller: str, giay: float):
+    sql_so_cau_lenh.cong(route, caller)
+    sql_thoi_gian.cong(route, caller, gia_tri=giay)
+
+
+def ghi_doc_ket_qua(route: str, caller: str, giay: float, so_dong: int):
+    sql_thoi_gian.cong(route, caller, gia_tri=giay)
+    if so_dong:
+        sql_so_dong.cong(route, caller, gia_tri=so_dong)
+
+
+def ghi_loi_sql(route: str, loi: Exception):
+    sql_loi.cong(route, 'locked' if 'locked' in str(loi) else 'other')
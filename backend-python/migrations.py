@@ -0,0 +1,313 @@
+"""
+HUY CINEMA - Migration schema có đánh số
+Phiên bản schema lưu trong PRAGMA user_version. init_db() gọi nang_cap(): nếu
+database đã ở phiên bản mới nhất thì không làm gì, ngược lại chạy lần lượt các
+migration còn thiếu, mỗi migration trong một transaction riêng.
+
+Kiểm tra các truy vấn nóng có dùng index:  python migrations.py --check
+"""
+
+import sqlite3
+import sys
+from typing import Callable, List, Tuple
+
+
+def _them_cot_neu_thieu(conn: sqlite3.Connection, bang: str, cot: str, kieu: str):
+    """ALTER TABLE ADD COLUMN chỉ khi bảng chưa có cột"""
+    cot_hien_co = {row[1] for row in conn.execute(f'PRAGMA table_info({bang})')}
+    if cot not in cot_hien_co:
+        conn.execute(f'ALTER TABLE {bang} ADD COLUMN {cot} {kieu}')
+
+
+def _m1_bang_co_ban(conn: sqlite3.Connection):
+    """Các bảng gốc + bù cột cho database cũ (trước đây chạy ALTER TABLE mỗi lần khởi động)"""
+    for sql in (
+        '''CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT,
+            password TEXT NOT NULL,
+            full_name TEXT,
+            phone TEXT,
+            is_admin INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE TABLE IF NOT EXISTS movies_info (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            genre TEXT,
+            duration INTEGER,
+            poster_url TEXT,
+            trailer_url TEXT,
+            description TEXT,
+            director TEXT,
+            cast_members TEXT
+        )''',
+        '''CREATE TABLE IF NOT EXISTS theaters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            seat_rows INTEGER DEFAULT 5,
+            seats_per_row INTEGER DEFAULT 10,
+            total_seats INTEGER DEFAULT 50
+        )''',
+        '''CREATE TABLE IF NOT EXISTS showtimes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            movie_id INTEGER,
+            theater TEXT,
+            show_date TEXT,
+            show_time TEXT,
+            price REAL DEFAULT 75000,
+            FOREIGN KEY (movie_id) REFERENCES movies_info(id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS seats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            showtime_id INTEGER,
+            seat_number TEXT,
+            status TEXT DEFAULT 'available',
+            held_by INTEGER DEFAULT NULL,
+            held_until TEXT DEFAULT NULL,
+            FOREIGN KEY (showtime_id) REFERENCES showtimes(id),
+            FOREIGN KEY (held_by) REFERENCES users(id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS bookings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            showtime_id INTEGER,
+            seat_id INTEGER,
+            seat_number TEXT,
+            price REAL,
+            status TEXT DEFAULT 'confirmed',
+            booking_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (showtime_id) REFERENCES showtimes(id),
+            FOREIGN KEY (seat_id) REFERENCES seats(id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS job_state (
+            name TEXT PRIMARY KEY,
+            value TEXT
+        )''',
+    ):
+        conn.execute(sql)
+
+    _them_cot_neu_thieu(conn, 'movies_info', 'trailer_url', 'TEXT')
+    _them_cot_neu_thieu(conn, 'movies_info', 'director', 'TEXT')
+    _them_cot_neu_thieu(conn, 'movies_info', 'cast_members', 'TEXT')
+    _them_cot_neu_thieu(conn, 'seats', 'held_by', 'INTEGER DEFAULT NULL')
+    _them_cot_neu_thieu(conn, 'seats', 'held_until', 'TEXT DEFAULT NULL')
+
+
+def _m2_index_truy_van_nong(conn: sqlite3.Connection):
+    """Index cho các truy vấn chạy ở mỗi request"""
+    for sql in (
+        # Sơ đồ ghế của một suất chiếu (ORDER BY seat_number) và tìm ghế theo số ghế
+        'CREATE INDEX IF NOT EXISTS idx_seats_showtime ON seats(showtime_id, seat_number)',
+        # Partial index: chỉ ghế đang giữ, dùng khi quét ghế hết hạn giữ
+        "CREATE INDEX IF NOT EXISTS idx_seats_held ON seats(held_until) WHERE status = 'held'",
+        # Vé của tôi (WHERE user_id ORDER BY booking_time DESC)
+        'CREATE INDEX IF NOT EXISTS idx_bookings_user_time ON bookings(user_id, booking_time)',
+        # Vé của một suất chiếu theo trạng thái (hủy vé quá giờ, doanh thu theo suất)
+        'CREATE INDEX IF NOT EXISTS idx_bookings_showtime_status ON bookings(showtime_id, status)',
+        # Thống kê theo trạng thái vé
+        'CREATE INDEX IF NOT EXISTS idx_bookings_status ON bookings(status)',
+        # Suất chiếu của một phim (ORDER BY show_date, show_time)
+        'CREATE INDEX IF NOT EXISTS idx_showtimes_movie_date ON showtimes(movie_id, show_date, show_time)',
+        # Suất chiếu theo giờ chiếu (mốc của huy_ve_qua_gio)
+        'CREATE INDEX IF NOT EXISTS idx_showtimes_date_time ON showtimes(show_date, show_time)',
+    ):
+        conn.execute(sql)
+
+
+def _m3_tim_kiem_toan_van(conn: sqlite3.Connection):
+    """Chỉ mục FTS5 cho tìm kiếm phim (xem movie_search.py)"""
+    import movie_search
+    movie_search.tao_chi_muc(conn)
+
+
+def _m4_index_phan_trang_admin(conn: sqlite3.Connection):
+    """Index cho phân trang keyset của danh sách vé trong trang admin"""
+    # Vé mới đặt trước (ORDER BY booking_time DESC, id DESC - id là rowid, đã có trong index)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_bookings_time ON bookings(booking_time)')
+    # Lọc theo trạng thái rồi phân trang; thay cho idx_bookings_status (là tiền tố của index này)
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_bookings_status_time ON bookings(status, booking_time)')
+    conn.execute('DROP INDEX IF EXISTS idx_bookings_status')
+
+
+def _m5_bo_dem_thong_ke(conn: sqlite3.Connection):
+    """Bảng bộ đếm cho thống kê tổng quan, khởi tạo từ dữ liệu hiện có (xem counters.py)"""
+    import counters
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS counters (
+            name TEXT PRIMARY KEY,
+            value REAL NOT NULL DEFAULT 0
+        )
+    ''')
+    counters.ghi_de(conn, counters.tinh_tu_dau(conn))
+
+
+def _m6_tong_hop_doanh_thu(conn: sqlite3.Connection):
+    """Bảng tổng hợp doanh thu theo phim và ngày chiếu, dựng từ bookings hiện có (xem revenue.py)"""
+    import revenue
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS revenue_daily (
+            movie_id INTEGER NOT NULL,
+            show_date TEXT NOT NULL,
+            tickets_sold INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            cancellations INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (movie_id, show_date)
+        ) WITHOUT ROWID
+    ''')
+    # Báo cáo doanh thu theo khoảng ngày của tất cả phim
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_revenue_daily_date ON revenue_daily(show_date)')
+    revenue.xay_lai(conn)
+
+
+def _m7_luu_ghe_thua(conn: sqlite3.Connection):
+    """
+    Lưu ghế thưa (xem seat_map.py): bố cục ghế của suất chiếu lấy từ bảng theaters,
+    bảng seats chỉ giữ ghế đang giữ/đã đặt
+    """
+    # NULL = suất chiếu lưu đủ mọi ghế (các suất chiếu đã có)
+    _them_cot_neu_thieu(conn, 'showtimes', 'seat_rows', 'INTEGER')
+    _them_cot_neu_thieu(conn, 'showtimes', 'seats_per_row', 'INTEGER')
+    # Bố cục các phòng chiếu đang dùng (PhongChieu.lay_tat_ca trước đây trả cứng 3 phòng 5 x 10)
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_theaters_name ON theaters(name)')
+    conn.executemany('''
+        INSERT OR IGNORE INTO theaters (name, seat_rows, seats_per_row, total_seats) VALUES (?, 5, 10, 50)
+    ''', [('Rạp 1',), ('Rạp 2',), ('Rạp 3',)])
+    # Ghế thưa được ghi bằng upsert theo (showtime_id, seat_number); thay cho idx_seats_showtime
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_seats_showtime_seat ON seats(showtime_id, seat_number)')
+    conn.execute('DROP INDEX IF EXISTS idx_seats_showtime')
+
+
+# (phiên bản, mô tả, hàm) - chỉ thêm vào cuối, không sửa migration đã phát hành
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, 'bảng cơ bản', _m1_bang_co_ban),
+    (2, 'index truy vấn nóng', _m2_index_truy_van_nong),
+    (3, 'tìm kiếm phim toàn văn', _m3_tim_kiem_toan_van),
+    (4, 'index phân trang admin', _m4_index_phan_trang_admin),
+    (5, 'bộ đếm thống kê', _m5_bo_dem_thong_ke),
+    (6, 'tổng hợp doanh thu theo ngày', _m6_tong_hop_doanh_thu),
+    (7, 'lưu ghế thưa', _m7_luu_ghe_thua),
+]
+
+PHIEN_BAN_MOI_NHAT = MIGRATIONS[-1][0]
+
+
+def phien_ban_hien_tai(conn: sqlite3.Connection) -> int:
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def nang_cap(conn: sqlite3.Connection) -> List[int]:
+    """Chạy các migration còn thiếu, trả về danh sách phiên bản vừa áp dụng"""
+    if phien_ban_hien_tai(conn) >= PHIEN_BAN_MOI_NHAT:
+        return []
+
+    da_chay = []
+    isolation_cu = conn.isolation_level
+    conn.isolation_level = None     # tự quản lý transaction
+    try:
+        for phien_ban, _, migration in MIGRATIONS:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Đọc lại trong transaction: process khác có thể vừa nâng cấp xong
+                if phien_ban_hien_tai(conn) >= phien_ban:
+                    conn.execute('ROLLBACK')
+                    continue
+                migration(conn)
+                conn.execute(f'PRAGMA user_version = {phien_ban:d}')
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+            da_chay.append(phien_ban)
+    finally:
+        conn.isolation_level = isolation_cu
+    return da_chay
+
+
+# Truy vấn nóng và bảng phải được tìm qua index (không SCAN cả bảng)
+TRUY_VAN_NONG = [
+    ('sơ đồ ghế', 'seats',
+     'SELECT * FROM seats WHERE showtime_id = ? ORDER BY seat_number', (1,)),
+    ('ghế theo số ghế', 'seats',
+     'SELECT id FROM seats WHERE showtime_id = ? AND seat_number = ?', (1, 'A1')),
+    ('ghế giữ hết hạn', 'seats',
+     "SELECT id FROM seats WHERE status = 'held' AND held_until < ?", ('2025-01-01 00:00:00',)),
+    ('vé của tôi', 'b', '''
+        SELECT b.*, m.title, m.poster_url, s.theater, s.show_date, s.show_time
+        FROM bookings b
+        JOIN showtimes s ON b.showtime_id = s.id
+        JOIN movies_info m ON s.movie_id = m.id
+        WHERE b.user_id = ?
+        ORDER BY b.booking_time DESC''', (2,)),
+    ('vé theo suất chiếu', 'bookings',
+     "SELECT seat_id FROM bookings WHERE status = 'confirmed' AND showtime_id IN (?, ?)", (1, 2)),
+    ('vé đã xác nhận', 'bookings',
+     'SELECT COUNT(*) FROM bookings WHERE status = "confirmed"', ()),
+    ('suất chiếu của phim', 'showtimes',
+     'SELECT * FROM showtimes WHERE movie_id = ? ORDER BY show_date, show_time', (1,)),
+    ('suất chiếu sắp tới của phim', 'showtimes',
+     'SELECT COUNT(*) FROM showtimes WHERE movie_id = ? AND show_date >= date("now")', (1,)),
+    ('admin: trang vé', 'b', '''
+        SELECT b.id FROM bookings b
+        JOIN users u ON b.user_id = u.id
+        JOIN showtimes st ON b.showtime_id = st.id
+        JOIN movies_info m ON st.movie_id = m.id
+        WHERE (b.booking_time, b.id) < (?, ?)
+        ORDER BY b.booking_time DESC, b.id DESC LIMIT 51''', ('2025-12-15 10:00:00', 100)),
+    ('admin: trang vé theo trạng thái', 'b', '''
+        SELECT b.id FROM bookings b
+        WHERE b.status = ? AND (b.booking_time, b.id) < (?, ?)
+        ORDER BY b.booking_time DESC, b.id DESC LIMIT 51''', ('confirmed', '2025-12-15 10:00:00', 100)),
+    ('admin: trang suất chiếu', 's', '''
+        SELECT s.*, m.title FROM showtimes s
+        JOIN movies_info m ON s.movie_id = m.id
+        WHERE (s.show_date, s.show_time, s.id) < (?, ?, ?)
+        ORDER BY s.show_date DESC, s.show_time DESC, s.id DESC LIMIT 51''', ('2025-12-15', '10:00', 100)),
+    ('suất chiếu theo giờ', 'showtimes', '''
+        SELECT id FROM showtimes
+        WHERE (show_date, show_time) >= (?, ?) AND (show_date, show_time) < (?, ?)''',
+     ('2025-01-01', '00:00', '2025-12-31', '23:59')),
+    ('admin: top phim theo doanh thu trong khoảng ngày', 'r', '''
+        SELECT m.id, COALESCE(SUM(r.revenue), 0) AS doanh_thu FROM movies_info m
+        LEFT JOIN revenue_daily r ON r.movie_id = m.id AND r.show_date >= ? AND r.show_date <= ?
+        GROUP BY m.id ORDER BY doanh_thu DESC LIMIT 10''', ('2025-12-01', '2025-12-31')),
+    ('admin: doanh thu theo ngày', 'revenue_daily', '''
+        SELECT show_date, SUM(revenue) FROM revenue_daily
+        WHERE show_date >= ? AND show_date <= ? GROUP BY show_date ORDER BY show_date''',
+     ('2025-12-01', '2025-12-31')),
+]
+
+
+def ke_hoach_truy_van_nong(conn: sqlite3.Connection) -> List[Tuple[str, List[str], bool]]:
+    """(tên, các bước EXPLAIN QUERY PLAN, có quét cả bảng cần index không) của từng truy vấn nóng"""
+    ket_qua = []
+    for ten, bang, sql, tham_so in TRUY_VAN_NONG:
+        ke_hoach = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, tham_so)]
+        quet_bang = any(buoc.startswith(f'SCAN {bang}') and 'USING' not in buoc for buoc in ke_hoach)
+        ket_qua.append((ten, ke_hoach, quet_bang))
+    return ket_qua
+
+
+def kiem_tra_index(conn: sqlite3.Connection) -> bool:
+    """In EXPLAIN QUERY PLAN của từng truy vấn nóng, trả về False nếu có truy vấn quét cả bảng"""
+    ket_qua = ke_hoach_truy_van_nong(conn)
+    for ten, ke_hoach, quet_bang in ket_qua:
+        print(f'{"✗" if quet_bang else "✓"} {ten}')
+        for buoc in ke_hoach:
+            print(f'    {buoc}')
+    return not any(quet_bang for _, _, quet_bang in ket_qua)
+
+
+if __name__ == '__main__':
+    import db
+
+    conn = sqlite3.connect(db.DB_PATH)
+    da_chay = nang_cap(conn)
+    print(f'Schema phiên bản {phien_ban_hien_tai(conn)}' + (f' (vừa chạy {da_chay})' if da_chay else ''))
+    if '--check' in sys.argv[1:]:
+        ok = kiem_tra_index(conn)
+        conn.close()
+        sys.exit(0 if ok else 1)
+    conn.close()
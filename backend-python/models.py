@@ -3,20 +3,21 @@ HUY CINEMA - Models theo Class Diagram
 Các class đại diện cho các thực thể trong hệ thống đặt vé xem phim
 """
 
-import sqlite3
 import hashlib
 import os
-from datetime import datetime
-from typing import List, Optional, Dict, Any
+import time
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Tuple
 
-# Database path
-DB_PATH = os.path.join(os.path.dirname(__file__), 'database.db')
-
-def get_db():
-    """Kết nối database"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Kết nối database lấy từ pool trong db.py
+from cache import danh_muc, nguoi_dung
+import counters
+from db import get_db
+import movie_search
+import revenue
+from pagination import KICH_THUOC_TRANG, cat_trang, dieu_kien_sau, giai_ma_con_tro
+import seat_map
+from seat_map import BO_CUC_MAC_DINH, SoDoGhe, ghe_theo_bo_cuc, ghi_trang_thai_ghe, so_do_ghe, tra_ghe_cua_ve
 
 
 # ===== CLASS ADMIN =====
@@ -55,39 +56,17 @@ class Admin:
         return None
     
     def xem_thong_ke_tong_quan(self) -> Dict[str, Any]:
-        """Xem thống kê tổng quan hệ thống"""
+        """Xem thống kê tổng quan hệ thống (đọc từ bảng counters)"""
         conn = get_db()
-        
-        stats = {
-            'tong_phim': conn.execute('SELECT COUNT(*) FROM movies_info').fetchone()[0],
-            'tong_suat_chieu': conn.execute('SELECT COUNT(*) FROM showtimes').fetchone()[0],
-            'tong_ve_dat': conn.execute('SELECT COUNT(*) FROM bookings WHERE status = "confirmed"').fetchone()[0],
-            'tong_doanh_thu': conn.execute('SELECT COALESCE(SUM(price), 0) FROM bookings WHERE status = "confirmed"').fetchone()[0],
-            'tong_khach_hang': conn.execute('SELECT COUNT(*) FROM users WHERE is_admin = 0').fetchone()[0],
-        }
-        
+        stats = counters.doc(conn)
         conn.close()
         return stats
     
-    def lay_top_phim_doanh_thu(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Lấy top phim có doanh thu cao nhất"""
+    def lay_top_phim_doanh_thu(self, limit: int = 10, tu_ngay: str = None,
+                               den_ngay: str = None) -> List[Dict[str, Any]]:
+        """Lấy top phim có doanh thu cao nhất (đọc từ bảng revenue_daily)"""
         conn = get_db()
-        
-        rows = conn.execute('''
-            SELECT 
-                m.id,
-                m.title,
-                m.poster_url,
-                COUNT(b.id) as so_ve_ban,
-                COALESCE(SUM(b.price), 0) as doanh_thu
-            FROM movies_info m
-            LEFT JOIN showtimes s ON m.id = s.movie_id
-            LEFT JOIN bookings b ON s.id = b.showtime_id AND b.status = 'confirmed'
-            GROUP BY m.id
-            ORDER BY doanh_thu DESC
-            LIMIT ?
-        ''', (limit,)).fetchall()
-        
+        rows = revenue.top_phim(conn, limit, tu_ngay, den_ngay)
         conn.close()
         
         return [
@@ -100,6 +79,14 @@ class Admin:
             }
             for row in rows
         ]
+    
+    def lay_doanh_thu_theo_ngay(self, tu_ngay: str = None, den_ngay: str = None,
+                                maphim: int = None) -> List[Dict[str, Any]]:
+        """Doanh thu từng ngày chiếu trong khoảng ngày (đọc từ bảng revenue_daily)"""
+        conn = get_db()
+        rows = revenue.theo_ngay(conn, tu_ngay, den_ngay, maphim)
+        conn.close()
+        return [dict(row) for row in rows]
 
 
 # ===== CLASS PHIM =====
@@ -136,13 +123,9 @@ class Phim:
         self.theloai = theloai
     
     @classmethod
-    def lay_tat_ca(cls) -> List['Phim']:
-        """Lấy tất cả phim"""
-        conn = get_db()
-        rows = conn.execute('SELECT * FROM movies_info ORDER BY id DESC').fetchall()
-        conn.close()
-        
-        return [cls(
+    def _tu_dong(cls, row) -> 'Phim':
+        """Tạo đối tượng Phim từ một dòng movies_info"""
+        return cls(
             maphim=row['id'],
             tenphim=row['title'],
             theloai=row['genre'],
@@ -152,50 +135,42 @@ class Phim:
             tomtat=row['description'],
             daodien=row['director'] if 'director' in row.keys() else None,
             dienvien=row['cast_members'] if 'cast_members' in row.keys() else None
-        ) for row in rows]
+        )
     
-    @classmethod
-    def tim_theo_id(cls, maphim: int) -> Optional['Phim']:
-        """Tìm phim theo ID"""
+    @staticmethod
+    def _doc_tat_ca() -> tuple:
+        conn = get_db()
+        rows = conn.execute('SELECT * FROM movies_info ORDER BY id DESC').fetchall()
+        conn.close()
+        return tuple(dict(row) for row in rows)
+    
+    @staticmethod
+    def _doc_theo_id(maphim: int) -> Optional[dict]:
         conn = get_db()
         row = conn.execute('SELECT * FROM movies_info WHERE id = ?', (maphim,)).fetchone()
         conn.close()
-        
-        if row:
-            return cls(
-                maphim=row['id'],
-                tenphim=row['title'],
-                theloai=row['genre'],
-                thoiluong=row['duration'],
-                poster=row['poster_url'],
-                trailer=row['trailer_url'],
-                tomtat=row['description'],
-                daodien=row['director'] if 'director' in row.keys() else None,
-                dienvien=row['cast_members'] if 'cast_members' in row.keys() else None
-            )
-        return None
+        return dict(row) if row else None
+    
+    @classmethod
+    def lay_tat_ca(cls) -> List['Phim']:
+        """Lấy tất cả phim (qua cache danh mục)"""
+        rows = danh_muc.lay(('phim',), cls._doc_tat_ca)
+        return [cls._tu_dong(row) for row in rows]
+    
+    @classmethod
+    def tim_theo_id(cls, maphim: int) -> Optional['Phim']:
+        """Tìm phim theo ID (qua cache danh mục)"""
+        row = danh_muc.lay(('phim', maphim), lambda: cls._doc_theo_id(maphim))
+        return cls._tu_dong(row) if row else None
     
     @classmethod
     def tim_kiem(cls, tu_khoa: str) -> List['Phim']:
-        """Tìm kiếm phim theo từ khóa"""
+        """Tìm kiếm phim theo từ khóa (không phân biệt dấu, khớp tiền tố, xếp theo độ phù hợp)"""
         conn = get_db()
-        rows = conn.execute(
-            'SELECT * FROM movies_info WHERE title LIKE ? OR genre LIKE ? OR director LIKE ? OR cast_members LIKE ?',
-            (f'%{tu_khoa}%', f'%{tu_khoa}%', f'%{tu_khoa}%', f'%{tu_khoa}%')
-        ).fetchall()
+        rows = movie_search.tim_kiem(conn, tu_khoa)
         conn.close()
         
-        return [cls(
-            maphim=row['id'],
-            tenphim=row['title'],
-            theloai=row['genre'],
-            thoiluong=row['duration'],
-            poster=row['poster_url'],
-            trailer=row['trailer_url'],
-            tomtat=row['description'],
-            daodien=row['director'] if 'director' in row.keys() else None,
-            dienvien=row['cast_members'] if 'cast_members' in row.keys() else None
-        ) for row in rows]
+        return [cls._tu_dong(row) for row in rows]
     
     def kiem_tra_trang_thai(self) -> str:
         """Kiểm tra trạng thái phim (đang chiếu, sắp chiếu, ngừng chiếu)"""
@@ -219,8 +194,12 @@ class Phim:
             (self.tenphim, self.theloai, self.thoiluong, self.poster, self.trailer, self.tomtat, self.daodien, self.dienvien)
         )
         self.maphim = cursor.lastrowid
+        counters.cong(conn, tong_phim=1)
+        movie_search.dong_bo_phim(conn, self.maphim, self.tenphim, self.theloai,
+                                  self.daodien, self.dienvien, self.tomtat)
         conn.commit()
         conn.close()
+        danh_muc.xoa_tat_ca()
         return self.maphim
     
     def cap_nhat_phim(self) -> bool:
@@ -231,16 +210,22 @@ class Phim:
                poster_url = ?, trailer_url = ?, description = ?, director = ?, cast_members = ? WHERE id = ?''',
             (self.tenphim, self.theloai, self.thoiluong, self.poster, self.trailer, self.tomtat, self.daodien, self.dienvien, self.maphim)
         )
+        movie_search.dong_bo_phim(conn, self.maphim, self.tenphim, self.theloai,
+                                  self.daodien, self.dienvien, self.tomtat)
         conn.commit()
         conn.close()
+        danh_muc.xoa_tat_ca()
         return True
     
     def xoa_phim(self) -> bool:
         """Xóa phim"""
         conn = get_db()
-        conn.execute('DELETE FROM movies_info WHERE id = ?', (self.maphim,))
+        so_dong = conn.execute('DELETE FROM movies_info WHERE id = ?', (self.maphim,)).rowcount
+        counters.cong(conn, tong_phim=-so_dong)
+        movie_search.xoa_phim(conn, self.maphim)
         conn.commit()
         conn.close()
+        danh_muc.xoa_tat_ca()
         return True
     
     def to_dict(self) -> Dict[str, Any]:
@@ -266,25 +251,52 @@ class PhongChieu:
         - maphong: string
         - soghengoi: int (số ghế ngồi)
         - soluongghe: int (số lượng ghế)
+        - sohang, soghemoihang: int (bố cục ghế)
     """
     
-    def __init__(self, maphong: str, soghengoi: int = 50, soluongghe: int = 50):
+    def __init__(self, maphong: str, soghengoi: int = 50, soluongghe: int = 50,
+                 sohang: int = BO_CUC_MAC_DINH[0], soghemoihang: int = BO_CUC_MAC_DINH[1]):
         self.maphong = maphong
         self.soghengoi = soghengoi
         self.soluongghe = soluongghe
+        self.sohang = sohang
+        self.soghemoihang = soghemoihang
     
     @classmethod
     def lay_tat_ca(cls) -> List['PhongChieu']:
-        """Lấy danh sách tất cả phòng chiếu"""
-        # Mặc định có 3 phòng chiếu
-        return [
-            cls('Rạp 1', 50, 50),
-            cls('Rạp 2', 50, 50),
-            cls('Rạp 3', 50, 50),
-        ]
+        """Lấy danh sách tất cả phòng chiếu (bảng theaters)"""
+        conn = get_db()
+        rows = conn.execute(
+            'SELECT name, seat_rows, seats_per_row, total_seats FROM theaters ORDER BY name'
+        ).fetchall()
+        conn.close()
+        
+        return [cls(row['name'], row['total_seats'], row['total_seats'], row['seat_rows'], row['seats_per_row'])
+                for row in rows]
+    
+    @staticmethod
+    def lay_bo_cuc(conn, danh_sach_phong) -> Dict[str, Tuple[int, int]]:
+        """
+        (số hàng, số ghế mỗi hàng) của từng phòng chiếu; phòng không có trong bảng theaters
+        dùng BO_CUC_MAC_DINH. Số hàng tối đa 26 (hàng A-Z).
+        """
+        danh_sach_phong = list(set(danh_sach_phong))
+        bo_cuc = dict.fromkeys(danh_sach_phong, BO_CUC_MAC_DINH)
+        if danh_sach_phong:
+            for row in conn.execute(f'''
+                SELECT name, seat_rows, seats_per_row FROM theaters
+                WHERE name IN ({','.join('?' * len(danh_sach_phong))})
+            ''', danh_sach_phong):
+                if row['seat_rows'] and row['seats_per_row']:
+                    bo_cuc[row['name']] = (min(row['seat_rows'], 26), row['seats_per_row'])
+        return bo_cuc
 
 
 # ===== CLASS SUAT CHIEU =====
+# Số suất chiếu tối đa của một lần xếp lịch hàng loạt (giữ transaction ngắn)
+SO_SUAT_CHIEU_HANG_LOAT_TOI_DA = 2000
+
+
 class SuatChieu:
     """
     Class SuấtChiếu - Suất chiếu phim
@@ -298,6 +310,7 @@ class SuatChieu:
         + ThemSuatChieu(): Thêm suất chiếu
         + XoaSuatChieu(): Xóa suất chiếu
         + CapNhatSuatChieu(): Cập nhật suất chiếu
+        + XepLichHangLoat(): Tạo nhiều suất chiếu trong một transaction
     """
     
     def __init__(self, maphim: int, maphong: str, ngaychieu: str, giochieu: str,
@@ -310,41 +323,45 @@ class SuatChieu:
         self.giave = giave
     
     @classmethod
-    def lay_theo_phim(cls, maphim: int) -> List['SuatChieu']:
-        """Lấy tất cả suất chiếu của một phim"""
-        conn = get_db()
-        rows = conn.execute(
-            'SELECT * FROM showtimes WHERE movie_id = ? ORDER BY show_date, show_time',
-            (maphim,)
-        ).fetchall()
-        conn.close()
-        
-        return [cls(
+    def _tu_dong(cls, row) -> 'SuatChieu':
+        """Tạo đối tượng SuatChieu từ một dòng showtimes"""
+        return cls(
             masuatchieu=row['id'],
             maphim=row['movie_id'],
             maphong=row['theater'],
             ngaychieu=row['show_date'],
             giochieu=row['show_time'],
             giave=row['price']
-        ) for row in rows]
+        )
     
-    @classmethod
-    def tim_theo_id(cls, masuatchieu: int) -> Optional['SuatChieu']:
-        """Tìm suất chiếu theo ID"""
+    @staticmethod
+    def _doc_theo_phim(maphim: int) -> tuple:
+        conn = get_db()
+        rows = conn.execute(
+            'SELECT * FROM showtimes WHERE movie_id = ? ORDER BY show_date, show_time',
+            (maphim,)
+        ).fetchall()
+        conn.close()
+        return tuple(dict(row) for row in rows)
+    
+    @staticmethod
+    def _doc_theo_id(masuatchieu: int) -> Optional[dict]:
         conn = get_db()
         row = conn.execute('SELECT * FROM showtimes WHERE id = ?', (masuatchieu,)).fetchone()
         conn.close()
-        
-        if row:
-            return cls(
-                masuatchieu=row['id'],
-                maphim=row['movie_id'],
-                maphong=row['theater'],
-                ngaychieu=row['show_date'],
-                giochieu=row['show_time'],
-                giave=row['price']
-            )
-        return None
+        return dict(row) if row else None
+    
+    @classmethod
+    def lay_theo_phim(cls, maphim: int) -> List['SuatChieu']:
+        """Lấy tất cả suất chiếu của một phim (qua cache danh mục)"""
+        rows = danh_muc.lay(('suat_chieu_phim', maphim), lambda: cls._doc_theo_phim(maphim))
+        return [cls._tu_dong(row) for row in rows]
+    
+    @classmethod
+    def tim_theo_id(cls, masuatchieu: int) -> Optional['SuatChieu']:
+        """Tìm suất chiếu theo ID (qua cache danh mục)"""
+        row = danh_muc.lay(('suat_chieu', masuatchieu), lambda: cls._doc_theo_id(masuatchieu))
+        return cls._tu_dong(row) if row else None
     
     @classmethod
     def lay_tat_ca(cls) -> List['SuatChieu']:
@@ -366,47 +383,206 @@ class SuatChieu:
             giave=row['price']
         ) for row in rows]
     
+    @staticmethod
+    def lay_trang_admin(con_tro: str = None, gioi_han: int = KICH_THUOC_TRANG, tu_ngay: str = None,
+                        den_ngay: str = None, maphim: int = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Một trang suất chiếu cho admin, mới nhất trước (show_date, show_time, id giảm dần).
+        Lọc theo khoảng ngày chiếu và phim. Trả về (các dòng, con trỏ trang sau)
+        """
+        dieu_kien, tham_so = [], []
+        if tu_ngay:
+            dieu_kien.append('s.show_date >= ?')
+            tham_so.append(tu_ngay)
+        if den_ngay:
+            dieu_kien.append('s.show_date <= ?')
+            tham_so.append(den_ngay)
+        if maphim:
+            dieu_kien.append('s.movie_id = ?')
+            tham_so.append(maphim)
+        sau, tham_so_sau = dieu_kien_sau(('s.show_date', 's.show_time', 's.id'), giai_ma_con_tro(con_tro, 3))
+        if sau:
+            dieu_kien.append(sau)
+            tham_so.extend(tham_so_sau)
+        
+        conn = get_db()
+        rows = conn.execute(f'''
+            SELECT s.*, m.title FROM showtimes s
+            JOIN movies_info m ON s.movie_id = m.id
+            {'WHERE ' + ' AND '.join(dieu_kien) if dieu_kien else ''}
+            ORDER BY s.show_date DESC, s.show_time DESC, s.id DESC
+            LIMIT ?
+        ''', tham_so + [gioi_han + 1]).fetchall()
+        conn.close()
+        
+        return cat_trang([dict(r) for r in rows], gioi_han, ('show_date', 'show_time', 'id'))
+    
     def them_suat_chieu(self) -> int:
         """Thêm suất chiếu mới"""
         conn = get_db()
-        cursor = conn.execute(
-            'INSERT INTO showtimes (movie_id, theater, show_date, show_time, price) VALUES (?, ?, ?, ?, ?)',
-            (self.maphim, self.maphong, self.ngaychieu, self.giochieu, self.giave)
+        (self.masuatchieu,), _, _ = self.chen_suat_chieu(
+            conn, [(self.maphim, self.maphong, self.ngaychieu, self.giochieu, self.giave)]
         )
-        self.masuatchieu = cursor.lastrowid
-        
-        # Tạo ghế cho suất chiếu
-        rows = ['A', 'B', 'C', 'D', 'E']
-        for row in rows:
-            for num in range(1, 11):
-                conn.execute(
-                    'INSERT INTO seats (showtime_id, seat_number, status) VALUES (?, ?, "available")',
-                    (self.masuatchieu, f'{row}{num}')
-                )
-        
         conn.commit()
         conn.close()
+        danh_muc.xoa_tat_ca()
         return self.masuatchieu
     
+    @staticmethod
+    def chen_suat_chieu(conn, danh_sach: List[Tuple[int, str, str, str, float]]) -> Tuple[List[int], int, int]:
+        """
+        Thêm các suất chiếu (maphim, maphong, ngaychieu, giochieu, giave) cùng ghế của chúng
+        theo bố cục phòng chiếu, trên transaction của conn (không commit).
+        Lưu thưa (seat_map.CHE_DO_LUU_GHE = 'sparse'): chỉ ghi bố cục vào showtimes;
+        ngược lại tạo mỗi ghế một dòng seats bằng một executemany.
+        Trả về (danh sách id theo thứ tự, số dòng seats đã ghi, tổng số chỗ ngồi);
+        lưu thưa không ghi dòng seats nào.
+        """
+        bo_cuc = PhongChieu.lay_bo_cuc(conn, (suat[1] for suat in danh_sach))
+        thua = seat_map.CHE_DO_LUU_GHE == 'sparse'
+        
+        # INSERT nhiều dòng theo lô để lấy id qua RETURNING
+        ma_moi = []
+        for i in range(0, len(danh_sach), 500):
+            lo = danh_sach[i:i + 500]
+            # id AUTOINCREMENT của một INSERT tăng dần theo thứ tự VALUES
+            ma_moi += sorted(r['id'] for r in conn.execute(f'''
+                INSERT INTO showtimes (movie_id, theater, show_date, show_time, price, seat_rows, seats_per_row)
+                VALUES {','.join(['(?, ?, ?, ?, ?, ?, ?)'] * len(lo))}
+                RETURNING id
+            ''', [v for maphim, phong, ngay, gio, gia in lo
+                  for v in (maphim, phong, ngay, gio, gia, *(bo_cuc[phong] if thua else (None, None)))]))
+        
+        so_dong_ghe = 0
+        if not thua:
+            so_dong_ghe = conn.executemany(
+                'INSERT INTO seats (showtime_id, seat_number, status) VALUES (?, ?, "available")',
+                [(masuatchieu, soghe)
+                 for masuatchieu, suat in zip(ma_moi, danh_sach)
+                 for _, soghe in ghe_theo_bo_cuc(*bo_cuc[suat[1]])]
+            ).rowcount
+        counters.cong(conn, tong_suat_chieu=len(ma_moi))
+        SuatChieu.lui_moc_huy_ve(conn, ((ngay, gio) for _, _, ngay, gio, _ in danh_sach))
+        return ma_moi, so_dong_ghe, sum(bo_cuc[suat[1]][0] * bo_cuc[suat[1]][1] for suat in danh_sach)
+    
+    @staticmethod
+    def lui_moc_huy_ve(conn, gio_chieu):
+        """
+        huy_ve_qua_gio (app.py) chỉ quét các suất chiếu có giờ chiếu sau mốc lần chạy trước.
+        Suất chiếu được thêm hoặc dời về trước mốc thì lùi mốc về giờ chiếu sớm nhất
+        (trên transaction của conn) để lần chạy sau vẫn hủy vé của chúng
+        """
+        som_nhat = min((f'{ngay} {gio}' for ngay, gio in gio_chieu), default=None)
+        if som_nhat is not None:
+            conn.execute(
+                "UPDATE job_state SET value = ? WHERE name = 'huy_ve_qua_gio' AND value > ?",
+                (som_nhat, som_nhat)
+            )
+    
+    @staticmethod
+    def xep_lich_hang_loat(maphim: int, danh_sach_phong: List[str], tu_ngay: str, den_ngay: str,
+                           khung_gio: List[str], giave: float = 75000,
+                           thu_trong_tuan: List[int] = None) -> Dict[str, Any]:
+        """
+        Tạo suất chiếu cho mọi (ngày, rạp, giờ) trong khoảng [tu_ngay, den_ngay] cùng ghế của
+        chúng trong một transaction. thu_trong_tuan lọc ngày theo thứ (0 = thứ Hai).
+        Bỏ qua (không báo lỗi) các suất trùng rạp, ngày, giờ với suất chiếu đã có.
+        Trả về {'showtimes', 'seats' (số dòng ghế đã ghi, 0 khi lưu thưa), 'capacity' (tổng số
+        chỗ ngồi), 'ids', 'skipped', 'elapsed_ms'}; ValueError nếu
+        tham số không hợp lệ hoặc quá SO_SUAT_CHIEU_HANG_LOAT_TOI_DA suất chiếu.
+        """
+        bat_dau = time.perf_counter()
+        try:
+            ngay_dau = datetime.strptime(tu_ngay, '%Y-%m-%d')
+            ngay_cuoi = datetime.strptime(den_ngay, '%Y-%m-%d')
+        except ValueError:
+            raise ValueError('Ngày phải có dạng YYYY-MM-DD')
+        if ngay_cuoi < ngay_dau:
+            raise ValueError('Ngày kết thúc phải sau ngày bắt đầu')
+        so_ngay = (ngay_cuoi - ngay_dau).days + 1
+        if not danh_sach_phong or not khung_gio:
+            raise ValueError('Cần ít nhất một rạp và một khung giờ')
+        if so_ngay * len(danh_sach_phong) * len(khung_gio) > SO_SUAT_CHIEU_HANG_LOAT_TOI_DA:
+            raise ValueError(f'Tối đa {SO_SUAT_CHIEU_HANG_LOAT_TOI_DA} suất chiếu mỗi lần')
+        
+        danh_sach_ngay = [
+            ngay.strftime('%Y-%m-%d')
+            for ngay in (ngay_dau + timedelta(days=i) for i in range(so_ngay))
+            if thu_trong_tuan is None or ngay.weekday() in thu_trong_tuan
+        ]
+        du_kien = [(phong, ngay, gio) for ngay in danh_sach_ngay
+                   for phong in danh_sach_phong for gio in khung_gio]
+        
+        conn = get_db()
+        try:
+            # Giữ lock ghi ngay từ đầu để kiểm tra trùng và chèn không bị xen giữa
+            conn.execute('BEGIN IMMEDIATE')
+            if not conn.execute('SELECT 1 FROM movies_info WHERE id = ?', (maphim,)).fetchone():
+                raise ValueError('Phim không tồn tại')
+            
+            da_co = set(map(tuple, conn.execute(f'''
+                SELECT theater, show_date, show_time FROM showtimes
+                WHERE show_date BETWEEN ? AND ? AND theater IN ({','.join('?' * len(danh_sach_phong))})
+            ''', (tu_ngay, den_ngay, *danh_sach_phong)))) if du_kien else set()
+            moi = [suat for suat in du_kien if suat not in da_co]
+            
+            ma_moi, so_dong_ghe, suc_chua = SuatChieu.chen_suat_chieu(
+                conn, [(maphim, phong, ngay, gio, giave) for phong, ngay, gio in moi]
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        if ma_moi:
+            danh_muc.xoa_tat_ca()
+        return {
+            'showtimes': len(ma_moi),
+            'seats': so_dong_ghe,
+            'capacity': suc_chua,
+            'ids': ma_moi,
+            'skipped': [{'theater': phong, 'show_date': ngay, 'show_time': gio}
+                        for phong, ngay, gio in du_kien if (phong, ngay, gio) in da_co],
+            'elapsed_ms': round((time.perf_counter() - bat_dau) * 1000, 2)
+        }
+    
     def xoa_suat_chieu(self) -> bool:
         """Xóa suất chiếu"""
         conn = get_db()
+        cu = conn.execute(
+            'SELECT movie_id, show_date FROM showtimes WHERE id = ?', (self.masuatchieu,)
+        ).fetchone()
+        if cu:
+            # Vé của suất chiếu bị xóa không còn được tính trong báo cáo doanh thu
+            revenue.chuyen_suat_chieu(conn, self.masuatchieu, tuple(cu), None)
         conn.execute('DELETE FROM seats WHERE showtime_id = ?', (self.masuatchieu,))
-        conn.execute('DELETE FROM showtimes WHERE id = ?', (self.masuatchieu,))
+        so_dong = conn.execute('DELETE FROM showtimes WHERE id = ?', (self.masuatchieu,)).rowcount
+        counters.cong(conn, tong_suat_chieu=-so_dong)
         conn.commit()
         conn.close()
+        so_do_ghe.xoa(self.masuatchieu)
+        danh_muc.xoa_tat_ca()
         return True
     
     def cap_nhat_suat_chieu(self) -> bool:
         """Cập nhật suất chiếu"""
         conn = get_db()
+        cu = conn.execute(
+            'SELECT movie_id, show_date FROM showtimes WHERE id = ?', (self.masuatchieu,)
+        ).fetchone()
+        if cu:
+            revenue.chuyen_suat_chieu(conn, self.masuatchieu, tuple(cu), (self.maphim, self.ngaychieu))
         conn.execute(
             '''UPDATE showtimes SET movie_id = ?, theater = ?, show_date = ?, 
                show_time = ?, price = ? WHERE id = ?''',
             (self.maphim, self.maphong, self.ngaychieu, self.giochieu, self.giave, self.masuatchieu)
         )
+        self.lui_moc_huy_ve(conn, [(self.ngaychieu, self.giochieu)])
         conn.commit()
         conn.close()
+        danh_muc.xoa_tat_ca()
         return True
     
     def to_dict(self) -> Dict[str, Any]:
@@ -447,24 +623,22 @@ class Ghe:
     
     @classmethod
     def lay_theo_suat_chieu(cls, masuatchieu: int) -> List['Ghe']:
-        """Lấy tất cả ghế của một suất chiếu"""
-        conn = get_db()
-        rows = conn.execute(
-            'SELECT * FROM seats WHERE showtime_id = ? ORDER BY seat_number',
-            (masuatchieu,)
-        ).fetchall()
-        conn.close()
-        
+        """Lấy tất cả ghế của một suất chiếu (ghép bố cục nếu suất chiếu lưu ghế thưa)"""
         return [cls(
             maghe=row['id'],
             soghe=row['seat_number'],
             trangthai=row['status'],
-            masuatchieu=row['showtime_id']
-        ) for row in rows]
+            masuatchieu=masuatchieu
+        ) for row in SoDoGhe.doc_db(masuatchieu)]
     
     @classmethod
-    def tim_theo_id(cls, maghe: int) -> Optional['Ghe']:
-        """Tìm ghế theo ID"""
+    def tim_theo_id(cls, maghe: int, masuatchieu: int = None) -> Optional['Ghe']:
+        """Tìm ghế theo ID (mã ghế ảo của suất chiếu lưu thưa cần kèm masuatchieu)"""
+        if maghe < 0:
+            if masuatchieu is None:
+                return None
+            return next((ghe for ghe in cls.lay_theo_suat_chieu(masuatchieu) if ghe.maghe == maghe), None)
+        
         conn = get_db()
         row = conn.execute('SELECT * FROM seats WHERE id = ?', (maghe,)).fetchone()
         conn.close()
@@ -485,30 +659,43 @@ class Ghe:
     def dat_ghe(self) -> bool:
         """Đặt ghế (chuyển trạng thái thành booked)"""
         conn = get_db()
-        conn.execute('UPDATE seats SET status = "booked" WHERE id = ?', (self.maghe,))
+        ghi_trang_thai_ghe(conn, self.masuatchieu, self.maghe, self.soghe, 'booked')
         conn.commit()
         conn.close()
         self.trangthai = 'booked'
+        so_do_ghe.ghi_nhan(self.masuatchieu, [self._thay_doi()])
         return True
     
     def giu_ghe_tam_thoi(self) -> bool:
         """Giữ ghế tạm thời"""
         conn = get_db()
-        conn.execute('UPDATE seats SET status = "reserved" WHERE id = ?', (self.maghe,))
+        ghi_trang_thai_ghe(conn, self.masuatchieu, self.maghe, self.soghe, 'reserved')
         conn.commit()
         conn.close()
         self.trangthai = 'reserved'
+        so_do_ghe.ghi_nhan(self.masuatchieu, [self._thay_doi()])
         return True
     
     def huy_ghe(self) -> bool:
         """Hủy đặt ghế (chuyển về available)"""
         conn = get_db()
-        conn.execute('UPDATE seats SET status = "available" WHERE id = ?', (self.maghe,))
+        ghi_trang_thai_ghe(conn, self.masuatchieu, self.maghe, self.soghe, 'available')
         conn.commit()
         conn.close()
         self.trangthai = 'available'
+        so_do_ghe.ghi_nhan(self.masuatchieu, [self._thay_doi()])
         return True
     
+    def _thay_doi(self) -> Dict[str, Any]:
+        """Thay đổi trạng thái ghế để báo cho sơ đồ ghế trong bộ nhớ"""
+        return {
+            'id': self.maghe,
+            'seat_number': self.soghe,
+            'status': self.trangthai,
+            'held_by': None,
+            'held_until': None
+        }
+    
     def to_dict(self) -> Dict[str, Any]:
         """Chuyển đổi thành dictionary"""
         return {
@@ -591,6 +778,7 @@ class KhachHang:
             (username, email, cls.hash_password(password), ten, sdt)
         )
         maKH = cursor.lastrowid
+        counters.cong(conn, tong_khach_hang=1)
         conn.commit()
         conn.close()
         
@@ -604,23 +792,29 @@ class KhachHang:
         )
     
     @classmethod
-    def tim_theo_id(cls, maKH: int) -> Optional['KhachHang']:
-        """Tìm khách hàng theo ID"""
+    def _tu_dong(cls, user: Dict[str, Any]) -> 'KhachHang':
+        return cls(
+            maKH=user['id'],
+            username=user['username'],
+            password=user['password'],
+            ten=user['full_name'],
+            email=user['email'],
+            sdt=user['phone'],
+            is_admin=user['is_admin']
+        )
+    
+    @staticmethod
+    def _doc_theo_id(maKH: int) -> Optional[Dict[str, Any]]:
         conn = get_db()
         user = conn.execute('SELECT * FROM users WHERE id = ?', (maKH,)).fetchone()
         conn.close()
-        
-        if user:
-            return cls(
-                maKH=user['id'],
-                username=user['username'],
-                password=user['password'],
-                ten=user['full_name'],
-                email=user['email'],
-                sdt=user['phone'],
-                is_admin=user['is_admin']
-            )
-        return None
+        return dict(user) if user else None
+    
+    @classmethod
+    def tim_theo_id(cls, maKH: int) -> Optional['KhachHang']:
+        """Tìm khách hàng theo ID (qua cache người dùng)"""
+        user = nguoi_dung.lay(maKH, lambda: cls._doc_theo_id(maKH))
+        return cls._tu_dong(user) if user else None
     
     @classmethod
     def lay_tat_ca(cls) -> List['KhachHang']:
@@ -638,58 +832,115 @@ class KhachHang:
             is_admin=row['is_admin']
         ) for row in rows]
     
-    def dat_ve(self, masuatchieu: int, danh_sach_ghe: List[int]) -> List['Ve']:
-        """Đặt vé cho khách hàng - có xử lý race condition"""
-        danh_sach_ve = []
-        suat_chieu = SuatChieu.tim_theo_id(masuatchieu)
-        
-        if not suat_chieu:
-            return []
+    @staticmethod
+    def lay_trang_admin(con_tro: str = None, gioi_han: int = KICH_THUOC_TRANG, tu_ngay: str = None,
+                        den_ngay: str = None, tu_khoa: str = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Một trang người dùng cho admin theo id tăng dần. Lọc theo khoảng ngày tạo tài khoản
+        và tiền tố username. Trả về (các dòng, con trỏ trang sau)
+        """
+        dieu_kien, tham_so = [], []
+        if tu_ngay:
+            dieu_kien.append('created_at >= ?')
+            tham_so.append(tu_ngay)
+        if den_ngay:
+            dieu_kien.append("created_at < date(?, '+1 day')")
+            tham_so.append(den_ngay)
+        if tu_khoa:
+            dieu_kien.append("username LIKE ? ESCAPE '\\'")
+            tham_so.append(tu_khoa.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        sau, tham_so_sau = dieu_kien_sau(('id',), giai_ma_con_tro(con_tro, 1), giam_dan=False)
+        if sau:
+            dieu_kien.append(sau)
+            tham_so.extend(tham_so_sau)
         
-        # Sử dụng một connection duy nhất với transaction để tránh race condition
         conn = get_db()
-        conn.isolation_level = 'IMMEDIATE'  # Lock database ngay khi bắt đầu transaction
+        rows = conn.execute(f'''
+            SELECT id, username, email, full_name, phone, is_admin, created_at FROM users
+            {'WHERE ' + ' AND '.join(dieu_kien) if dieu_kien else ''}
+            ORDER BY id
+            LIMIT ?
+        ''', tham_so + [gioi_han + 1]).fetchall()
+        conn.close()
         
-        try:
-            for maghe in danh_sach_ghe:
-                # Kiểm tra và đặt ghế trong cùng một transaction
-                # Cho phép đặt ghế available HOẶC ghế đang được chính user này giữ (held)
-                ghe_row = conn.execute('''
-                    SELECT * FROM seats 
-                    WHERE id = ? AND (status = "available" OR (status = "held" AND held_by = ?))
-                ''', (maghe, self.maKH)).fetchone()
+        return cat_trang([dict(r) for r in rows], gioi_han, ('id',))
+    
+    def dat_ve(self, masuatchieu: int, danh_sach_ghe: List[int]) -> List['Ve']:
+        """
+        Đặt vé cho khách hàng - có xử lý race condition.
+        Giành tất cả ghế hợp lệ bằng một UPDATE có điều kiện và tạo vé bằng một INSERT
+        nhiều dòng. Trả về vé của những ghế thực sự giành được (có thể ít hơn yêu cầu).
+        """
+        so_do = so_do_ghe.lay(masuatchieu)
+        if not so_do:
+            return []
+        
+        # Giữ khóa sơ đồ ghế để bộ nhớ và DB đổi trạng thái cùng nhau
+        with so_do.khoa:
+            # Kiểm tra xung đột trong bộ nhớ thay vì SELECT từng ghế
+            # Cho phép đặt ghế available HOẶC ghế đang được chính user này giữ (held)
+            ghe_hop_le = so_do.loc_ghe_co_the_giu(danh_sach_ghe, self.maKH)
+            if not ghe_hop_le:
+                return []
+            
+            # Sử dụng một connection duy nhất với transaction để tránh race condition
+            conn = get_db()
+            conn.isolation_level = 'IMMEDIATE'  # Lock database ngay khi bắt đầu transaction
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            
+            try:
+                # Đọc giá vé trên cùng connection, trước khi transaction giữ lock ghi
+                suat_chieu = conn.execute(
+                    'SELECT price, movie_id, show_date FROM showtimes WHERE id = ?', (masuatchieu,)
+                ).fetchone()
+                if not suat_chieu:
+                    return []
+                giave = suat_chieu['price']
+                
+                # Giành tất cả ghế còn trống/đang được user này giữ trong một câu lệnh
+                da_gianh = so_do.gianh_ghe_db(conn, ghe_hop_le, 'booked', None, None, self.maKH, now)
+                ghe_da_gianh = [maghe for maghe in ghe_hop_le if maghe in da_gianh]
+                
+                # Tạo booking record cho tất cả ghế giành được bằng một INSERT
+                ma_ve = {}
+                if ghe_da_gianh:
+                    ma_ve = {r['seat_id']: r['id'] for r in conn.execute(f'''
+                        INSERT INTO bookings (user_id, showtime_id, seat_id, seat_number, price, status)
+                        VALUES {','.join(['(?, ?, ?, ?, ?, ?)'] * len(ghe_da_gianh))}
+                        RETURNING id, seat_id
+                    ''', [v for maghe in ghe_da_gianh for v in (
+                        self.maKH, masuatchieu, maghe, so_do.so_ghe_cua(maghe), giave, 'confirmed'
+                    )])}
+                counters.cong(conn, tong_ve_dat=len(ghe_da_gianh), tong_doanh_thu=giave * len(ghe_da_gianh))
+                revenue.cong(conn, suat_chieu['movie_id'], suat_chieu['show_date'],
+                             ve_ban=len(ghe_da_gianh), doanh_thu=giave * len(ghe_da_gianh))
                 
-                if ghe_row:
-                    # Cập nhật trạng thái ghế ngay lập tức
-                    result = conn.execute('''
-                        UPDATE seats 
-                        SET status = "booked", held_by = NULL, held_until = NULL 
-                        WHERE id = ? AND (status = "available" OR (status = "held" AND held_by = ?))
-                    ''', (maghe, self.maKH))
-                    
-                    # Kiểm tra xem có thực sự cập nhật được không
-                    if result.rowcount > 0:
-                        # Tạo booking record
-                        cursor = conn.execute('''
-                            INSERT INTO bookings (user_id, showtime_id, seat_id, seat_number, price, status)
-                            VALUES (?, ?, ?, ?, ?, ?)
-                        ''', (self.maKH, masuatchieu, ghe_row['id'], ghe_row['seat_number'], suat_chieu.giave, 'confirmed'))
-                        
-                        ve = Ve(
-                            mave=cursor.lastrowid,
-                            maghe=ghe_row['seat_number'],
-                            masuatchieu=masuatchieu,
-                            maKH=self.maKH,
-                            giave=suat_chieu.giave
-                        )
-                        danh_sach_ve.append(ve)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                raise e
+            finally:
+                conn.close()
             
-            conn.commit()
-        except Exception as e:
-            conn.rollback()
-            raise e
-        finally:
-            conn.close()
+            danh_sach_ve = [Ve(
+                mave=ma_ve[maghe],
+                maghe=so_do.so_ghe_cua(maghe),
+                masuatchieu=masuatchieu,
+                maKH=self.maKH,
+                giave=giave
+            ) for maghe in ghe_da_gianh]
+            
+            # Cập nhật sơ đồ ghế và báo cho các trang đặt vé đang mở
+            so_do.ghi_nhan([{
+                'id': maghe,
+                'seat_number': so_do.so_ghe_cua(maghe),
+                'status': 'booked',
+                'held_by': None,
+                'held_until': None
+            } for maghe in ghe_da_gianh])
+            if len(ghe_da_gianh) < len(ghe_hop_le):
+                # DB không khớp với bộ nhớ: đọc lại
+                so_do.nap_lai()
         
         return danh_sach_ve
     
@@ -716,20 +967,24 @@ class KhachHang:
         )
         conn.commit()
         conn.close()
+        nguoi_dung.xoa(self.maKH)
         return True
     
     def doi_mat_khau(self, mat_khau_cu: str, mat_khau_moi: str) -> bool:
-        """Đổi mật khẩu"""
-        if self.password != self.hash_password(mat_khau_cu):
-            return False
-        
+        """
+        Đổi mật khẩu. Mật khẩu cũ được kiểm tra trong chính câu UPDATE nên bản trong
+        cache người dùng có cũ (process khác vừa đổi) cũng không cho đổi sai.
+        """
         conn = get_db()
-        conn.execute(
-            'UPDATE users SET password = ? WHERE id = ?',
-            (self.hash_password(mat_khau_moi), self.maKH)
+        result = conn.execute(
+            'UPDATE users SET password = ? WHERE id = ? AND password = ?',
+            (self.hash_password(mat_khau_moi), self.maKH, self.hash_password(mat_khau_cu))
         )
         conn.commit()
         conn.close()
+        nguoi_dung.xoa(self.maKH)
+        if result.rowcount == 0:
+            return False
         self.password = self.hash_password(mat_khau_moi)
         return True
     
@@ -817,49 +1072,105 @@ class Ve:
         """Lấy tất cả vé (cho admin)"""
         conn = get_db()
         rows = conn.execute('''
-            SELECT b.*, u.username, m.title, se.seat_number as seat_num, st.show_date
+            SELECT b.*, u.username, m.title, b.seat_number as seat_num, st.show_date
             FROM bookings b
             JOIN users u ON b.user_id = u.id
             JOIN showtimes st ON b.showtime_id = st.id
             JOIN movies_info m ON st.movie_id = m.id
-            JOIN seats se ON b.seat_id = se.id
             ORDER BY b.booking_time DESC
         ''').fetchall()
         conn.close()
         
         return [dict(row) for row in rows]
     
+    @staticmethod
+    def lay_trang_admin(con_tro: str = None, gioi_han: int = KICH_THUOC_TRANG, tu_ngay: str = None,
+                        den_ngay: str = None, maphim: int = None,
+                        trangthai: str = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        Một trang vé cho admin, mới đặt trước (booking_time, id giảm dần). Lọc theo khoảng
+        ngày đặt, phim và trạng thái. Trả về (các dòng, con trỏ trang sau)
+        """
+        dieu_kien, tham_so = [], []
+        if tu_ngay:
+            dieu_kien.append('b.booking_time >= ?')
+            tham_so.append(tu_ngay)
+        if den_ngay:
+            dieu_kien.append("b.booking_time < date(?, '+1 day')")
+            tham_so.append(den_ngay)
+        if maphim:
+            dieu_kien.append('st.movie_id = ?')
+            tham_so.append(maphim)
+        if trangthai:
+            dieu_kien.append('b.status = ?')
+            tham_so.append(trangthai)
+        sau, tham_so_sau = dieu_kien_sau(('b.booking_time', 'b.id'), giai_ma_con_tro(con_tro, 2))
+        if sau:
+            dieu_kien.append(sau)
+            tham_so.extend(tham_so_sau)
+        
+        conn = get_db()
+        rows = conn.execute(f'''
+            SELECT b.id, b.seat_number, b.price, b.status, b.booking_time,
+                   u.username, m.title, st.show_date, st.show_time
+            FROM bookings b
+            JOIN users u ON b.user_id = u.id
+            JOIN showtimes st ON b.showtime_id = st.id
+            JOIN movies_info m ON st.movie_id = m.id
+            {'WHERE ' + ' AND '.join(dieu_kien) if dieu_kien else ''}
+            ORDER BY b.booking_time DESC, b.id DESC
+            LIMIT ?
+        ''', tham_so + [gioi_han + 1]).fetchall()
+        conn.close()
+        
+        return cat_trang([dict(r) for r in rows], gioi_han, ('booking_time', 'id'))
+    
     def tao_ve(self) -> int:
         """Tạo vé mới"""
         conn = get_db()
         
-        # Lấy seat_id từ seat_number
-        ghe = conn.execute(
-            'SELECT id FROM seats WHERE showtime_id = ? AND seat_number = ?',
-            (self.masuatchieu, self.maghe)
+        # Lấy seat_id (seats.id hoặc mã ghế ảo) từ seat_number
+        so_do = so_do_ghe.lay(self.masuatchieu)
+        maghe = so_do.ma_ghe_theo_so(self.maghe) if so_do else None
+        suat_chieu = conn.execute(
+            'SELECT movie_id, show_date FROM showtimes WHERE id = ?', (self.masuatchieu,)
         ).fetchone()
         
         cursor = conn.execute('''
             INSERT INTO bookings (user_id, showtime_id, seat_id, seat_number, price, status)
             VALUES (?, ?, ?, ?, ?, ?)
-        ''', (self.maKH, self.masuatchieu, ghe['id'] if ghe else None, self.maghe, self.giave, self.trangthai))
+        ''', (self.maKH, self.masuatchieu, maghe, self.maghe, self.giave, self.trangthai))
         
         self.mave = cursor.lastrowid
+        self._ghi_nhan_doi_trang_thai(
+            conn, None, self.trangthai, self.giave,
+            suat_chieu['movie_id'] if suat_chieu else None,
+            suat_chieu['show_date'] if suat_chieu else None
+        )
         conn.commit()
         conn.close()
         return self.mave
     
-    def xuat_ve_dien_tu(self) -> Dict[str, Any]:
-        """Xuất thông tin vé điện tử"""
+    def xuat_ve_dien_tu(self, khach_hang: 'KhachHang' = None) -> Dict[str, Any]:
+        """Xuất thông tin vé điện tử (khach_hang: chủ vé đã có sẵn, khỏi đọc lại bảng users)"""
         conn = get_db()
-        row = conn.execute('''
-            SELECT b.*, m.title, s.theater, s.show_date, s.show_time, u.full_name
-            FROM bookings b
-            JOIN showtimes s ON b.showtime_id = s.id
-            JOIN movies_info m ON s.movie_id = m.id
-            JOIN users u ON b.user_id = u.id
-            WHERE b.id = ?
-        ''', (self.mave,)).fetchone()
+        if khach_hang is not None and khach_hang.maKH == self.maKH:
+            row = conn.execute('''
+                SELECT b.*, m.title, s.theater, s.show_date, s.show_time, ? AS full_name
+                FROM bookings b
+                JOIN showtimes s ON b.showtime_id = s.id
+                JOIN movies_info m ON s.movie_id = m.id
+                WHERE b.id = ?
+            ''', (khach_hang.ten, self.mave)).fetchone()
+        else:
+            row = conn.execute('''
+                SELECT b.*, m.title, s.theater, s.show_date, s.show_time, u.full_name
+                FROM bookings b
+                JOIN showtimes s ON b.showtime_id = s.id
+                JOIN movies_info m ON s.movie_id = m.id
+                JOIN users u ON b.user_id = u.id
+                WHERE b.id = ?
+            ''', (self.mave,)).fetchone()
         conn.close()
         
         if row:
@@ -876,24 +1187,66 @@ class Ve:
             }
         return {}
     
+    @staticmethod
+    def _ghi_nhan_doi_trang_thai(conn, cu: Optional[str], moi: str, gia: float,
+                                 maphim: Optional[int], ngaychieu: Optional[str]):
+        """Cập nhật bộ đếm và bảng tổng hợp doanh thu khi một vé đổi trạng thái cu -> moi"""
+        ve_ban, doanh_thu, ve_huy = revenue.chenh_lech_trang_thai(cu, moi, gia)
+        counters.cong(conn, tong_ve_dat=ve_ban, tong_doanh_thu=doanh_thu)
+        revenue.cong(conn, maphim, ngaychieu, ve_ban, doanh_thu, ve_huy)
+    
+    def _doi_trang_thai(self, conn, moi: str):
+        """
+        Đổi trạng thái vé sang moi, trả về dòng vé trước khi đổi (None nếu không có vé
+        hoặc vé đã ở trạng thái moi). UPDATE có điều kiện theo trạng thái vừa đọc nên hai
+        thao tác đồng thời trên cùng vé không ghi nhận chênh lệch hai lần.
+        """
+        while True:
+            ve = conn.execute('''
+                SELECT b.seat_id, b.showtime_id, b.seat_number, b.status, b.price,
+                       s.movie_id, s.show_date
+                FROM bookings b
+                LEFT JOIN showtimes s ON s.id = b.showtime_id
+                WHERE b.id = ?
+            ''', (self.mave,)).fetchone()
+            if not ve or ve['status'] == moi:
+                return None
+            if conn.execute(
+                'UPDATE bookings SET status = ? WHERE id = ? AND status IS ?',
+                (moi, self.mave, ve['status'])
+            ).rowcount:
+                self._ghi_nhan_doi_trang_thai(
+                    conn, ve['status'], moi, ve['price'], ve['movie_id'], ve['show_date']
+                )
+                return ve
+            # Trạng thái vừa bị đổi bởi thao tác khác: đọc lại
+            conn.rollback()
+    
     def huy_don_dat_ve(self) -> bool:
         """Hủy đơn đặt vé"""
         conn = get_db()
-        booking = conn.execute('SELECT seat_id FROM bookings WHERE id = ?', (self.mave,)).fetchone()
+        # Vé đã hủy từ trước thì không trả ghế lần nữa (ghế có thể đã được người khác đặt)
+        booking = self._doi_trang_thai(conn, 'cancelled')
         
         if booking:
-            conn.execute('UPDATE bookings SET status = "cancelled" WHERE id = ?', (self.mave,))
-            conn.execute('UPDATE seats SET status = "available" WHERE id = ?', (booking['seat_id'],))
+            tra_ghe_cua_ve(conn, [booking])
             conn.commit()
-            self.trangthai = 'cancelled'
+            so_do_ghe.ghi_nhan(booking['showtime_id'], [{
+                'id': booking['seat_id'],
+                'seat_number': booking['seat_number'],
+                'status': 'available',
+                'held_by': None,
+                'held_until': None
+            }])
         
         conn.close()
+        self.trangthai = 'cancelled'
         return True
     
     def xac_nhan_thanh_toan(self) -> bool:
         """Xác nhận thanh toán"""
         conn = get_db()
-        conn.execute('UPDATE bookings SET status = "paid" WHERE id = ?', (self.mave,))
+        self._doi_trang_thai(conn, 'paid')
         conn.commit()
         conn.close()
         self.trangthai = 'paid'
@@ -0,0 +1,124 @@
+"""
+HUY CINEMA - Tìm kiếm phim toàn văn (SQLite FTS5)
+Bảng movies_fts (rowid = movies_info.id) lưu title, genre, director, cast_members,
+description đã bỏ dấu tiếng Việt để "hanh dong" khớp "Hành động". Kết quả xếp hạng
+theo bm25 và mọi từ khóa đều khớp tiền tố (gõ tới đâu tìm tới đó).
+
+Chỉ mục được cập nhật trong cùng transaction với Phim.them_phim/cap_nhat_phim/xoa_phim.
+Nếu SQLite không có FTS5, tìm kiếm quay về câu LIKE cũ.
+"""
+
+import logging
+import re
+import sqlite3
+import unicodedata
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Trọng số bm25 theo thứ tự cột: tên phim quan trọng nhất, tóm tắt ít nhất
+TRONG_SO_BM25 = (10.0, 2.0, 4.0, 4.0, 1.0)
+
+
+def bo_dau(van_ban: str) -> str:
+    """Bỏ dấu tiếng Việt và chuyển chữ thường: 'Hành Động' -> 'hanh dong'"""
+    if not van_ban:
+        return ''
+    # 'đ' không tách được bằng NFD nên phải thay riêng
+    van_ban = van_ban.replace('đ', 'd').replace('Đ', 'D')
+    return ''.join(
+        c for c in unicodedata.normalize('NFD', van_ban) if not unicodedata.combining(c)
+    ).lower()
+
+
+def tao_chi_muc(conn: sqlite3.Connection):
+    """Tạo bảng movies_fts và nạp toàn bộ phim hiện có (migration 3)"""
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+                title, genre, director, cast_members, description,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )
+        ''')
+    except sqlite3.OperationalError as e:
+        logger.warning('Không tạo được chỉ mục FTS5 (%s), tìm kiếm dùng LIKE', e)
+        return
+    dung_lai_chi_muc(conn)
+
+
+def dung_lai_chi_muc(conn: sqlite3.Connection):
+    """Xóa và nạp lại movies_fts từ movies_info (sau khi thêm phim bằng SQL trực tiếp)"""
+    rows = conn.execute(
+        'SELECT id, title, genre, director, cast_members, description FROM movies_info'
+    ).fetchall()
+    try:
+        conn.execute('DELETE FROM movies_fts')
+        conn.executemany(
+            'INSERT INTO movies_fts (rowid, title, genre, director, cast_members, description) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            ((r[0], *(bo_dau(v) for v in r[1:])) for r in rows)
+        )
+    except sqlite3.OperationalError as e:
+        if 'movies_fts' not in str(e):
+            raise
+
+
+def dong_bo_phim(conn: sqlite3.Connection, maphim: int, tenphim: str, theloai: str,
+                 daodien: str, dienvien: str, tomtat: str):
+    """Ghi (hoặc ghi đè) dòng chỉ mục của một phim"""
+    try:
+        conn.execute('DELETE FROM movies_fts WHERE rowid = ?', (maphim,))
+        conn.execute(
+            'INSERT INTO movies_fts (rowid, title, genre, director, cast_members, description) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (maphim, bo_dau(tenphim), bo_dau(theloai), bo_dau(daodien), bo_dau(dienvien), bo_dau(tomtat))
+        )
+    except sqlite3.OperationalError as e:
+        if 'movies_fts' not in str(e):
+            raise
+
+
+def xoa_phim(conn: sqlite3.Connection, maphim: int):
+    """Xóa dòng chỉ mục của một phim"""
+    try:
+        conn.execute('DELETE FROM movies_fts WHERE rowid = ?', (maphim,))
+    except sqlite3.OperationalError as e:
+        if 'movies_fts' not in str(e):
+            raise
+
+
+def tao_truy_van(tu_khoa: str) -> str:
+    """Chuỗi MATCH của FTS5: mỗi từ (đã bỏ dấu) khớp tiền tố, tất cả các từ phải có"""
+    return ' '.join(f'"{tu}"*' for tu in re.findall(r'\w+', bo_dau(tu_khoa)))
+
+
+def tim_kiem(conn: sqlite3.Connection, tu_khoa: str, gioi_han: Optional[int] = None) -> List[sqlite3.Row]:
+    """Các dòng movies_info khớp từ khóa, phù hợp nhất trước (mọi kết quả nếu gioi_han None)"""
+    truy_van = tao_truy_van(tu_khoa)
+    if truy_van:
+        try:
+            # Xếp hạng và cắt LIMIT trong bảng FTS trước, chỉ JOIN các phim được chọn
+            return conn.execute(f'''
+                SELECT m.* FROM (
+                    SELECT rowid, bm25(movies_fts, {', '.join(map(str, TRONG_SO_BM25))}) AS diem
+                    FROM movies_fts WHERE movies_fts MATCH ?
+                    ORDER BY diem LIMIT ?
+                ) f
+                JOIN movies_info m ON m.id = f.rowid
+                ORDER BY f.diem
+            ''', (truy_van, -1 if gioi_han is None else gioi_han)).fetchall()
+        except sqlite3.OperationalError as e:
+            if 'movies_fts' not in str(e):
+                raise
+    return tim_kiem_like(conn, tu_khoa, gioi_han)
+
+
+def tim_kiem_like(conn: sqlite3.Connection, tu_khoa: str, gioi_han: Optional[int] = None) -> List[sqlite3.Row]:
+    """Cách tìm cũ: LIKE trên từng cột, quét toàn bảng và không xếp hạng"""
+    mau = f'%{tu_khoa}%'
+    return conn.execute(
+        'SELECT * FROM movies_info WHERE title LIKE ? OR genre LIKE ? OR director LIKE ? OR cast_members LIKE ? '
+        'LIMIT ?',
+        (mau, mau, mau, mau, -1 if gioi_han is None else gioi_han)
+    ).fetchall()
@@ -0,0 +1,53 @@
+"""
+HUY CINEMA - Phân trang keyset cho các danh sách admin
+Thay cho OFFSET (phải đọc bỏ mọi dòng phía trước): mỗi trang trả về một con trỏ là giá
+trị các cột sắp xếp của dòng cuối, trang sau lọc bằng so sánh row-value
+(cot1, cot2, id) < (?, ?, ?) và đi thẳng vào index.
+
+Con trỏ gửi cho client ở dạng base64url của JSON, client chỉ việc gửi lại nguyên vẹn.
+"""
+
+import base64
+import json
+from typing import Any, List, Optional, Sequence, Tuple
+
+# Số dòng mặc định / tối đa mỗi trang
+KICH_THUOC_TRANG = 50
+KICH_THUOC_TRANG_TOI_DA = 200
+
+
+def ma_hoa_con_tro(gia_tri: Sequence[Any]) -> str:
+    """Đóng gói giá trị các cột sắp xếp của dòng cuối trang"""
+    return base64.urlsafe_b64encode(json.dumps(list(gia_tri)).encode()).decode().rstrip('=')
+
+
+def giai_ma_con_tro(con_tro: Optional[str], so_cot: int) -> Optional[List[Any]]:
+    """Giá trị trong con trỏ; ValueError nếu con trỏ hỏng"""
+    if not con_tro:
+        return None
+    try:
+        gia_tri = json.loads(base64.urlsafe_b64decode(con_tro + '=' * (-len(con_tro) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError('Con trỏ phân trang không hợp lệ')
+    if not isinstance(gia_tri, list) or len(gia_tri) != so_cot:
+        raise ValueError('Con trỏ phân trang không hợp lệ')
+    return gia_tri
+
+
+def dieu_kien_sau(cot: Sequence[str], gia_tri: Optional[List[Any]], giam_dan: bool = True) -> Tuple[str, list]:
+    """Điều kiện WHERE lấy các dòng đứng sau con trỏ theo thứ tự sắp xếp"""
+    if gia_tri is None:
+        return '', []
+    dau = '<' if giam_dan else '>'
+    return f"({', '.join(cot)}) {dau} ({', '.join('?' * len(cot))})", list(gia_tri)
+
+
+def cat_trang(rows: list, gioi_han: int, cot: Sequence[str]) -> Tuple[list, Optional[str]]:
+    """
+    rows được truy vấn với LIMIT gioi_han + 1: dòng thừa cho biết còn trang sau.
+    Trả về (các dòng của trang, con trỏ trang sau hoặc None)
+    """
+    if len(rows) <= gioi_han:
+        return rows, None
+    rows = rows[:gioi_han]
+    return rows, ma_hoa_con_tro([rows[-1][c] for c in cot])
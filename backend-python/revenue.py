@@ -0,0 +1,178 @@
+"""
+HUY CINEMA - Bảng tổng hợp doanh thu theo phim và ngày chiếu
+revenue_daily(movie_id, show_date) giữ số vé bán (đang 'confirmed'), doanh thu và số vé
+hủy, được cập nhật trong cùng transaction với các thao tác đặt/hủy/thanh toán/hết hạn vé
+và sửa/xóa suất chiếu. Báo cáo top phim và doanh thu theo khoảng ngày đọc từ bảng này
+thay vì gộp toàn bộ bảng bookings.
+
+Đối soát với bookings:   python revenue.py
+Dựng lại từ lịch sử:     python revenue.py --backfill
+"""
+
+import sqlite3
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+# Doanh thu là số thực: chênh lệch nhỏ hơn mức này do làm tròn, không tính là lệch
+SAI_SO = 1e-6
+
+# Cùng định nghĩa với báo cáo cũ: vé bán = vé 'confirmed', gộp theo phim và ngày chiếu
+CAU_LENH_TONG_HOP = '''
+    SELECT s.movie_id, s.show_date,
+           SUM(b.status = 'confirmed') AS tickets_sold,
+           COALESCE(SUM(CASE WHEN b.status = 'confirmed' THEN b.price END), 0) AS revenue,
+           SUM(b.status = 'cancelled') AS cancellations
+    FROM bookings b
+    JOIN showtimes s ON s.id = b.showtime_id
+    GROUP BY s.movie_id, s.show_date
+'''
+
+
+def cong(conn: sqlite3.Connection, maphim: Optional[int], ngay: Optional[str],
+         ve_ban: int = 0, doanh_thu: float = 0, ve_huy: int = 0):
+    """Cộng dồn vào dòng (phim, ngày chiếu)"""
+    if maphim is None or not (ve_ban or doanh_thu or ve_huy):
+        return
+    conn.execute('''
+        INSERT INTO revenue_daily (movie_id, show_date, tickets_sold, revenue, cancellations)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(movie_id, show_date) DO UPDATE SET
+            tickets_sold = tickets_sold + excluded.tickets_sold,
+            revenue = revenue + excluded.revenue,
+            cancellations = cancellations + excluded.cancellations
+    ''', (maphim, ngay, ve_ban, doanh_thu, ve_huy))
+
+
+def chenh_lech_trang_thai(cu: Optional[str], moi: Optional[str], gia: float,
+                          so_ve: int = 1) -> Tuple[int, float, int]:
+    """(vé bán, doanh thu, vé hủy) thay đổi khi so_ve vé giá gia đổi trạng thái cu -> moi"""
+    ve_ban = so_ve * ((moi == 'confirmed') - (cu == 'confirmed'))
+    ve_huy = so_ve * ((moi == 'cancelled') - (cu == 'cancelled'))
+    return ve_ban, (gia or 0) * ve_ban, ve_huy
+
+
+def chuyen_suat_chieu(conn: sqlite3.Connection, masuatchieu: int, cu: Tuple[int, str],
+                      moi: Optional[Tuple[int, str]]):
+    """
+    Chuyển phần đóng góp của một suất chiếu từ (phim, ngày) cu sang moi khi suất chiếu
+    bị sửa phim/ngày chiếu, hoặc bỏ hẳn (moi=None) khi suất chiếu bị xóa
+    """
+    if cu == moi:
+        return
+    row = conn.execute('''
+        SELECT SUM(status = 'confirmed') AS tickets_sold,
+               COALESCE(SUM(CASE WHEN status = 'confirmed' THEN price END), 0) AS revenue,
+               SUM(status = 'cancelled') AS cancellations
+        FROM bookings WHERE showtime_id = ?
+    ''', (masuatchieu,)).fetchone()
+    if not row[0] and not row[2]:
+        return
+    cong(conn, cu[0], cu[1], -row[0], -row[1], -row[2])
+    if moi is not None:
+        cong(conn, moi[0], moi[1], row[0], row[1], row[2])
+
+
+def xay_lai(conn: sqlite3.Connection):
+    """Backfill: xóa và dựng lại toàn bộ bảng từ bookings"""
+    conn.execute('DELETE FROM revenue_daily')
+    conn.execute(f'''
+        INSERT INTO revenue_daily (movie_id, show_date, tickets_sold, revenue, cancellations)
+        SELECT * FROM ({CAU_LENH_TONG_HOP})
+        WHERE tickets_sold > 0 OR cancellations > 0
+    ''')
+
+
+def doi_soat(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """
+    So bảng tổng hợp với phép gộp trực tiếp từ bookings (trong một transaction đọc).
+    Trả về các dòng lệch: {movie_id, show_date, rollup: (...), raw: (...)}
+    """
+    isolation_cu = conn.isolation_level
+    conn.isolation_level = None
+    conn.execute('BEGIN')
+    try:
+        tong_hop = {(r[0], r[1]): tuple(r[2:]) for r in conn.execute(
+            'SELECT movie_id, show_date, tickets_sold, revenue, cancellations FROM revenue_daily'
+        )}
+        goc = {(r[0], r[1]): tuple(r[2:]) for r in conn.execute(CAU_LENH_TONG_HOP)}
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    finally:
+        conn.isolation_level = isolation_cu
+
+    lech = []
+    for khoa in tong_hop.keys() | goc.keys():
+        a = tong_hop.get(khoa, (0, 0, 0))
+        b = goc.get(khoa, (0, 0, 0))
+        if a[0] != b[0] or a[2] != b[2] or abs(a[1] - b[1]) > SAI_SO:
+            lech.append({'movie_id': khoa[0], 'show_date': khoa[1], 'rollup': a, 'raw': b})
+    return lech
+
+
+def top_phim(conn: sqlite3.Connection, gioi_han: int = 10, tu_ngay: str = None,
+             den_ngay: str = None) -> List[sqlite3.Row]:
+    """Top phim theo doanh thu (có thể giới hạn khoảng ngày chiếu)"""
+    dieu_kien, tham_so = '', []
+    if tu_ngay:
+        dieu_kien += ' AND r.show_date >= ?'
+        tham_so.append(tu_ngay)
+    if den_ngay:
+        dieu_kien += ' AND r.show_date <= ?'
+        tham_so.append(den_ngay)
+    return conn.execute(f'''
+        SELECT m.id, m.title, m.poster_url,
+               COALESCE(SUM(r.tickets_sold), 0) AS so_ve_ban,
+               COALESCE(SUM(r.revenue), 0) AS doanh_thu
+        FROM movies_info m
+        LEFT JOIN revenue_daily r ON r.movie_id = m.id{dieu_kien}
+        GROUP BY m.id
+        ORDER BY doanh_thu DESC
+        LIMIT ?
+    ''', tham_so + [gioi_han]).fetchall()
+
+
+def theo_ngay(conn: sqlite3.Connection, tu_ngay: str = None, den_ngay: str = None,
+              maphim: int = None) -> List[sqlite3.Row]:
+    """Doanh thu từng ngày chiếu trong khoảng (tất cả phim hoặc một phim)"""
+    dieu_kien, tham_so = [], []
+    if tu_ngay:
+        dieu_kien.append('show_date >= ?')
+        tham_so.append(tu_ngay)
+    if den_ngay:
+        dieu_kien.append('show_date <= ?')
+        tham_so.append(den_ngay)
+    if maphim:
+        dieu_kien.append('movie_id = ?')
+        tham_so.append(maphim)
+    return conn.execute(f'''
+        SELECT show_date, SUM(tickets_sold) AS so_ve_ban, SUM(revenue) AS doanh_thu,
+               SUM(cancellations) AS so_ve_huy
+        FROM revenue_daily
+        {'WHERE ' + ' AND '.join(dieu_kien) if dieu_kien else ''}
+        GROUP BY show_date
+        HAVING SUM(tickets_sold) != 0 OR SUM(cancellations) != 0
+        ORDER BY show_date
+    ''', tham_so).fetchall()
+
+
+if __name__ == '__main__':
+    import db
+
+    conn = sqlite3.connect(db.DB_PATH)
+    if '--backfill' in sys.argv[1:]:
+        with conn:
+            xay_lai(conn)
+        print('✓ Đã dựng lại revenue_daily từ bookings')
+
+    lech = doi_soat(conn)
+    conn.close()
+    if not lech:
+        print('✓ revenue_daily khớp với bookings')
+        sys.exit(0)
+    for dong in sorted(lech, key=lambda d: (d['movie_id'], d['show_date'] or '')):
+        print(f"✗ phim {dong['movie_id']} ngày {dong['show_date']}: "
+              f"tổng hợp {dong['rollup']}, thực tế {dong['raw']}")
+    print('Chạy với --backfill để dựng lại.')
+    sys.exit(1)
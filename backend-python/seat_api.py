@@ -0,0 +1,311 @@
+"""
+HUY CINEMA - Xử lý các API ghế (giữ, bỏ giữ, lấy trạng thái, luồng SSE, phòng chờ)
+Không phụ thuộc Flask: view trong app.py và chế độ ASGI trong seat_api_async.py cùng
+gọi các hàm ở đây với dữ liệu request đã đọc và mã khách hàng lấy từ phiên đăng nhập.
+Mỗi hàm trả về (dữ liệu JSON, mã HTTP); dữ liệu None nghĩa là 304 không có nội dung.
+Giữ ghế nhận idempotency_key trong data (view gộp header Idempotency-Key vào), xem idempotency.py.
+"""
+
+import base64
+import json
+import sqlite3
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import idempotency
+from idempotency import kho_chong_lap
+from models import Ghe
+from seat_events import bang_tin_ghe
+from seat_map import so_do_ghe
+from waiting_room import phong_cho
+
+# Số ghế tối đa một request /api/hold-seats được giữ
+SO_GHE_GIU_TOI_DA = 20
+
+# Thời hạn giữ ghế (giây)
+THOI_HAN_GIU = 5 * 60
+
+# Khoảng gửi comment giữ kết nối SSE (giây)
+SSE_KEEPALIVE = 15
+
+KetQua = Tuple[Optional[Dict[str, Any]], int]
+
+# Lần đầu cùng Idempotency-Key chưa xong (chờ quá lâu hoặc đã đủ request chờ)
+DANG_XU_LY: KetQua = ({'success': False, 'message': 'Request cùng Idempotency-Key đang được xử lý'}, 409)
+
+
+def _cho_luot(showtime_id: Any, user_id: int) -> Optional[KetQua]:
+    """
+    Giữ ghế cần có lượt trong phòng chờ (lấy lượt ngay nếu còn, gia hạn nếu đang có).
+    Đang xếp hàng thì trả 429 kèm vị trí để client quay lại trang chờ
+    """
+    try:
+        showtime_id = int(showtime_id)
+    except (TypeError, ValueError):
+        return {'success': False, 'message': 'Suất chiếu không hợp lệ'}, 400
+    trang_thai = phong_cho.vao(showtime_id, user_id)
+    if trang_thai['admitted']:
+        return None
+    return {'success': False, 'queued': True, 'message': 'Đang xếp hàng chờ lượt chọn ghế',
+            **trang_thai}, 429
+
+
+def _nen_luu(ket_qua: KetQua) -> bool:
+    """Không lưu kết quả tạm thời (đang xếp hàng, lỗi server): lần gửi lại được chạy lại"""
+    return ket_qua[1] != 429 and ket_qua[1] < 500
+
+
+def tach_khoa_chong_lap(data: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+    """(idempotency_key, phần còn lại của data để so nội dung)"""
+    khoa = data.get('idempotency_key')
+    return None if khoa is None else str(khoa), {k: v for k, v in data.items() if k != 'idempotency_key'}
+
+
+def _chong_lap(ten: str, xu_ly: Callable[[Dict[str, Any], int], KetQua],
+               data: Dict[str, Any], user_id: int) -> KetQua:
+    """
+    Chạy xu_ly một lần cho mỗi idempotency_key (header Idempotency-Key do view gộp vào
+    data): request gửi lại nhận kết quả lần đầu mà không chạm DB
+    """
+    khoa, noi_dung = tach_khoa_chong_lap(data)
+    try:
+        return kho_chong_lap.thuc_hien(
+            (ten, user_id), khoa, noi_dung, lambda: xu_ly(data, user_id), nen_luu=_nen_luu
+        )
+    except idempotency.KhoaKhongHopLe:
+        return {'success': False, 'message': 'Idempotency-Key không hợp lệ'}, 400
+    except idempotency.KhoaKhongKhop:
+        return {'success': False, 'message': 'Idempotency-Key đã dùng cho một request khác'}, 422
+    except idempotency.KhoaDangXuLy:
+        return DANG_XU_LY
+
+
+def phong_cho_suat_chieu(showtime_id: int, user_id: int) -> KetQua:
+    """Vị trí trong hàng và thời gian chờ ước tính (trang chờ hỏi định kỳ), không chạm DB"""
+    return phong_cho.vao(showtime_id, user_id, gia_han=False), 200
+
+
+def giu_ghe(data: Dict[str, Any], user_id: int) -> KetQua:
+    """Giữ một ghế tạm thời khi user chọn (chống lặp theo idempotency_key nếu có)"""
+    return _chong_lap('hold-seat', _giu_ghe, data, user_id)
+
+
+def _giu_ghe(data: Dict[str, Any], user_id: int) -> KetQua:
+    seat_id = data.get('seat_id')
+    showtime_id = data.get('showtime_id')
+
+    if not seat_id or not showtime_id:
+        return {'success': False, 'message': 'Thiếu thông tin ghế'}, 400
+    try:
+        seat_id = int(seat_id)
+    except (TypeError, ValueError):
+        return {'success': False, 'message': 'Thiếu thông tin ghế'}, 400
+
+    tu_choi = _cho_luot(showtime_id, user_id)
+    if tu_choi:
+        return tu_choi
+
+    # Kiểm tra xung đột trong bộ nhớ, chỉ ghi xuống DB khi ghế còn trống
+    try:
+        so_do = so_do_ghe.lay(int(showtime_id))
+        held_until = so_do.giu_ghe(seat_id, user_id, thoi_han=THOI_HAN_GIU) if so_do else None
+    except sqlite3.Error as e:
+        return {'success': False, 'message': str(e)}, 500
+
+    if not held_until:
+        return {'success': False, 'message': 'Ghế đã được người khác chọn'}, 409
+
+    return {'success': True, 'message': 'Đã giữ ghế', 'held_until': held_until}, 200
+
+
+def giu_nhieu_ghe(data: Dict[str, Any], user_id: int) -> KetQua:
+    """
+    Giữ nhiều ghế trong một transaction (chọn ghế theo nhóm).
+    mode = 'all': giữ được tất cả hoặc không ghế nào; 'best_effort': giữ được ghế nào hay ghế đó.
+    Chống lặp theo idempotency_key nếu có, như giu_ghe.
+    """
+    return _chong_lap('hold-seats', _giu_nhieu_ghe, data, user_id)
+
+
+def _giu_nhieu_ghe(data: Dict[str, Any], user_id: int) -> KetQua:
+    seat_ids = data.get('seat_ids') or []
+    showtime_id = data.get('showtime_id')
+    mode = data.get('mode', 'all')
+
+    if not seat_ids or not showtime_id or not isinstance(seat_ids, list):
+        return {'success': False, 'message': 'Thiếu thông tin ghế'}, 400
+    if mode not in ('all', 'best_effort'):
+        return {'success': False, 'message': 'mode phải là all hoặc best_effort'}, 400
+    if len(seat_ids) > SO_GHE_GIU_TOI_DA:
+        return {'success': False, 'message': f'Chỉ được giữ tối đa {SO_GHE_GIU_TOI_DA} ghế'}, 400
+    try:
+        seat_ids = [int(sid) for sid in seat_ids]
+    except (TypeError, ValueError):
+        return {'success': False, 'message': 'Thiếu thông tin ghế'}, 400
+
+    tu_choi = _cho_luot(showtime_id, user_id)
+    if tu_choi:
+        return tu_choi
+
+    try:
+        so_do = so_do_ghe.lay(int(showtime_id))
+        if so_do:
+            held_until, ket_qua = so_do.giu_nhieu_ghe(seat_ids, user_id, thoi_han=THOI_HAN_GIU,
+                                                      tat_ca=(mode == 'all'))
+        else:
+            held_until, ket_qua = None, {sid: 'unavailable' for sid in seat_ids}
+    except sqlite3.Error as e:
+        return {'success': False, 'message': str(e)}, 500
+
+    seats = [{'id': sid, 'result': ket_qua[sid]} for sid in dict.fromkeys(seat_ids)]
+    if not held_until:
+        return {'success': False, 'message': 'Ghế đã được người khác chọn',
+                'held_until': None, 'seats': seats}, 409
+
+    so_ghe_giu = sum(1 for s in seats if s['result'] == 'held')
+    return {'success': True, 'message': f'Đã giữ {so_ghe_giu}/{len(seats)} ghế',
+            'held_until': held_until, 'seats': seats}, 200
+
+
+def bo_giu_ghe(data: Dict[str, Any], user_id: int) -> KetQua:
+    """Bỏ giữ ghế khi user bỏ chọn"""
+    seat_id = data.get('seat_id')
+
+    if not seat_id:
+        return {'success': False, 'message': 'Thiếu thông tin ghế'}, 400
+
+    showtime_id = data.get('showtime_id')
+    try:
+        seat_id = int(seat_id)
+        showtime_id = int(showtime_id) if showtime_id else None
+    except (TypeError, ValueError):
+        return {'success': False, 'message': 'Ghế hoặc suất chiếu không hợp lệ'}, 400
+
+    if showtime_id is None:
+        # Client cũ không gửi showtime_id. Ghế ảo (id âm) của suất chiếu không lưu sẵn
+        # ghế thì không tra ngược được: báo lỗi thay vì trả thành công mà không bỏ gì
+        ghe = Ghe.tim_theo_id(seat_id)
+        if not ghe:
+            return {'success': False, 'message': 'Thiếu thông tin suất chiếu'}, 400
+        showtime_id = ghe.masuatchieu
+
+    # Chỉ cho phép bỏ ghế do chính user đang giữ
+    so_do = so_do_ghe.lay(showtime_id)
+    if so_do:
+        so_do.bo_giu_ghe(seat_id, user_id)
+
+    return {'success': True, 'message': 'Đã bỏ giữ ghế'}, 200
+
+
+def doc_ghe(showtime_id: int) -> List[Dict[str, Any]]:
+    """Đọc trạng thái toàn bộ ghế của suất chiếu từ sơ đồ ghế trong bộ nhớ"""
+    so_do = so_do_ghe.lay(showtime_id)
+    return so_do.danh_sach() if so_do else []
+
+
+def dinh_dang_ghe(ghe: Dict[str, Any], user_id: int) -> Dict[str, Any]:
+    """Chuyển một ghế (dòng DB hoặc sự kiện bảng tin) sang dạng trả cho client"""
+    return {
+        'id': ghe['id'],
+        'seat_number': ghe['seat_number'],
+        'status': ghe['status'],
+        'is_held_by_me': ghe['held_by'] == user_id if ghe['status'] == 'held' else False
+    }
+
+
+def chua_doi(showtime_id: int, user_id: int, since: Optional[str]) -> bool:
+    """
+    get-seats?since= vẫn là phiên bản hiện tại (trả 304). Chỉ đọc bảng tin trong bộ nhớ,
+    chế độ ASGI trả lời ngay trên event loop không qua thread pool DB
+    """
+    # Trang đặt vé còn mở và đang hỏi trạng thái ghế: giữ lượt trong phòng chờ
+    phong_cho.gia_han(showtime_id, user_id)
+    return since is not None and bang_tin_ghe.doc_token(since) == bang_tin_ghe.phien_ban(showtime_id)
+
+
+def lay_ghe(showtime_id: int, user_id: int, since: Optional[str] = None,
+            dinh_dang: Optional[str] = None, bo_cuc: Optional[str] = None) -> KetQua:
+    """
+    Trạng thái ghế realtime (dự phòng khi trình duyệt không dùng được SSE).
+    since = version đã nhận lần trước: không có gì đổi thì trả 304, ngược lại chỉ trả
+    các ghế đổi trạng thái sau version đó (full=false).
+
+    dinh_dang='compact': lần tải toàn bộ trả 'status' (một ký tự mỗi ghế: a/h/b/r) và
+    'mine' (base64 bitmask ghế mình giữ) theo thứ tự 'layout'; client đã có layout
+    gửi bo_cuc='0' để bỏ qua. Các lần trả thay đổi vẫn dùng dạng danh sách.
+    """
+    if chua_doi(showtime_id, user_id, since):
+        return None, 304
+
+    phien_ban_client = bang_tin_ghe.doc_token(since)
+
+    thay_doi = None
+    if phien_ban_client is not None:
+        phien_ban, thay_doi = bang_tin_ghe.lay_tu(showtime_id, phien_ban_client)
+
+    if thay_doi == []:
+        return None, 304
+
+    if thay_doi is None and dinh_dang == 'compact':
+        phien_ban = bang_tin_ghe.phien_ban(showtime_id)
+        so_do = so_do_ghe.lay(showtime_id)
+        trang_thai, cua_toi = so_do.ma_hoa_gon(user_id) if so_do else ('', b'')
+        du_lieu = {
+            'version': bang_tin_ghe.token(phien_ban),
+            'full': True,
+            'format': 'compact',
+            'status': trang_thai,
+            'mine': base64.b64encode(cua_toi).decode('ascii')
+        }
+        if bo_cuc != '0':
+            du_lieu['layout'] = so_do.bo_cuc() if so_do else {'ids': [], 'seat_numbers': []}
+        return du_lieu, 200
+
+    if thay_doi is None:
+        # Lấy phiên bản trước khi đọc sơ đồ để không bỏ lỡ thay đổi xảy ra giữa chừng
+        phien_ban = bang_tin_ghe.phien_ban(showtime_id)
+        seats = [dinh_dang_ghe(s, user_id) for s in doc_ghe(showtime_id)]
+    else:
+        # Một ghế đổi nhiều lần chỉ cần trạng thái cuối
+        moi_nhat = {ghe['id']: ghe for ghe in thay_doi}
+        seats = [dinh_dang_ghe(ghe, user_id) for ghe in moi_nhat.values()]
+
+    return {
+        'version': bang_tin_ghe.token(phien_ban),
+        'full': thay_doi is None,
+        'seats': seats
+    }, 200
+
+
+def su_kien_sse(ten: str, phien_ban: int, du_lieu: Dict[str, Any]) -> str:
+    # id kèm epoch như version của get-seats: trình duyệt gửi lại qua Last-Event-ID
+    return f'event: {ten}\nid: {bang_tin_ghe.token(phien_ban)}\ndata: {json.dumps(du_lieu)}\n\n'
+
+
+def tiep_tuc_sse(showtime_id: int, last_event_id: Optional[str]) -> Tuple[Optional[int], Optional[List[Dict[str, Any]]]]:
+    """
+    (phiên bản, thay đổi) để nối tiếp luồng SSE từ Last-Event-ID khi trình duyệt kết nối lại.
+    Id hỏng hoặc thuộc lần chạy khác (phiên bản đã đếm lại từ 0) -> (None, None): gửi ảnh chụp
+    """
+    phien_ban = bang_tin_ghe.doc_token(last_event_id)
+    if phien_ban is None:
+        return None, None
+    return bang_tin_ghe.lay_tu(showtime_id, phien_ban)
+
+
+def khung_sse(showtime_id: int, user_id: int, phien_ban: Optional[int],
+              thay_doi: Optional[List[Dict[str, Any]]]) -> Tuple[int, str]:
+    """
+    Một khung SSE sau lần chờ bảng tin: thay_doi None -> ảnh chụp toàn bộ ghế,
+    [] -> comment giữ kết nối, còn lại -> các ghế đổi trạng thái. Trả về (phiên bản, khung)
+    """
+    # Luồng SSE còn mở (ít nhất mỗi SSE_KEEPALIVE giây một khung): giữ lượt trong phòng chờ
+    phong_cho.gia_han(showtime_id, user_id)
+    if thay_doi is None:
+        # Lấy phiên bản trước khi đọc sơ đồ để không bỏ lỡ thay đổi xảy ra giữa chừng
+        phien_ban = bang_tin_ghe.phien_ban(showtime_id)
+        seats = [dinh_dang_ghe(r, user_id) for r in doc_ghe(showtime_id)]
+        return phien_ban, su_kien_sse('snapshot', phien_ban, {'seats': seats})
+    if thay_doi:
+        seats = [dinh_dang_ghe(ghe, user_id) for ghe in thay_doi]
+        return phien_ban, su_kien_sse('seats', phien_ban, {'seats': seats})
+    return phien_ban, ': ping\n\n'
@@ -0,0 +1,364 @@
+"""
+HUY CINEMA - Chế độ chạy ASGI cho các API ghế
+Ứng dụng ASGI thuần (không cần framework) phục vụ các API ghế trên event loop asyncio:
+    GET  /api/get-seats/<id>, /api/seat-stream/<id>, /api/waiting-room/<id>
+    POST /api/hold-seat, /api/hold-seats, /api/release-seat
+Mỗi kết nối SSE đang chờ chỉ là một coroutine chờ bảng tin ghế (BangTinGhe.cho_async),
+không giữ thread nào như view Flask, nên một tiến trình giữ được hàng nghìn người xem.
+Việc đụng tới SQLite (giữ/bỏ giữ ghế, nạp sơ đồ ghế lần đầu) chạy trong một thread pool
+riêng cỡ bằng pool kết nối DB; request gửi lại cùng Idempotency-Key trong lúc lần đầu
+đang chạy chờ trên event loop, không chiếm thread của pool đó.
+
+Mọi đường dẫn khác (và request API ghế chưa đăng nhập) được chuyển cho Flask app qua cầu
+nối WSGI chạy trong thread pool, cùng tiến trình: sơ đồ ghế, bảng tin và bộ hẹn giờ giải
+phóng ghế dùng chung, đặt vé qua /book vẫn đẩy được thay đổi tới người xem SSE. Phiên
+đăng nhập đọc từ cookie session của Flask (cùng secret key). Các API ghế ghi số liệu
+request/SQL với cùng tên route như view Flask, xem chung ở /metrics.
+
+Chạy (cần uvicorn):   python seat_api_async.py --port 3000
+                      uvicorn seat_api_async:ung_dung --port 3000
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from werkzeug.http import parse_cookie, parse_options_header
+
+import app as flask_app_module
+import db
+import idempotency
+import metrics
+import seat_api
+from idempotency import kho_chong_lap
+from seat_events import bang_tin_ghe
+
+flask_app = flask_app_module.app
+
+# Thread pool cho việc đụng tới SQLite của các API ghế: nhiều thread hơn số kết nối
+# trong pool chỉ làm chúng chờ nhau
+_thuc_thi_db = ThreadPoolExecutor(max_workers=max(db.POOL_SIZE, 1), thread_name_prefix='seat-db')
+
+# Thread pool cho các request chuyển sang Flask (render trang, đặt vé, admin)
+_thuc_thi_wsgi = ThreadPoolExecutor(max_workers=16, thread_name_prefix='wsgi')
+
+# Kích thước body tối đa đọc cho một request API ghế
+BODY_TOI_DA = 64 * 1024
+
+_TUYEN_GET = [
+    (re.compile(r'^/api/get-seats/(\d+)$'), 'get_seats'),
+    (re.compile(r'^/api/seat-stream/(\d+)$'), 'seat_stream'),
+    (re.compile(r'^/api/waiting-room/(\d+)$'), 'waiting_room'),
+]
+# Đường dẫn -> (hàm xử lý, tên route như endpoint Flask để số liệu hai chế độ trùng nhãn,
+# phạm vi khóa chống lặp như seat_api._chong_lap hoặc None nếu không nhận khóa)
+_TUYEN_POST = {
+    '/api/hold-seat': (seat_api.giu_ghe, 'hold_seat', 'hold-seat'),
+    '/api/hold-seats': (seat_api.giu_nhieu_ghe, 'hold_seats', 'hold-seats'),
+    '/api/release-seat': (seat_api.bo_giu_ghe, 'release_seat', None),
+}
+
+
+def _trong_route(route: str, ham: Callable, args: Tuple) -> Any:
+    metrics.dat_route(route)
+    try:
+        return ham(*args)
+    finally:
+        metrics.dat_route(None)
+
+
+async def _chay_db(route: str, ham: Callable, *args) -> Any:
+    """Chạy ham trong thread pool DB, câu lệnh SQL được gắn nhãn route"""
+    return await asyncio.get_running_loop().run_in_executor(_thuc_thi_db, _trong_route, route, ham, args)
+
+
+def _do_request(send: Callable, route: str, phuong_thuc: str) -> Callable:
+    """Bọc send để ghi số liệu request khi gửi header (như Flask: tới lúc trả response)"""
+    bat_dau = time.perf_counter()
+
+    async def gui(thong_diep: Dict[str, Any]):
+        if thong_diep['type'] == 'http.response.start':
+            metrics.ghi_request(route, phuong_thuc, thong_diep['status'], time.perf_counter() - bat_dau)
+        await send(thong_diep)
+    return gui if metrics.BAT else send
+
+
+def _header(scope: Dict[str, Any], ten: bytes) -> Optional[str]:
+    for k, v in scope['headers']:
+        if k == ten:
+            return v.decode('latin-1')
+    return None
+
+
+def doc_phien(scope: Dict[str, Any]) -> Dict[str, Any]:
+    """Phiên đăng nhập Flask trong cookie của request ({} nếu không có hoặc sai chữ ký)"""
+    cookie = parse_cookie(_header(scope, b'cookie') or '')
+    gia_tri = cookie.get(flask_app.config['SESSION_COOKIE_NAME'])
+    if not gia_tri:
+        return {}
+    bo_ky = flask_app.session_interface.get_signing_serializer(flask_app)
+    try:
+        return bo_ky.loads(gia_tri, max_age=int(flask_app.permanent_session_lifetime.total_seconds()))
+    except Exception:
+        return {}
+
+
+async def _doc_body(receive: Callable, gioi_han: Optional[int] = None) -> Optional[bytes]:
+    """Đọc toàn bộ body; None nếu vượt gioi_han"""
+    phan = []
+    do_dai = 0
+    while True:
+        thong_diep = await receive()
+        if thong_diep['type'] == 'http.disconnect':
+            return b''.join(phan)
+        phan.append(thong_diep.get('body', b''))
+        do_dai += len(phan[-1])
+        if gioi_han is not None and do_dai > gioi_han:
+            return None
+        if not thong_diep.get('more_body'):
+            return b''.join(phan)
+
+
+async def _tra_json(send: Callable, ma: int, du_lieu: Optional[Dict[str, Any]],
+                    headers: List[Tuple[bytes, bytes]] = ()):
+    # Cùng cách mã hóa với jsonify của Flask
+    body = flask_app.json.dumps(du_lieu, separators=(',', ':')).encode() + b'\n' if du_lieu is not None else b''
+    tat_ca = [(b'content-length', str(len(body)).encode())] + list(headers)
+    if du_lieu is not None:
+        tat_ca.append((b'content-type', b'application/json'))
+    await send({'type': 'http.response.start', 'status': ma, 'headers': tat_ca})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+# ===== CẦU NỐI WSGI =====
+def _environ(scope: Dict[str, Any], body: bytes) -> Dict[str, Any]:
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': scope['client'][0] if scope.get('client') else '',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for ten, gia_tri in scope['headers']:
+        ten = ten.decode('latin-1').upper().replace('-', '_')
+        gia_tri = gia_tri.decode('latin-1')
+        if ten not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            ten = 'HTTP_' + ten
+        if ten in environ:
+            gia_tri = environ[ten] + ('; ' if ten == 'HTTP_COOKIE' else ',') + gia_tri
+        environ[ten] = gia_tri
+    return environ
+
+
+def _goi_wsgi(environ: Dict[str, Any]) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+    """Chạy Flask app cho một request, gom toàn bộ response"""
+    ket_qua = {}
+
+    def start_response(status, headers, exc_info=None):
+        ket_qua['status'] = int(status.split(' ', 1)[0])
+        ket_qua['headers'] = [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers]
+        return phan.append
+
+    phan = []
+    lap = flask_app(environ, start_response)
+    try:
+        phan.extend(lap)
+    finally:
+        if hasattr(lap, 'close'):
+            lap.close()
+    return ket_qua['status'], ket_qua['headers'], b''.join(phan)
+
+
+async def chuyen_cho_flask(scope: Dict[str, Any], receive: Callable, send: Callable):
+    """Chuyển request cho Flask app (chạy trong thread pool) và gửi lại response"""
+    body = await _doc_body(receive)
+    ma, headers, noi_dung = await asyncio.get_running_loop().run_in_executor(
+        _thuc_thi_wsgi, _goi_wsgi, _environ(scope, body)
+    )
+    await send({'type': 'http.response.start', 'status': ma, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': noi_dung})
+
+
+# ===== API GHẾ =====
+async def get_seats(scope: Dict[str, Any], receive: Callable, send: Callable,
+                    showtime_id: int, user_id: int):
+    tham_so = parse_qs(scope['query_string'].decode('latin-1'))
+    lay = lambda ten: tham_so.get(ten, [None])[0]  # noqa: E731
+    # Không có gì đổi (phần lớn các lần poll): trả 304 ngay, không chờ thread pool DB
+    if seat_api.chua_doi(showtime_id, user_id, lay('since')):
+        await _tra_json(send, 304, None, [(b'cache-control', b'no-store')])
+        return
+    du_lieu, ma = await _chay_db(
+        'get_seats', lambda: seat_api.lay_ghe(showtime_id, user_id, since=lay('since'),
+                                 dinh_dang=lay('format'), bo_cuc=lay('layout'))
+    )
+    await _tra_json(send, ma, du_lieu, [(b'cache-control', b'no-store')])
+
+
+async def waiting_room(scope: Dict[str, Any], receive: Callable, send: Callable,
+                       showtime_id: int, user_id: int):
+    # Chỉ đọc phòng chờ trong bộ nhớ: trả lời ngay trên event loop
+    du_lieu, ma = seat_api.phong_cho_suat_chieu(showtime_id, user_id)
+    await _tra_json(send, ma, du_lieu, [(b'cache-control', b'no-store')])
+
+
+async def _cho_ngat_ket_noi(receive: Callable):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def seat_stream(scope: Dict[str, Any], receive: Callable, send: Callable,
+                      showtime_id: int, user_id: int):
+    """SSE như view Flask seat_stream nhưng chờ bảng tin trên event loop"""
+    phien_ban, thay_doi = seat_api.tiep_tuc_sse(showtime_id, _header(scope, b'last-event-id'))
+
+    await send({'type': 'http.response.start', 'status': 200, 'headers': [
+        (b'content-type', b'text/event-stream; charset=utf-8'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no'),
+    ]})
+    ngat_ket_noi = asyncio.ensure_future(_cho_ngat_ket_noi(receive))
+    try:
+        while True:
+            if thay_doi is None:
+                # Ảnh chụp có thể phải nạp sơ đồ ghế từ DB
+                phien_ban, khung = await _chay_db('seat_stream', seat_api.khung_sse,
+                                                  showtime_id, user_id, phien_ban, None)
+            else:
+                phien_ban, khung = seat_api.khung_sse(showtime_id, user_id, phien_ban, thay_doi)
+            await send({'type': 'http.response.body', 'body': khung.encode(), 'more_body': True})
+
+            cho = asyncio.ensure_future(bang_tin_ghe.cho_async(showtime_id, phien_ban, seat_api.SSE_KEEPALIVE))
+            await asyncio.wait({cho, ngat_ket_noi}, return_when=asyncio.FIRST_COMPLETED)
+            if ngat_ket_noi.done():
+                cho.cancel()
+                return
+            phien_ban, thay_doi = cho.result()
+    finally:
+        ngat_ket_noi.cancel()
+
+
+def _la_json(content_type: Optional[str]) -> bool:
+    """Cùng điều kiện với request.is_json của Flask"""
+    mimetype = parse_options_header(content_type or '')[0]
+    return mimetype == 'application/json' or (mimetype.startswith('application/') and mimetype.endswith('+json'))
+
+
+async def _cho_lan_dau(pham_vi: str, data: Dict[str, Any], user_id: int) -> Optional[seat_api.KetQua]:
+    """
+    Request gửi lại khi lần đầu cùng Idempotency-Key đang chạy: chờ trên event loop và
+    nhận kết quả của lần đầu, thay vì chiếm một thread của pool DB trong lúc chờ
+    """
+    khoa, noi_dung = seat_api.tach_khoa_chong_lap(data)
+    try:
+        co_ket_qua, ket_qua = await kho_chong_lap.cho_async((pham_vi, user_id), khoa, noi_dung)
+    except idempotency.KhoaDangXuLy:
+        return seat_api.DANG_XU_LY
+    return ket_qua if co_ket_qua else None
+
+
+async def api_ghe_post(receive: Callable, send: Callable, xu_ly: Callable, route: str, user_id: int,
+                       content_type: Optional[str] = None, khoa_chong_lap: Optional[str] = None,
+                       pham_vi_chong_lap: Optional[str] = None):
+    # Như request.get_json() của view Flask: không phải JSON -> 415, JSON hỏng -> 400
+    if not _la_json(content_type):
+        await _tra_json(send, 415, {'success': False, 'message': 'Content-Type phải là application/json'})
+        return
+    body = await _doc_body(receive, BODY_TOI_DA)
+    if body is None:
+        await _tra_json(send, 413, {'success': False, 'message': 'Request quá lớn'})
+        return
+    try:
+        data = json.loads(body)
+    except ValueError:
+        await _tra_json(send, 400, {'success': False, 'message': 'Body JSON không hợp lệ'})
+        return
+    data = data if isinstance(data, dict) else {}
+    if khoa_chong_lap is not None:
+        data['idempotency_key'] = khoa_chong_lap
+    ket_qua = None
+    if pham_vi_chong_lap is not None:
+        ket_qua = await _cho_lan_dau(pham_vi_chong_lap, data, user_id)
+    du_lieu, ma = ket_qua or await _chay_db(route, xu_ly, data, user_id)
+    await _tra_json(send, ma, du_lieu)
+
+
+# ===== ỨNG DỤNG ASGI =====
+async def _lifespan(receive: Callable, send: Callable):
+    while True:
+        thong_diep = await receive()
+        if thong_diep['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif thong_diep['type'] == 'lifespan.shutdown':
+            _thuc_thi_db.shutdown(wait=False)
+            _thuc_thi_wsgi.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def ung_dung(scope: Dict[str, Any], receive: Callable, send: Callable):
+    """Điểm vào ASGI: API ghế chạy trên event loop, phần còn lại chuyển cho Flask"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    user_id = None
+    duong_dan, phuong_thuc = scope['path'], scope['method']
+    if duong_dan.startswith('/api/'):
+        user_id = doc_phien(scope).get('user_id')
+
+    # Chưa đăng nhập: để login_required của Flask trả redirect + flash như cũ
+    if user_id is not None:
+        if phuong_thuc == 'GET':
+            for mau, ten in _TUYEN_GET:
+                khop = mau.match(duong_dan)
+                if khop:
+                    xu_ly = {'get_seats': get_seats, 'seat_stream': seat_stream, 'waiting_room': waiting_room}[ten]
+                    await xu_ly(scope, receive, _do_request(send, ten, phuong_thuc), int(khop.group(1)), user_id)
+                    return
+        elif phuong_thuc == 'POST' and duong_dan in _TUYEN_POST:
+            xu_ly, ten, pham_vi = _TUYEN_POST[duong_dan]
+            await api_ghe_post(receive, _do_request(send, ten, phuong_thuc), xu_ly, ten, user_id,
+                               _header(scope, b'content-type'), _header(scope, b'idempotency-key'), pham_vi)
+            return
+
+    await chuyen_cho_flask(scope, receive, send)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--backlog', type=int, default=4096)
+    args = parser.parse_args()
+
+    try:
+        import uvicorn
+    except ImportError:
+        sys.exit('Chế độ ASGI cần uvicorn: pip install uvicorn')
+
+    flask_app_module.init_db()
+    flask_app_module.giai_phong_ghe_het_han()
+    print(f'✅ HUY CINEMA (ASGI): http://localhost:{args.port}')
+    uvicorn.run(ung_dung, host=args.host, port=args.port, backlog=args.backlog,
+                log_level='warning', access_log=False)
@@ -0,0 +1,169 @@
+"""
+HUY CINEMA - Bảng tin trạng thái ghế
+Phát các thay đổi trạng thái ghế theo từng suất chiếu để trang đặt vé nhận qua
+Server-Sent Events thay vì poll /api/get-seats mỗi giây.
+
+Người nghe có thể chờ theo hai cách: thread chờ trên Condition (view Flask) hoặc
+coroutine chờ một Future trên event loop (chế độ ASGI, seat_api_async.py) - chờ theo
+cách sau không giữ thread nào nên một tiến trình giữ được hàng nghìn kết nối SSE.
+
+Lưu ý: bảng tin nằm trong bộ nhớ của tiến trình, phù hợp khi chạy một tiến trình
+Flask (app.run) hoặc một tiến trình ASGI. Nhiều worker cần một kênh dùng chung
+(Redis pub/sub, ...).
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Dict, Any, Tuple
+
+# Số sự kiện gần nhất giữ lại cho mỗi suất chiếu để client kết nối lại tiếp tục được
+SO_SU_KIEN_LUU = 500
+
+
+class KenhSuatChieu:
+    """
+    Kênh sự kiện của một suất chiếu
+    Attributes:
+        - phien_ban: int (tăng mỗi lần một ghế đổi trạng thái)
+        - su_kien: deque[(phien_ban, thay_doi)]
+        - cho_async: dict[Future -> event loop] (coroutine đang chờ thay đổi)
+    """
+
+    def __init__(self):
+        self.phien_ban = 0
+        self.su_kien = deque(maxlen=SO_SU_KIEN_LUU)
+        self.dieu_kien = threading.Condition()
+        self.cho_async: Dict[asyncio.Future, asyncio.AbstractEventLoop] = {}
+
+
+def _danh_thuc(danh_sach: List[asyncio.Future]):
+    """Chạy trên event loop: hoàn tất các Future đang chờ"""
+    for tuong_lai in danh_sach:
+        if not tuong_lai.done():
+            tuong_lai.set_result(None)
+
+
+class BangTinGhe:
+    """
+    Class BảngTinGhế - Phát/nhận thay đổi trạng thái ghế theo suất chiếu
+    Methods:
+        + Phat(): Phát danh sách thay đổi của một suất chiếu
+        + LayTu(): Lấy các thay đổi sau một phiên bản
+        + Cho(): Chờ đến khi có thay đổi mới hoặc hết thời gian
+        + ChoAsync(): Như Cho() nhưng là coroutine, không giữ thread khi chờ
+        + Token()/DocToken(): Đóng gói/đọc phiên bản kèm epoch cho client
+        + XoaTatCa(): Bỏ mọi kênh, đổi epoch
+    """
+
+    def __init__(self):
+        self._kenh: Dict[int, KenhSuatChieu] = {}
+        self._khoa = threading.Lock()
+        # Phiên bản đếm lại từ 0 khi khởi động lại: client gửi kèm epoch để phân biệt
+        self.epoch = format(int(time.time() * 1000), 'x')
+
+    def xoa_tat_ca(self):
+        """Bỏ mọi kênh (đổi sang database khác); phiên bản đếm lại nên token cũ không còn hợp lệ"""
+        with self._khoa:
+            self._kenh.clear()
+            self.epoch = format(max(int(time.time() * 1000), int(self.epoch, 16) + 1), 'x')
+
+    def _lay_kenh(self, masuatchieu: int) -> KenhSuatChieu:
+        kenh = self._kenh.get(masuatchieu)
+        if kenh is None:
+            with self._khoa:
+                kenh = self._kenh.setdefault(masuatchieu, KenhSuatChieu())
+        return kenh
+
+    def phat(self, masuatchieu: int, thay_doi: List[Dict[str, Any]]) -> int:
+        """Phát thay đổi ghế, mỗi ghế một phiên bản. Trả về phiên bản mới nhất"""
+        kenh = self._lay_kenh(masuatchieu)
+        with kenh.dieu_kien:
+            for ghe in thay_doi:
+                kenh.phien_ban += 1
+                kenh.su_kien.append((kenh.phien_ban, ghe))
+            if thay_doi:
+                kenh.dieu_kien.notify_all()
+                self._danh_thuc_async(kenh)
+            return kenh.phien_ban
+
+    @staticmethod
+    def _danh_thuc_async(kenh: KenhSuatChieu):
+        """Đánh thức coroutine đang chờ: mỗi event loop một lần call_soon_threadsafe"""
+        if not kenh.cho_async:
+            return
+        theo_loop: Dict[asyncio.AbstractEventLoop, List[asyncio.Future]] = {}
+        for tuong_lai, loop in kenh.cho_async.items():
+            theo_loop.setdefault(loop, []).append(tuong_lai)
+        kenh.cho_async.clear()
+        for loop, danh_sach in theo_loop.items():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(_danh_thuc, danh_sach)
+
+    def phien_ban(self, masuatchieu: int) -> int:
+        """Phiên bản hiện tại của suất chiếu"""
+        return self._lay_kenh(masuatchieu).phien_ban
+
+    def lay_tu(self, masuatchieu: int, phien_ban: int) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """
+        Lấy các thay đổi có phiên bản > phien_ban.
+        Trả về (phiên bản hiện tại, None) nếu sự kiện cần thiết đã bị đẩy khỏi bộ đệm
+        hoặc phien_ban không thuộc tiến trình này - khi đó client cần tải lại toàn bộ.
+        """
+        kenh = self._lay_kenh(masuatchieu)
+        with kenh.dieu_kien:
+            return kenh.phien_ban, self._cat_su_kien(kenh, phien_ban)
+
+    def cho(self, masuatchieu: int, phien_ban: int,
+            timeout: float) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """Chờ tối đa timeout giây cho đến khi có thay đổi sau phien_ban"""
+        kenh = self._lay_kenh(masuatchieu)
+        with kenh.dieu_kien:
+            kenh.dieu_kien.wait_for(lambda: kenh.phien_ban != phien_ban, timeout)
+            return kenh.phien_ban, self._cat_su_kien(kenh, phien_ban)
+
+    async def cho_async(self, masuatchieu: int, phien_ban: int,
+                        timeout: float) -> Tuple[int, Optional[List[Dict[str, Any]]]]:
+        """Như cho() nhưng chờ trên event loop đang chạy thay vì giữ một thread"""
+        kenh = self._lay_kenh(masuatchieu)
+        tuong_lai = None
+        with kenh.dieu_kien:
+            if kenh.phien_ban == phien_ban:
+                loop = asyncio.get_running_loop()
+                tuong_lai = loop.create_future()
+                kenh.cho_async[tuong_lai] = loop
+        if tuong_lai is not None:
+            try:
+                await asyncio.wait_for(tuong_lai, timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                with kenh.dieu_kien:
+                    kenh.cho_async.pop(tuong_lai, None)
+        return self.lay_tu(masuatchieu, phien_ban)
+
+    def token(self, phien_ban: int) -> str:
+        """Phiên bản dạng '<epoch>.<phien_ban>' trả cho client"""
+        return f'{self.epoch}.{phien_ban}'
+
+    def doc_token(self, token: Optional[str]) -> Optional[int]:
+        """Phiên bản trong token, None nếu token hỏng hoặc thuộc lần chạy khác"""
+        epoch, _, phien_ban = (token or '').partition('.')
+        if epoch != self.epoch or not phien_ban.isdigit():
+            return None
+        return int(phien_ban)
+
+    @staticmethod
+    def _cat_su_kien(kenh: KenhSuatChieu, phien_ban: int) -> Optional[List[Dict[str, Any]]]:
+        if phien_ban == kenh.phien_ban:
+            return []
+        if phien_ban > kenh.phien_ban or phien_ban < 0:
+            return None
+        if not kenh.su_kien or kenh.su_kien[0][0] > phien_ban + 1:
+            return None
+        return [ghe for pb, ghe in kenh.su_kien if pb > phien_ban]
+
+
+# Bảng tin dùng chung cho toàn ứng dụng
+bang_tin_ghe = BangTinGhe()
@@ -0,0 +1,509 @@
+"""
+HUY CINEMA - Sơ đồ ghế trong bộ nhớ
+Mỗi suất chiếu có một sơ đồ ghế dạng mảng (trạng thái, người giữ, hạn giữ) làm nguồn
+sự thật cho việc kiểm tra ghế trống/xung đột. Mọi thay đổi được ghi xuống bảng seats
+(write-through) rồi mới cập nhật bộ nhớ và phát lên bảng tin ghế.
+
+Sơ đồ được nạp lười từ SQLite ở lần truy cập đầu tiên (hoặc sau khi khởi động lại).
+Giả định một tiến trình duy nhất ghi vào bảng seats, giống bảng tin ghế.
+
+Lưu ghế thưa (sparse): suất chiếu có showtimes.seat_rows/seats_per_row lấy bố cục từ
+phòng chiếu, bảng seats chỉ có dòng cho ghế đang giữ/đã đặt (khóa showtime_id,
+seat_number). Ghế của các suất chiếu này có mã ảo âm (xem ghe_theo_bo_cuc) nên mọi
+thao tác ghi phân biệt hai kiểu ghế theo dấu của mã ghế.
+"""
+
+import os
+import threading
+import time
+from array import array
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
+
+from hold_expiry import BoHenGioGiaiPhong
+from seat_events import bang_tin_ghe
+
+# Mã trạng thái lưu trong bytearray
+TRANG_THAI = ('available', 'held', 'booked', 'reserved')
+MA_TRANG_THAI = {ten: ma for ma, ten in enumerate(TRANG_THAI)}
+TRONG, GIU, DA_DAT, DAT_TRUOC = range(len(TRANG_THAI))
+
+DINH_DANG_GIO = '%Y-%m-%d %H:%M:%S'
+
+# Mã hóa gọn: một ký tự cho mỗi ghế theo thứ tự của TRANG_THAI
+KY_TU_TRANG_THAI = b'ahbr'
+_BANG_KY_TU = bytes.maketrans(bytes(range(len(TRANG_THAI))), KY_TU_TRANG_THAI)
+
+# Cách lưu ghế của suất chiếu mới: 'sparse' (chỉ lưu ghế đang giữ/đã đặt) hoặc
+# 'dense' (mỗi ghế một dòng seats như trước). Suất chiếu đã tạo giữ nguyên cách lưu.
+CHE_DO_LUU_GHE = os.environ.get('CINEMA_SEAT_STORAGE', 'sparse')
+
+# Bố cục (số hàng, số ghế mỗi hàng) khi phòng chiếu không có trong bảng theaters
+BO_CUC_MAC_DINH = (5, 10)
+
+# Số dòng mỗi câu lệnh khi ghi theo lô
+_KICH_THUOC_LO = 250
+
+
+def _get_db():
+    # Import muộn để tránh vòng import models <-> seat_map
+    from models import get_db
+    return get_db()
+
+
+def _sang_epoch(held_until: Optional[str]) -> float:
+    if not held_until:
+        return 0.0
+    return datetime.strptime(held_until, DINH_DANG_GIO).timestamp()
+
+
+def _sang_chuoi(epoch: float) -> Optional[str]:
+    if not epoch:
+        return None
+    return datetime.fromtimestamp(epoch).strftime(DINH_DANG_GIO)
+
+
+def ghe_theo_bo_cuc(so_hang: int, so_ghe_moi_hang: int) -> List[Tuple[int, str]]:
+    """
+    Các ghế (mã ghế ảo, số ghế) của bố cục, theo thứ tự số ghế như ORDER BY seat_number.
+    Mã ảo = -(hàng * so_ghe_moi_hang + cột + 1): âm nên không trùng seats.id, và không
+    đổi khi dòng của ghế được thêm/xóa khỏi bảng seats.
+    """
+    return sorted(
+        ((-(hang * so_ghe_moi_hang + cot + 1), f'{chr(ord("A") + hang)}{cot + 1}')
+         for hang in range(so_hang) for cot in range(so_ghe_moi_hang)),
+        key=lambda ghe: ghe[1]
+    )
+
+
+def ghi_trang_thai_ghe(conn, masuatchieu: int, maghe: int, soghe: str, trang_thai: str):
+    """Đặt trạng thái một ghế không điều kiện (ghế thưa: trống thì xóa dòng, còn lại upsert)"""
+    if maghe > 0:
+        conn.execute('UPDATE seats SET status = ? WHERE id = ?', (trang_thai, maghe))
+    elif trang_thai == 'available':
+        conn.execute('DELETE FROM seats WHERE showtime_id = ? AND seat_number = ?', (masuatchieu, soghe))
+    else:
+        conn.execute('''
+            INSERT INTO seats (showtime_id, seat_number, status) VALUES (?, ?, ?)
+            ON CONFLICT(showtime_id, seat_number) DO UPDATE SET status = excluded.status
+        ''', (masuatchieu, soghe, trang_thai))
+
+
+def tra_ghe_cua_ve(conn, danh_sach_ve: List[Any]) -> int:
+    """
+    Trả ghế của các vé bị hủy/hết hạn về trống mà không cần sơ đồ ghế trong bộ nhớ.
+    Mỗi vé là dòng có seat_id, showtime_id, seat_number. Trả về số ghế đã trả.
+    """
+    that = [ve['seat_id'] for ve in danh_sach_ve if ve['seat_id'] and ve['seat_id'] > 0]
+    ao = [(ve['showtime_id'], ve['seat_number']) for ve in danh_sach_ve
+          if ve['seat_id'] and ve['seat_id'] < 0]
+    so_ghe = 0
+    for i in range(0, len(that), _KICH_THUOC_LO):
+        lo = that[i:i + _KICH_THUOC_LO]
+        so_ghe += conn.execute(f'''
+            UPDATE seats SET status = 'available' WHERE id IN ({','.join('?' * len(lo))})
+        ''', lo).rowcount
+    for i in range(0, len(ao), _KICH_THUOC_LO):
+        lo = ao[i:i + _KICH_THUOC_LO]
+        so_ghe += conn.execute(f'''
+            DELETE FROM seats WHERE (showtime_id, seat_number) IN (VALUES {','.join(['(?, ?)'] * len(lo))})
+        ''', [v for cap in lo for v in cap]).rowcount
+    return so_ghe
+
+
+class SoDoGhe:
+    """
+    Class SơĐồGhế - Trạng thái ghế của một suất chiếu
+    Attributes:
+        - masuatchieu: int
+        - ma_ghe: array[int] (seats.id theo vị trí)
+        - so_ghe: list[str] (seat_number theo vị trí)
+        - trang_thai: bytearray (mã trong TRANG_THAI)
+        - giu_boi: array[int] (held_by, 0 = không ai giữ)
+        - giu_den: array[float] (held_until dạng epoch, 0 = không giữ)
+    Methods:
+        + CoTheGiu(): Kiểm tra ghế trống hoặc đang được chính user giữ
+        + GiuGhe(): Giữ ghế và ghi xuống DB
+        + BoGiuGhe(): Bỏ giữ ghế và ghi xuống DB
+        + GhiNhan(): Áp dụng thay đổi đã commit bởi nơi khác
+    """
+
+    def __init__(self, masuatchieu: int, rows: List[Dict[str, Any]]):
+        self.masuatchieu = masuatchieu
+        self.khoa = threading.RLock()
+        self._nap(rows)
+
+    def _nap(self, rows: List[Dict[str, Any]]):
+        self.ma_ghe = array('q', (r['id'] for r in rows))
+        self.so_ghe = [r['seat_number'] for r in rows]
+        self.trang_thai = bytearray(MA_TRANG_THAI.get(r['status'], DA_DAT) for r in rows)
+        self.giu_boi = array('q', (r['held_by'] or 0 for r in rows))
+        self.giu_den = array('d', (_sang_epoch(r['held_until']) for r in rows))
+        self.vi_tri = {maghe: i for i, maghe in enumerate(self.ma_ghe)}
+        for i, tt in enumerate(self.trang_thai):
+            if tt == GIU:
+                self._hen_giai_phong(i)
+
+    def _hen_giai_phong(self, i: int):
+        # held_until chỉ chính xác đến giây nên hẹn trễ 1 giây để chắc chắn đã quá hạn
+        bo_hen_gio.hen(self.giu_den[i] + 1, self.masuatchieu, self.ma_ghe[i])
+
+    @staticmethod
+    def doc_db(masuatchieu: int) -> List[Dict[str, Any]]:
+        """
+        Đọc ghế của suất chiếu từ SQLite. Suất chiếu lưu thưa: ghép bố cục với các dòng
+        ghế đang giữ/đã đặt, ghế không có dòng là ghế trống.
+        """
+        conn = _get_db()
+        suat_chieu = conn.execute(
+            'SELECT seat_rows, seats_per_row FROM showtimes WHERE id = ?', (masuatchieu,)
+        ).fetchone()
+        if suat_chieu is None or suat_chieu['seat_rows'] is None:
+            rows = [dict(r) for r in conn.execute('''
+                SELECT id, seat_number, status, held_by, held_until
+                FROM seats WHERE showtime_id = ? ORDER BY seat_number
+            ''', (masuatchieu,))]
+        else:
+            da_luu = {r['seat_number']: r for r in conn.execute(
+                'SELECT seat_number, status, held_by, held_until FROM seats WHERE showtime_id = ?',
+                (masuatchieu,)
+            )}
+            rows = []
+            for maghe, soghe in ghe_theo_bo_cuc(suat_chieu['seat_rows'], suat_chieu['seats_per_row']):
+                dong = da_luu.get(soghe)
+                rows.append({
+                    'id': maghe,
+                    'seat_number': soghe,
+                    'status': dong['status'] if dong else 'available',
+                    'held_by': dong['held_by'] if dong else None,
+                    'held_until': dong['held_until'] if dong else None
+                })
+        conn.close()
+        return rows
+
+    def nap_lai(self):
+        """Đọc lại từ DB khi phát hiện bộ nhớ lệch với bảng seats"""
+        with self.khoa:
+            self._nap(self.doc_db(self.masuatchieu))
+
+    def __len__(self) -> int:
+        return len(self.ma_ghe)
+
+    def __contains__(self, maghe: int) -> bool:
+        return maghe in self.vi_tri
+
+    def so_ghe_cua(self, maghe: int) -> Optional[str]:
+        i = self.vi_tri.get(maghe)
+        return self.so_ghe[i] if i is not None else None
+
+    def ma_ghe_theo_so(self, soghe: str) -> Optional[int]:
+        """Mã ghế (seats.id hoặc mã ảo) theo số ghế"""
+        try:
+            return self.ma_ghe[self.so_ghe.index(soghe)]
+        except ValueError:
+            return None
+
+    def gianh_ghe_db(self, conn, danh_sach_ghe: List[int], trang_thai: str, held_by: Optional[int],
+                     held_until: Optional[str], maKH: int, now: str) -> set:
+        """
+        Trong transaction của conn: chuyển các ghế sang trang_thai nếu ghế còn trống, đang
+        được maKH giữ hoặc đã hết hạn giữ. Trả về tập mã ghế giành được.
+        Ghế thưa chưa có dòng được thêm mới; đã có dòng thì chỉ ghi đè khi thỏa điều kiện.
+        """
+        that = [maghe for maghe in danh_sach_ghe if maghe > 0]
+        ao = [maghe for maghe in danh_sach_ghe if maghe < 0]
+        da_gianh = set()
+        if that:
+            da_gianh.update(r[0] for r in conn.execute(f'''
+                UPDATE seats
+                SET status = ?, held_by = ?, held_until = ?
+                WHERE id IN ({','.join('?' * len(that))}) AND (status = 'available'
+                    OR (status = 'held' AND (held_by = ? OR held_until < ?)))
+                RETURNING id
+            ''', (trang_thai, held_by, held_until, *that, maKH, now)))
+        if ao:
+            theo_so = {self.so_ghe_cua(maghe): maghe for maghe in ao}
+            da_gianh.update(theo_so[r[0]] for r in conn.execute(f'''
+                INSERT INTO seats (showtime_id, seat_number, status, held_by, held_until)
+                VALUES {','.join(['(?, ?, ?, ?, ?)'] * len(ao))}
+                ON CONFLICT(showtime_id, seat_number) DO UPDATE SET
+                    status = excluded.status, held_by = excluded.held_by, held_until = excluded.held_until
+                WHERE seats.status = 'available'
+                    OR (seats.status = 'held' AND (seats.held_by = ? OR seats.held_until < ?))
+                RETURNING seat_number
+            ''', [v for soghe in theo_so for v in (self.masuatchieu, soghe, trang_thai, held_by, held_until)]
+                + [maKH, now]))
+        return da_gianh
+
+    def tra_ghe_db(self, conn, danh_sach_ghe: List[int], dieu_kien: str, tham_so: tuple) -> set:
+        """
+        Trong transaction của conn: trả các ghế thỏa dieu_kien (biểu thức trên cột của seats)
+        về trống - ghế thường đổi dòng về 'available', ghế thưa xóa dòng. Trả về tập mã ghế đã trả.
+        """
+        that = [maghe for maghe in danh_sach_ghe if maghe > 0]
+        ao = [maghe for maghe in danh_sach_ghe if maghe < 0]
+        da_tra = set()
+        if that:
+            da_tra.update(r[0] for r in conn.execute(f'''
+                UPDATE seats
+                SET status = 'available', held_by = NULL, held_until = NULL
+                WHERE id IN ({','.join('?' * len(that))}) AND ({dieu_kien})
+                RETURNING id
+            ''', (*that, *tham_so)))
+        if ao:
+            theo_so = {self.so_ghe_cua(maghe): maghe for maghe in ao}
+            da_tra.update(theo_so[r[0]] for r in conn.execute(f'''
+                DELETE FROM seats
+                WHERE showtime_id = ? AND seat_number IN ({','.join('?' * len(theo_so))}) AND ({dieu_kien})
+                RETURNING seat_number
+            ''', (self.masuatchieu, *theo_so, *tham_so)))
+        return da_tra
+
+    def _co_the_giu(self, i: int, maKH: int, now: float) -> bool:
+        tt = self.trang_thai[i]
+        if tt == TRONG:
+            return True
+        if tt == GIU:
+            # Ghế hết hạn giữ coi như trống dù chưa được giải phóng
+            return self.giu_boi[i] == maKH or self.giu_den[i] < now
+        return False
+
+    def co_the_giu(self, maghe: int, maKH: int) -> bool:
+        """Ghế còn trống hoặc đang được chính khách hàng này giữ"""
+        i = self.vi_tri.get(maghe)
+        return i is not None and self._co_the_giu(i, maKH, time.time())
+
+    def loc_ghe_co_the_giu(self, danh_sach_ghe: List[int], maKH: int) -> List[int]:
+        """Lọc các ghế khách hàng có thể giữ/đặt, giữ nguyên thứ tự và bỏ trùng"""
+        now = time.time()
+        ket_qua = []
+        for maghe in dict.fromkeys(danh_sach_ghe):
+            i = self.vi_tri.get(maghe)
+            if i is not None and self._co_the_giu(i, maKH, now):
+                ket_qua.append(maghe)
+        return ket_qua
+
+    def _dong(self, i: int) -> Dict[str, Any]:
+        tt = self.trang_thai[i]
+        return {
+            'id': self.ma_ghe[i],
+            'seat_number': self.so_ghe[i],
+            'status': TRANG_THAI[tt],
+            'held_by': self.giu_boi[i] or None,
+            'held_until': _sang_chuoi(self.giu_den[i]) if tt == GIU else None
+        }
+
+    def danh_sach(self) -> List[Dict[str, Any]]:
+        """Toàn bộ ghế dạng dòng DB (id, seat_number, status, held_by, held_until)"""
+        with self.khoa:
+            return [self._dong(i) for i in range(len(self.ma_ghe))]
+
+    def bo_cuc(self) -> Dict[str, List[Any]]:
+        """Bố cục ghế (không đổi trong suốt suất chiếu): id và số ghế theo vị trí"""
+        return {'ids': self.ma_ghe.tolist(), 'seat_numbers': list(self.so_ghe)}
+
+    def ma_hoa_gon(self, maKH: int) -> Tuple[str, bytes]:
+        """
+        Trạng thái toàn bộ ghế theo thứ tự bố cục: chuỗi một ký tự mỗi ghế (KY_TU_TRANG_THAI)
+        và bitmask các ghế khách hàng đang giữ (bit i = byte i // 8, bit 7 - i % 8)
+        """
+        with self.khoa:
+            trang_thai = self.trang_thai.translate(_BANG_KY_TU).decode('ascii')
+            cua_toi = bytearray((len(self.trang_thai) + 7) // 8)
+            i = self.trang_thai.find(GIU)
+            while i != -1:
+                if self.giu_boi[i] == maKH:
+                    cua_toi[i >> 3] |= 0x80 >> (i & 7)
+                i = self.trang_thai.find(GIU, i + 1)
+        return trang_thai, bytes(cua_toi)
+
+    def _ghi(self, thay_doi: Dict[str, Any]) -> bool:
+        i = self.vi_tri.get(thay_doi['id'])
+        if i is None:
+            return False
+        self.trang_thai[i] = MA_TRANG_THAI.get(thay_doi['status'], DA_DAT)
+        self.giu_boi[i] = thay_doi.get('held_by') or 0
+        self.giu_den[i] = _sang_epoch(thay_doi.get('held_until'))
+        if self.trang_thai[i] == GIU:
+            self._hen_giai_phong(i)
+        return True
+
+    def ghi_nhan(self, thay_doi: List[Dict[str, Any]]):
+        """Áp dụng các thay đổi đã được commit xuống DB và phát lên bảng tin"""
+        with self.khoa:
+            for ghe in thay_doi:
+                self._ghi(ghe)
+            bang_tin_ghe.phat(self.masuatchieu, thay_doi)
+
+    def giai_phong_het_han(self, danh_sach_ghe: List[int]):
+        """Giải phóng các ghế đã quá hạn giữ, bỏ qua ghế đã được giữ lại/đặt sau đó"""
+        with self.khoa:
+            now = time.time()
+            het_han = []
+            for maghe in danh_sach_ghe:
+                i = self.vi_tri.get(maghe)
+                if i is not None and self.trang_thai[i] == GIU and self.giu_den[i] < now:
+                    het_han.append(maghe)
+            if not het_han:
+                return
+
+            conn = _get_db()
+            try:
+                da_tra = self.tra_ghe_db(conn, het_han, "status = 'held' AND held_until < ?", (_sang_chuoi(now),))
+                conn.commit()
+            finally:
+                conn.close()
+
+            self.ghi_nhan([{
+                'id': maghe,
+                'seat_number': self.so_ghe_cua(maghe),
+                'status': 'available',
+                'held_by': None,
+                'held_until': None
+            } for maghe in het_han if maghe in da_tra])
+            if len(da_tra) < len(het_han):
+                self.nap_lai()
+
+    def giu_ghe(self, maghe: int, maKH: int, thoi_han: int = 300) -> Optional[str]:
+        """Giữ ghế trong thoi_han giây. Trả về held_until, hoặc None nếu ghế không còn trống"""
+        held_until, ket_qua = self.giu_nhieu_ghe([maghe], maKH, thoi_han)
+        return held_until if ket_qua.get(maghe) == 'held' else None
+
+    def giu_nhieu_ghe(self, danh_sach_ghe: List[int], maKH: int, thoi_han: int = 300,
+                      tat_ca: bool = False) -> Tuple[Optional[str], Dict[int, str]]:
+        """
+        Giữ nhiều ghế trong một transaction, cùng một held_until.
+        tat_ca=True: giữ được tất cả hoặc không giữ ghế nào; False: giữ được ghế nào hay ghế đó.
+        Trả về (held_until hoặc None nếu không giữ được ghế nào, {maghe: 'held' | 'unavailable'}).
+        """
+        with self.khoa:
+            now = time.time()
+            ket_qua = {}
+            hop_le = []
+            for maghe in dict.fromkeys(danh_sach_ghe):
+                i = self.vi_tri.get(maghe)
+                if i is not None and self._co_the_giu(i, maKH, now):
+                    hop_le.append(maghe)
+                else:
+                    ket_qua[maghe] = 'unavailable'
+
+            if not hop_le or (tat_ca and ket_qua):
+                ket_qua.update((maghe, 'unavailable') for maghe in hop_le)
+                return None, ket_qua
+
+            held_until = _sang_chuoi(now + thoi_han)
+            conn = _get_db()
+            conn.isolation_level = 'IMMEDIATE'
+            try:
+                da_giu = self.gianh_ghe_db(conn, hop_le, 'held', maKH, held_until, maKH, _sang_chuoi(now))
+                if tat_ca and len(da_giu) < len(hop_le):
+                    conn.rollback()
+                    da_giu = set()
+                else:
+                    conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.close()
+
+            if len(da_giu) < len(hop_le):
+                # DB không khớp với bộ nhớ: đọc lại để lần sau trả lời đúng
+                self.nap_lai()
+
+            for maghe in hop_le:
+                ket_qua[maghe] = 'held' if maghe in da_giu else 'unavailable'
+            if not da_giu:
+                return None, ket_qua
+
+            self.ghi_nhan([{
+                'id': maghe,
+                'seat_number': self.so_ghe_cua(maghe),
+                'status': 'held',
+                'held_by': maKH,
+                'held_until': held_until
+            } for maghe in hop_le if maghe in da_giu])
+            return held_until, ket_qua
+
+    def bo_giu_ghe(self, maghe: int, maKH: int) -> bool:
+        """Bỏ giữ ghế do chính khách hàng đang giữ"""
+        with self.khoa:
+            i = self.vi_tri.get(maghe)
+            if i is None or self.trang_thai[i] != GIU or self.giu_boi[i] != maKH:
+                return False
+
+            conn = _get_db()
+            try:
+                self.tra_ghe_db(conn, [maghe], 'held_by = ?', (maKH,))
+                conn.commit()
+            finally:
+                conn.close()
+
+            self.ghi_nhan([{
+                'id': maghe,
+                'seat_number': self.so_ghe[i],
+                'status': 'available',
+                'held_by': None,
+                'held_until': None
+            }])
+            return True
+
+
+class KhoSoDoGhe:
+    """
+    Class KhoSơĐồGhế - Quản lý sơ đồ ghế theo masuatchieu, nạp lười từ SQLite
+    """
+
+    def __init__(self):
+        self._so_do: Dict[int, SoDoGhe] = {}
+        self._khoa = threading.Lock()
+
+    def lay(self, masuatchieu: int) -> Optional[SoDoGhe]:
+        """Lấy sơ đồ ghế, nạp từ DB ở lần đầu. None nếu suất chiếu không có ghế"""
+        so_do = self._so_do.get(masuatchieu)
+        if so_do is None:
+            with self._khoa:
+                so_do = self._so_do.get(masuatchieu)
+                if so_do is None:
+                    rows = SoDoGhe.doc_db(masuatchieu)
+                    if not rows:
+                        return None
+                    so_do = SoDoGhe(masuatchieu, rows)
+                    self._so_do[masuatchieu] = so_do
+        return so_do
+
+    def _da_nap(self, masuatchieu: int) -> Optional[SoDoGhe]:
+        # Chờ nếu sơ đồ đang được nạp để thay đổi vừa commit không bị bỏ sót
+        with self._khoa:
+            return self._so_do.get(masuatchieu)
+
+    def ghi_nhan(self, masuatchieu: int, thay_doi: List[Dict[str, Any]]):
+        """Báo thay đổi đã commit; chỉ cập nhật bộ nhớ nếu sơ đồ đang được nạp"""
+        so_do = self._da_nap(masuatchieu)
+        if so_do is not None:
+            so_do.ghi_nhan(thay_doi)
+        else:
+            bang_tin_ghe.phat(masuatchieu, thay_doi)
+
+    def giai_phong_het_han(self, masuatchieu: int, danh_sach_ghe: List[int]):
+        """Được bộ hẹn giờ gọi khi các ghế đến hạn giữ; bỏ qua sơ đồ đã bị gỡ khỏi bộ nhớ"""
+        so_do = self._da_nap(masuatchieu)
+        if so_do is not None:
+            so_do.giai_phong_het_han(danh_sach_ghe)
+
+    def xoa(self, masuatchieu: int):
+        """Bỏ sơ đồ khỏi bộ nhớ (suất chiếu bị xóa hoặc ghế bị sửa hàng loạt)"""
+        with self._khoa:
+            self._so_do.pop(masuatchieu, None)
+
+    def xoa_tat_ca(self):
+        """Bỏ mọi sơ đồ khỏi bộ nhớ (đổi sang database khác)"""
+        with self._khoa:
+            self._so_do.clear()
+
+
+# Kho sơ đồ ghế dùng chung cho toàn ứng dụng
+so_do_ghe = KhoSoDoGhe()
+
+# Thread nền giải phóng ghế hết hạn giữ
+bo_hen_gio = BoHenGioGiaiPhong(so_do_ghe.giai_phong_het_han)
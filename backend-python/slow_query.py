@@ -0,0 +1,276 @@
+"""
+HUY CINEMA - Nhật ký truy vấn chậm (slow-query log)
+Kết nối mượn từ db.get_db() đo thời gian mọi câu lệnh (thực thi + đọc kết quả). Câu lệnh
+vượt ngưỡng CINEMA_SLOW_QUERY_MS được ghi thành một dòng JSON vào file xoay vòng
+(mặc định logs/slow_queries.log): SQL, tham số, route, hàm gọi (vd.
+'models.Admin.lay_trang_dat_ve') và kết quả EXPLAIN QUERY PLAN chạy ngay trên kết nối
+đó - để thấy câu lệnh nào chậm dần theo dữ liệu và vì sao (SCAN thay vì SEARCH ...).
+
+Giới hạn tần suất: mỗi câu lệnh (SQL đã chuẩn hóa) được ghi tối đa một lần mỗi
+CINEMA_SLOW_QUERY_INTERVAL giây, số lần bị bỏ qua được cộng vào dòng ghi kế tiếp; cả
+file nhận tối đa GHI_TOI_DA_MOI_GIAY dòng mỗi giây.
+
+Tóm tắt các câu lệnh tốn thời gian nhất:
+    python slow_query.py [--top 10] [--log logs/slow_queries.log]
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Ngưỡng (ms) tính thời gian thực thi + đọc kết quả; <= 0 là tắt
+NGUONG_MS = float(os.environ.get('CINEMA_SLOW_QUERY_MS', 100))
+BAT = NGUONG_MS > 0
+
+FILE_LOG = os.environ.get('CINEMA_SLOW_QUERY_LOG',
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), 'logs', 'slow_queries.log'))
+
+# Mỗi câu lệnh ghi tối đa một lần trong khoảng này (giây)
+KHOANG_GHI = float(os.environ.get('CINEMA_SLOW_QUERY_INTERVAL', 60))
+
+# Số dòng tối đa mỗi giây cho cả file
+GHI_TOI_DA_MOI_GIAY = 5
+
+# Xoay vòng file: kích thước mỗi file và số file cũ giữ lại
+KICH_THUOC_FILE = 5 * 1024 * 1024
+SO_FILE_CU = 5
+
+# Giới hạn độ dài ghi ra cho SQL và từng tham số
+DO_DAI_SQL_TOI_DA = 4000
+DO_DAI_THAM_SO_TOI_DA = 100
+
+# Chỉ các câu lệnh này mới chạy EXPLAIN QUERY PLAN (không BEGIN/COMMIT/PRAGMA/DDL)
+_CO_KE_HOACH = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE|WITH)\b', re.IGNORECASE)
+
+_CHUOI = re.compile(r"'(?:[^']|'')*'")
+_SO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_DANH_SACH = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_KHOANG_TRANG = re.compile(r'\s+')
+
+
+def chuan_hoa(sql: str) -> str:
+    """SQL bỏ giá trị cụ thể và khoảng trắng thừa: các lần chạy cùng câu lệnh gộp làm một"""
+    sql = _CHUOI.sub('?', sql)
+    sql = _SO.sub('?', sql)
+    sql = _DANH_SACH.sub('(?...)', sql)
+    return _KHOANG_TRANG.sub(' ', sql).strip()
+
+
+def dau_van_tay(sql: str) -> str:
+    return hashlib.sha1(chuan_hoa(sql).encode()).hexdigest()[:12]
+
+
+class GioiHanTanSuat:
+    """
+    Class GiớiHạnTầnSuất - Quyết định có ghi một lần chạy chậm hay không
+    Methods:
+        + ChoPhep(): (có ghi không, số lần đã bỏ qua của câu lệnh kể từ lần ghi trước)
+    """
+
+    def __init__(self, khoang: float = KHOANG_GHI, toi_da_moi_giay: int = GHI_TOI_DA_MOI_GIAY):
+        self.khoang = khoang
+        self.toi_da_moi_giay = toi_da_moi_giay
+        self._lan_ghi: Dict[str, float] = {}
+        self._bo_qua: Dict[str, int] = {}
+        self._giay_hien_tai = 0
+        self._so_dong_trong_giay = 0
+        self._khoa = threading.Lock()
+
+    def cho_phep(self, van_tay: str) -> Tuple[bool, int]:
+        bay_gio = time.monotonic()
+        with self._khoa:
+            giay = int(bay_gio)
+            if giay != self._giay_hien_tai:
+                self._giay_hien_tai, self._so_dong_trong_giay = giay, 0
+            lan_truoc = self._lan_ghi.get(van_tay)
+            if ((lan_truoc is not None and bay_gio - lan_truoc < self.khoang)
+                    or self._so_dong_trong_giay >= self.toi_da_moi_giay):
+                self._bo_qua[van_tay] = self._bo_qua.get(van_tay, 0) + 1
+                return False, 0
+            self._lan_ghi[van_tay] = bay_gio
+            self._so_dong_trong_giay += 1
+            return True, self._bo_qua.pop(van_tay, 0)
+
+
+_gioi_han = GioiHanTanSuat()
+_logger: Optional[logging.Logger] = None
+_khoa_logger = threading.Lock()
+
+
+def _lay_logger() -> logging.Logger:
+    """Logger ghi file xoay vòng, chỉ tạo (cùng thư mục logs) khi có câu lệnh chậm đầu tiên"""
+    global _logger
+    with _khoa_logger:
+        if _logger is None:
+            os.makedirs(os.path.dirname(FILE_LOG) or '.', exist_ok=True)
+            handler = RotatingFileHandler(FILE_LOG, maxBytes=KICH_THUOC_FILE, backupCount=SO_FILE_CU,
+                                          encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger = logging.getLogger('cinema.slow_query')
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            logger.addHandler(handler)
+            _logger = logger
+    return _logger
+
+
+def _gia_tri_tham_so(gia_tri: Any) -> Any:
+    if isinstance(gia_tri, (bytes, memoryview)):
+        return f'<{len(gia_tri)} bytes>'
+    if isinstance(gia_tri, str) and len(gia_tri) > DO_DAI_THAM_SO_TOI_DA:
+        return gia_tri[:DO_DAI_THAM_SO_TOI_DA] + '…'
+    return gia_tri
+
+
+def _tham_so_ghi_log(sql: str, tham_so: Any) -> Any:
+    """Tham số để ghi log; câu lệnh đụng tới mật khẩu không ghi giá trị"""
+    if tham_so is None:
+        return None
+    if 'password' in sql.lower():
+        return '***'
+    if isinstance(tham_so, dict):
+        return {k: _gia_tri_tham_so(v) for k, v in tham_so.items()}
+    return [_gia_tri_tham_so(v) for v in list(tham_so)[:50]]
+
+
+def ke_hoach(conn: sqlite3.Connection, sql: str, tham_so: Any = None) -> Optional[List[str]]:
+    """EXPLAIN QUERY PLAN của câu lệnh, mỗi bước một dòng, thụt lề theo cây"""
+    if not _CO_KE_HOACH.match(sql):
+        return None
+    if tham_so is None:
+        # Không còn tham số (executemany với generator): gán NULL, kế hoạch vẫn như nhau
+        tham_so = [None] * _CHUOI.sub('', sql).count('?')
+    try:
+        dong = conn.execute('EXPLAIN QUERY PLAN ' + sql, tham_so).fetchall()
+    except sqlite3.Error as e:
+        return [f'(không lấy được kế hoạch: {e})']
+    do_sau = {0: -1}
+    ket_qua = []
+    for ma, cha, _, chi_tiet in dong:
+        do_sau[ma] = do_sau.get(cha, -1) + 1
+        ket_qua.append('  ' * do_sau[ma] + chi_tiet)
+    return ket_qua
+
+
+def ghi(conn: sqlite3.Connection, loai: str, lenh: Sequence[Any], giay: float, route: str, ham_goi: str,
+        loi: Optional[Exception] = None):
+    """
+    Ghi một lần chạy vượt ngưỡng (code gọi đã so với NGUONG_MS). loai là tên hàm của
+    sqlite3.Connection ('execute', 'executemany', 'executescript', 'commit'), lenh là
+    các đối số đã truyền cho nó.
+    """
+    sql = lenh[0] if lenh else loai.upper()
+    tham_so = lenh[1] if len(lenh) > 1 else None
+    if loai == 'executemany' and tham_so is not None:
+        # Chỉ lấy bộ tham số đầu tiên (nếu là generator thì đã bị dùng hết)
+        tham_so = next(iter(tham_so), None) if isinstance(tham_so, (list, tuple)) else None
+
+    van_tay = dau_van_tay(sql)
+    co_ghi, so_bo_qua = _gioi_han.cho_phep(van_tay)
+    if not co_ghi:
+        return
+
+    dong = {
+        'ts': datetime.now().isoformat(timespec='milliseconds'),
+        'ms': round(giay * 1000, 2),
+        'threshold_ms': NGUONG_MS,
+        'route': route,
+        'caller': ham_goi,
+        'fingerprint': van_tay,
+        'sql': sql if len(sql) <= DO_DAI_SQL_TOI_DA else sql[:DO_DAI_SQL_TOI_DA] + '…',
+        'params': _tham_so_ghi_log(sql, tham_so),
+        'kind': loai,
+        'suppressed': so_bo_qua,
+        'plan': ke_hoach(conn, sql, tham_so) if loai != 'executescript' else None,
+    }
+    if loi is not None:
+        dong['error'] = str(loi)
+    _lay_logger().info(json.dumps(dong, ensure_ascii=False, default=str))
+
+
+# ===== TÓM TẮT =====
+def doc_log(duong_dan: str = None) -> List[Dict[str, Any]]:
+    """Các dòng của file log và các file đã xoay vòng (cũ trước, mới sau)"""
+    duong_dan = duong_dan or FILE_LOG
+    cac_file = [f'{duong_dan}.{i}' for i in range(SO_FILE_CU, 0, -1)] + [duong_dan]
+    ket_qua = []
+    for ten_file in cac_file:
+        if not os.path.exists(ten_file):
+            continue
+        with open(ten_file, encoding='utf-8') as f:
+            for dong in f:
+                try:
+                    ket_qua.append(json.loads(dong))
+                except ValueError:
+                    continue
+    return ket_qua
+
+
+def tom_tat(cac_dong: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Gộp theo câu lệnh. Lần bị bỏ qua vì giới hạn tần suất không có thời gian riêng, nên
+    tổng thời gian ước tính = trung bình các lần đã ghi × tổng số lần
+    """
+    nhom: Dict[str, Dict[str, Any]] = {}
+    for dong in cac_dong:
+        muc = nhom.setdefault(dong['fingerprint'], {
+            'fingerprint': dong['fingerprint'], 'sql': chuan_hoa(dong['sql']),
+            'logged': 0, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+            'routes': set(), 'callers': set(), 'plan': None, 'last_seen': None,
+        })
+        muc['logged'] += 1
+        muc['count'] += 1 + dong.get('suppressed', 0)
+        muc['total_ms'] += dong['ms']
+        muc['max_ms'] = max(muc['max_ms'], dong['ms'])
+        muc['routes'].add(dong['route'])
+        muc['callers'].add(dong['caller'])
+        muc['plan'] = dong.get('plan') or muc['plan']
+        muc['last_seen'] = dong['ts']
+
+    for muc in nhom.values():
+        muc['avg_ms'] = muc['total_ms'] / muc['logged']
+        muc['est_total_ms'] = muc['avg_ms'] * muc['count']
+        # SCAN không dùng index (SCAN ... USING INDEX là duyệt theo thứ tự index)
+        muc['full_scan'] = any(b.strip().startswith('SCAN') and 'USING' not in b and 'CONSTANT ROW' not in b
+                               for b in muc['plan'] or [])
+    return sorted(nhom.values(), key=lambda muc: -muc['est_total_ms'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tóm tắt các câu lệnh SQL chậm nhất từ slow-query log')
+    parser.add_argument('--log', default=FILE_LOG)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    cac_dong = doc_log(args.log)
+    if not cac_dong:
+        print(f'Không có câu lệnh chậm nào trong {args.log}')
+        return
+
+    nhom = tom_tat(cac_dong)
+    print(f'{len(cac_dong)} dòng log, {len(nhom)} câu lệnh khác nhau (ngưỡng {cac_dong[-1]["threshold_ms"]} ms)\n')
+    for thu_tu, muc in enumerate(nhom[:args.top], 1):
+        print(f"#{thu_tu} [{muc['fingerprint']}] ~{muc['est_total_ms']:.1f} ms tổng | "
+              f"{muc['count']} lần | tb {muc['avg_ms']:.1f} ms | max {muc['max_ms']:.1f} ms"
+              f"{' | SCAN toàn bảng' if muc['full_scan'] else ''}")
+        print(f"   route: {', '.join(sorted(muc['routes']))}")
+        print(f"   hàm gọi: {', '.join(sorted(muc['callers']))}")
+        sql = muc['sql']
+        print(f"   sql: {sql if len(sql) <= 300 else sql[:300] + '…'}")
+        for buoc in muc['plan'] or []:
+            print(f'      {buoc}')
+        print()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
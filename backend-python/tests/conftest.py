@@ -0,0 +1,46 @@
+"""
+HUY CINEMA - Cấu hình pytest: import được app/models và database tạm cho từng test
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+def _xoa_trang_thai_bo_nho():
+    """Trạng thái trong bộ nhớ gắn với database đang dùng: cache, sơ đồ ghế, bảng tin, phòng chờ, khóa chống lặp"""
+    import app
+    import cache
+    from idempotency import kho_chong_lap
+    from seat_events import bang_tin_ghe
+    from seat_map import so_do_ghe
+    from waiting_room import phong_cho
+
+    for bo_nho in (cache.danh_muc, cache.nguoi_dung, cache.trang, so_do_ghe, bang_tin_ghe, phong_cho,
+                   kho_chong_lap):
+        bo_nho.xoa_tat_ca()
+    app._lan_chay_huy_ve = None
+
+
+@pytest.fixture
+def db_tam(tmp_path):
+    """Trỏ ứng dụng tới một database tạm đã có dữ liệu mẫu, trả về đường dẫn"""
+    import app
+
+    duong_dan_cu = db.DB_PATH
+    duong_dan = str(tmp_path / 'database.db')
+    db.cau_hinh(duong_dan)
+    app.DB_PATH = duong_dan
+    _xoa_trang_thai_bo_nho()
+    app.init_db()
+    try:
+        yield duong_dan
+    finally:
+        db.cau_hinh(duong_dan_cu)
+        app.DB_PATH = duong_dan_cu
+        _xoa_trang_thai_bo_nho()
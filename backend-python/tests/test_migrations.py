@@ -0,0 +1,23 @@
+"""
+Chạy toàn bộ migration trên database trống (v0 -> mới nhất) và kiểm tra các truy vấn
+nóng dùng index, không quét cả bảng
+"""
+
+import sqlite3
+
+import migrations
+
+
+def test_truy_van_nong_dung_index(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'database.db'))
+    try:
+        assert migrations.phien_ban_hien_tai(conn) == 0
+        assert migrations.nang_cap(conn) == [so for so, _, _ in migrations.MIGRATIONS]
+        assert migrations.phien_ban_hien_tai(conn) == migrations.PHIEN_BAN_MOI_NHAT
+
+        quet_bang = {ten: ke_hoach for ten, ke_hoach, quet in migrations.ke_hoach_truy_van_nong(conn) if quet}
+        assert quet_bang == {}
+        # Chạy lại không còn migration nào
+        assert migrations.nang_cap(conn) == []
+    finally:
+        conn.close()
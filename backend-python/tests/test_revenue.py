@@ -0,0 +1,108 @@
+"""
+Bảng tổng hợp revenue_daily phải khớp với phép gộp trực tiếp từ bookings sau khi đặt,
+hủy, thanh toán, hết hạn vé (cập nhật dần) và sau khi dựng lại (backfill)
+"""
+
+from datetime import datetime, timedelta
+
+import models
+import revenue
+from seat_map import so_do_ghe
+
+
+def top_phim_goc(conn, gioi_han=1000):
+    """Câu truy vấn gộp toàn bảng bookings trước đây của Admin.lay_top_phim_doanh_thu"""
+    return {r['id']: (r['so_ve_ban'], r['doanh_thu']) for r in conn.execute('''
+        SELECT m.id, COUNT(b.id) as so_ve_ban, COALESCE(SUM(b.price), 0) as doanh_thu
+        FROM movies_info m
+        LEFT JOIN showtimes s ON m.id = s.movie_id
+        LEFT JOIN bookings b ON s.id = b.showtime_id AND b.status = 'confirmed'
+        GROUP BY m.id
+        LIMIT ?
+    ''', (gioi_han,))}
+
+
+def kiem_tra_khop():
+    conn = models.get_db()
+    try:
+        assert revenue.doi_soat(conn) == []
+        tong_hop = {(r['movie_id'], r['show_date']): (r['tickets_sold'], r['revenue'], r['cancellations'])
+                    for r in conn.execute('SELECT * FROM revenue_daily')
+                    if r['tickets_sold'] or r['revenue'] or r['cancellations']}
+        goc = {(r['movie_id'], r['show_date']): (r['tickets_sold'], r['revenue'], r['cancellations'])
+               for r in conn.execute(revenue.CAU_LENH_TONG_HOP)
+               if r['tickets_sold'] or r['cancellations']}
+        assert tong_hop == goc
+        top = models.Admin('admin', '').lay_top_phim_doanh_thu(1000)
+        assert {p['id']: (p['so_ve_ban'], p['doanh_thu']) for p in top} == top_phim_goc(conn)
+    finally:
+        conn.close()
+
+
+def tao_suat_chieu(maphim, so_ngay, giave):
+    ngay = (datetime.now() + timedelta(days=so_ngay)).strftime('%Y-%m-%d')
+    return models.SuatChieu(maphim=maphim, maphong='Rạp 1', ngaychieu=ngay, giochieu='20:00',
+                            giave=giave).them_suat_chieu()
+
+
+def dat(khach_hang, masuatchieu, so_ghe):
+    trong = [g['id'] for g in so_do_ghe.lay(masuatchieu).danh_sach() if g['status'] == 'available']
+    ve = khach_hang.dat_ve(masuatchieu, trong[:so_ghe])
+    assert len(ve) == so_ghe
+    return ve
+
+
+def test_tong_hop_khop_voi_bookings(db_tam):
+    import app
+
+    # Lịch sử chèn thẳng vào bookings (bỏ qua model) rồi dựng lại bảng tổng hợp
+    cu = [tao_suat_chieu(maphim, 2, 80000) for maphim in (1, 2)]
+    conn = models.get_db()
+    conn.executemany(
+        'INSERT INTO bookings (user_id, showtime_id, seat_number, price, status) VALUES (?, ?, ?, ?, ?)',
+        [(2, cu[i % 2], f'Z{i}', 80000 + 5000 * (i % 3), ('confirmed', 'cancelled', 'expired', 'paid')[i % 4])
+         for i in range(40)]
+    )
+    revenue.xay_lai(conn)
+    conn.commit()
+    conn.close()
+    kiem_tra_khop()
+
+    # Cập nhật dần qua model: đặt, hủy, thanh toán
+    khach_hang = [models.KhachHang.dang_ky(f'khach{i}', 'pw') for i in range(3)]
+    suat_chieu = [tao_suat_chieu(1, 1, 75000), tao_suat_chieu(2, 1, 95000), tao_suat_chieu(3, 3, 85000)]
+    ve = []
+    for i, ma in enumerate(suat_chieu):
+        ve += dat(khach_hang[i], ma, 4)
+        ve += dat(khach_hang[(i + 1) % 3], ma, 2)
+    ve[0].huy_don_dat_ve()
+    ve[5].huy_don_dat_ve()
+    ve[5].huy_don_dat_ve()      # hủy lần hai không được trừ thêm
+    ve[7].xac_nhan_thanh_toan()
+    ve[8].xac_nhan_thanh_toan()
+    ve[8].huy_don_dat_ve()
+    kiem_tra_khop()
+
+    # Hết hạn: đưa một suất chiếu về trước mốc của lần hủy vé trước (dời phần tổng hợp sang
+    # ngày mới, lùi mốc) rồi hủy vé quá giờ
+    app.huy_ve_qua_gio()
+    sc = models.SuatChieu.tim_theo_id(suat_chieu[0])
+    sc.ngaychieu = '2000-01-01'
+    sc.cap_nhat_suat_chieu()
+    app._lan_chay_huy_ve = None
+    assert app.huy_ve_qua_gio()['ve'] == 4
+    kiem_tra_khop()
+
+    # Dựng lại từ đầu cho cùng kết quả với bảng đã cập nhật dần
+    cau_lenh = '''
+        SELECT movie_id, show_date, tickets_sold, ROUND(revenue, 6), cancellations FROM revenue_daily
+        WHERE tickets_sold OR cancellations ORDER BY movie_id, show_date
+    '''
+    conn = models.get_db()
+    truoc = [tuple(r) for r in conn.execute(cau_lenh)]
+    revenue.xay_lai(conn)
+    conn.commit()
+    sau = [tuple(r) for r in conn.execute(cau_lenh)]
+    conn.close()
+    assert truoc == sau
+    kiem_tra_khop()
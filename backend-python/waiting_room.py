@@ -0,0 +1,225 @@
+"""
+HUY CINEMA - Phòng chờ ảo cho các suất chiếu đông người
+Khi một suất chiếu hot mở bán, mọi người cùng vào /booking/<id> rồi tranh nhau giữ ghế:
+các transaction IMMEDIATE xếp hàng chờ khóa ghi. Phòng chờ giới hạn số người đang chọn
+ghế của mỗi suất chiếu (CINEMA_WAITING_ROOM_SLOTS); người đến sau xếp hàng FIFO và hỏi
+vị trí + thời gian chờ ước tính qua /api/waiting-room/<id> - chỉ đọc bộ nhớ, không
+chạm database.
+
+Lượt được trả lại khi người mua đặt vé xong, rời trang đặt vé hoặc không thao tác trong
+THOI_GIAN_KHONG_THAO_TAC giây. Mở trang đặt vé, giữ ghế, đặt vé cũng như luồng SSE và poll
+/api/get-seats của trang đặt vé đang mở đều tính là thao tác (GiaHan), nên người đang xem
+sơ đồ ghế không bị mất lượt. Người đầu hàng được vào và có THOI_GIAN_NHAN_LUOT giây để mở
+trang đặt vé. Người trong hàng không hỏi lại trong BO_HANG_SAU giây coi như đã rời đi. Khi
+còn chỗ và không ai xếp hàng, người đến được vào ngay: suất chiếu bình thường không thấy
+phòng chờ.
+
+Mặc định tắt (CINEMA_WAITING_ROOM_SLOTS=0); bật cho các đợt mở bán đông người.
+
+Trạng thái nằm trong bộ nhớ của tiến trình, như sơ đồ ghế (seat_map).
+"""
+
+import heapq
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import metrics
+
+# Số người chọn ghế cùng lúc mỗi suất chiếu; 0 = tắt phòng chờ (mặc định)
+SO_LUOT = int(os.environ.get('CINEMA_WAITING_ROOM_SLOTS', 0))
+
+# Không thao tác quá lâu thì mất lượt (giây), bằng thời hạn giữ ghế
+THOI_GIAN_KHONG_THAO_TAC = float(os.environ.get('CINEMA_WAITING_ROOM_IDLE', 5 * 60))
+
+# Thời gian người vừa được gọi phải mở trang đặt vé (giây)
+THOI_GIAN_NHAN_LUOT = 60
+
+# Người trong hàng không hỏi lại quá lâu coi như đã rời (trang chờ hỏi mỗi KHOANG_HOI giây)
+BO_HANG_SAU = 60
+KHOANG_HOI = 5
+
+# Thời gian một lượt chọn ghế ước tính ban đầu (giây), cập nhật theo các lượt thực tế
+THOI_GIAN_MUA_UOC_TINH = 120
+
+
+class PhongCho:
+    """
+    Class PhòngChờ - Lượt chọn ghế và hàng đợi của một suất chiếu
+    (không tự khóa: PhongChoSuatChieu gọi các hàm dưới khóa của nó)
+    Attributes:
+        - so_luot: int (số người được chọn ghế cùng lúc)
+    Methods:
+        + Vao(): Vào chọn ghế, hoặc xếp hàng/hỏi vị trí nếu đã hết lượt
+        + GiaHan(): Gia hạn lượt đang có (trang đặt vé vẫn mở), không cấp lượt mới
+        + Roi(): Trả lượt hoặc rời hàng (đặt vé xong, rời trang)
+        + Rong(): Không còn ai (để bỏ khỏi bộ nhớ)
+    """
+
+    def __init__(self, so_luot: int):
+        self.so_luot = so_luot
+        self._dang_mua: Dict[int, Tuple[float, float]] = {}     # user_id -> (hạn, lúc vào)
+        self._han: List[Tuple[float, int]] = []                  # min-heap (hạn, user_id), bỏ qua mục cũ
+        self._hang_cho: 'OrderedDict[int, List[float]]' = OrderedDict()  # user_id -> [số thứ tự, lần hỏi cuối]
+        self._so_tiep_theo = 1
+        self._so_da_goi = 0
+        self._thoi_gian_mua_tb = THOI_GIAN_MUA_UOC_TINH
+
+    def _cap_luot(self, user_id: int, han: float, luc_vao: float):
+        self._dang_mua[user_id] = (han, luc_vao)
+        heapq.heappush(self._han, (han, user_id))
+
+    def _thu_hoi(self, user_id: int, bay_gio: float):
+        _, luc_vao = self._dang_mua.pop(user_id)
+        # Trung bình trượt thời gian giữ lượt, dùng ước tính thời gian chờ
+        self._thoi_gian_mua_tb = 0.8 * self._thoi_gian_mua_tb + 0.2 * (bay_gio - luc_vao)
+
+    def _don_dep(self, bay_gio: float):
+        """Thu hồi lượt quá hạn rồi gọi người đầu hàng vào các lượt trống"""
+        while self._han and self._han[0][0] <= bay_gio:
+            han, user_id = heapq.heappop(self._han)
+            muc = self._dang_mua.get(user_id)
+            if muc is not None and muc[0] == han:
+                self._thu_hoi(user_id, bay_gio)
+
+        while len(self._dang_mua) < self.so_luot and self._hang_cho:
+            user_id, (so_thu_tu, lan_hoi) = self._hang_cho.popitem(last=False)
+            self._so_da_goi = so_thu_tu
+            if bay_gio - lan_hoi <= BO_HANG_SAU:
+                self._cap_luot(user_id, bay_gio + THOI_GIAN_NHAN_LUOT, bay_gio)
+
+    def _dang_cho(self, user_id: int) -> Dict[str, Any]:
+        vi_tri = max(int(self._hang_cho[user_id][0] - self._so_da_goi), 1)
+        return {
+            'admitted': False,
+            'position': vi_tri,
+            'eta_seconds': math.ceil(vi_tri * self._thoi_gian_mua_tb / self.so_luot),
+            'retry_after': KHOANG_HOI,
+        }
+
+    def vao(self, user_id: int, gia_han: bool = True, bay_gio: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Người dùng muốn chọn ghế. Đang có lượt: gia hạn (gia_han=False khi chỉ hỏi từ
+        trang chờ); đang xếp hàng: trả vị trí; chưa có: vào ngay nếu còn lượt và không ai
+        xếp hàng, ngược lại xếp cuối hàng
+        """
+        bay_gio = time.monotonic() if bay_gio is None else bay_gio
+        self._don_dep(bay_gio)
+
+        muc = self._dang_mua.get(user_id)
+        if muc is not None:
+            if gia_han:
+                self._cap_luot(user_id, bay_gio + THOI_GIAN_KHONG_THAO_TAC, muc[1])
+            return {'admitted': True}
+
+        if user_id in self._hang_cho:
+            self._hang_cho[user_id][1] = bay_gio
+            return self._dang_cho(user_id)
+
+        if len(self._dang_mua) < self.so_luot and not self._hang_cho:
+            self._cap_luot(user_id, bay_gio + THOI_GIAN_KHONG_THAO_TAC, bay_gio)
+            return {'admitted': True}
+
+        self._hang_cho[user_id] = [self._so_tiep_theo, bay_gio]
+        self._so_tiep_theo += 1
+        return self._dang_cho(user_id)
+
+    def gia_han(self, user_id: int, bay_gio: Optional[float] = None):
+        """
+        Người đang có lượt vẫn xem sơ đồ ghế (khung SSE, poll get-seats): gia hạn lượt.
+        Chỉ đẩy hạn mới khi đã qua nửa thời hạn để heap không phình theo số khung SSE
+        """
+        bay_gio = time.monotonic() if bay_gio is None else bay_gio
+        self._don_dep(bay_gio)
+        muc = self._dang_mua.get(user_id)
+        if muc is not None and muc[0] - bay_gio < THOI_GIAN_KHONG_THAO_TAC / 2:
+            self._cap_luot(user_id, bay_gio + THOI_GIAN_KHONG_THAO_TAC, muc[1])
+
+    def roi(self, user_id: int, bay_gio: Optional[float] = None):
+        bay_gio = time.monotonic() if bay_gio is None else bay_gio
+        if user_id in self._dang_mua:
+            self._thu_hoi(user_id, bay_gio)
+        else:
+            self._hang_cho.pop(user_id, None)
+        self._don_dep(bay_gio)
+
+    def so_nguoi(self, bay_gio: Optional[float] = None) -> Tuple[int, int]:
+        """(đang chọn ghế, đang xếp hàng)"""
+        self._don_dep(time.monotonic() if bay_gio is None else bay_gio)
+        return len(self._dang_mua), len(self._hang_cho)
+
+    def rong(self) -> bool:
+        return not self._dang_mua and not self._hang_cho
+
+
+class PhongChoSuatChieu:
+    """
+    Class PhòngChờSuấtChiếu - Phòng chờ của mọi suất chiếu, tạo khi có người vào đầu tiên
+    Methods:
+        + Vao()/GiaHan()/Roi(): Như PhongCho, theo mã suất chiếu
+        + ThongKe(): Số người đang chọn ghế/xếp hàng theo suất chiếu
+        + XoaTatCa(): Bỏ mọi phòng chờ
+    """
+
+    def __init__(self, so_luot: int):
+        self.so_luot = so_luot
+        self._phong: Dict[int, PhongCho] = {}
+        self._khoa = threading.Lock()
+
+    def vao(self, masuatchieu: int, user_id: int, gia_han: bool = True) -> Dict[str, Any]:
+        if self.so_luot <= 0:
+            return {'admitted': True}
+        with self._khoa:
+            phong = self._phong.get(masuatchieu)
+            if phong is None:
+                phong = self._phong[masuatchieu] = PhongCho(self.so_luot)
+            return phong.vao(user_id, gia_han=gia_han)
+
+    def gia_han(self, masuatchieu: int, user_id: int):
+        if self.so_luot <= 0:
+            return
+        with self._khoa:
+            phong = self._phong.get(masuatchieu)
+            if phong is not None:
+                phong.gia_han(user_id)
+
+    def roi(self, masuatchieu: int, user_id: int):
+        with self._khoa:
+            phong = self._phong.get(masuatchieu)
+            if phong is None:
+                return
+            phong.roi(user_id)
+            if phong.rong():
+                del self._phong[masuatchieu]
+
+    def thong_ke(self) -> Dict[int, Tuple[int, int]]:
+        """{mã suất chiếu: (đang chọn ghế, đang xếp hàng)}; bỏ các phòng đã hết người"""
+        with self._khoa:
+            ket_qua = {}
+            for masuatchieu, phong in list(self._phong.items()):
+                so_nguoi = phong.so_nguoi()
+                if phong.rong():
+                    del self._phong[masuatchieu]
+                else:
+                    ket_qua[masuatchieu] = so_nguoi
+            return ket_qua
+
+    def xoa_tat_ca(self):
+        with self._khoa:
+            self._phong.clear()
+
+
+phong_cho = PhongChoSuatChieu(SO_LUOT)
+
+
+def _so_nguoi_phong_cho():
+    thong_ke = phong_cho.thong_ke().values()
+    return {('shopping',): sum(a for a, _ in thong_ke), ('queued',): sum(q for _, q in thong_ke)}
+
+
+metrics.dang_ky(metrics.DocKhiXuat(
+    'cinema_waiting_room_users', 'Số người đang chọn ghế/xếp hàng trong phòng chờ (mọi suất chiếu)',
+    'gauge', ('state',), _so_nguoi_phong_cho))
@@ -43,6 +43,8 @@ CREATE TABLE IF NOT EXISTS showtimes (
     show_date TEXT,                           -- ngaychieu
     show_time TEXT,                           -- giochieu
     price REAL DEFAULT 75000,                 -- giave
+    seat_rows INTEGER,                        -- bố cục khi lưu ghế thưa (NULL = mỗi ghế một dòng seats)
+    seats_per_row INTEGER,
     FOREIGN KEY (movie_id) REFERENCES movies_info(id) ON DELETE CASCADE
 );
 
@@ -60,7 +62,7 @@ CREATE TABLE IF NOT EXISTS bookings (
     id INTEGER PRIMARY KEY AUTOINCREMENT,    -- mave / madat
     user_id INTEGER,                          -- maKH
     showtime_id INTEGER,                      -- masuatchieu
-    seat_id INTEGER,                          -- maghe (reference)
+    seat_id INTEGER,                          -- maghe (reference; âm = mã ghế ảo của suất chiếu lưu thưa)
     seat_number TEXT,                         -- maghe (display)
     price REAL,                               -- giave
     status TEXT DEFAULT 'confirmed',          -- trangthai (confirmed, cancelled, paid)
@@ -68,4 +70,57 @@ CREATE TABLE IF NOT EXISTS bookings (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
     FOREIGN KEY (showtime_id) REFERENCES showtimes(id) ON DELETE CASCADE,
     FOREIGN KEY (seat_id) REFERENCES seats(id) ON DELETE SET NULL
-);
\ No newline at end of file
+);
+
+-- ===== TRẠNG THÁI JOB NỀN (mốc đã xử lý của huy_ve_qua_gio, ...) =====
+CREATE TABLE IF NOT EXISTS job_state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+
+-- ===== INDEX (migration 2, xem backend-python/migrations.py) =====
+CREATE INDEX IF NOT EXISTS idx_seats_showtime ON seats(showtime_id, seat_number);
+CREATE INDEX IF NOT EXISTS idx_seats_held ON seats(held_until) WHERE status = 'held';
+CREATE INDEX IF NOT EXISTS idx_bookings_user_time ON bookings(user_id, booking_time);
+CREATE INDEX IF NOT EXISTS idx_bookings_showtime_status ON bookings(showtime_id, status);
+CREATE INDEX IF NOT EXISTS idx_showtimes_movie_date ON showtimes(movie_id, show_date, show_time);
+CREATE INDEX IF NOT EXISTS idx_showtimes_date_time ON showtimes(show_date, show_time);
+
+-- ===== TÌM KIẾM PHIM TOÀN VĂN (migration 3, nội dung đã bỏ dấu - xem backend-python/movie_search.py) =====
+CREATE VIRTUAL TABLE IF NOT EXISTS movies_fts USING fts5(
+    title, genre, director, cast_members, description,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+-- ===== INDEX PHÂN TRANG ADMIN (migration 4) =====
+CREATE INDEX IF NOT EXISTS idx_bookings_time ON bookings(booking_time);
+CREATE INDEX IF NOT EXISTS idx_bookings_status_time ON bookings(status, booking_time);
+
+-- ===== BỘ ĐẾM THỐNG KÊ TỔNG QUAN (migration 5, xem backend-python/counters.py) =====
+CREATE TABLE IF NOT EXISTS counters (
+    name TEXT PRIMARY KEY,                    -- tong_phim, tong_suat_chieu, tong_ve_dat, tong_doanh_thu, tong_khach_hang
+    value REAL NOT NULL DEFAULT 0
+);
+
+-- ===== TỔNG HỢP DOANH THU THEO PHIM VÀ NGÀY CHIẾU (migration 6, xem backend-python/revenue.py) =====
+CREATE TABLE IF NOT EXISTS revenue_daily (
+    movie_id INTEGER NOT NULL,
+    show_date TEXT NOT NULL,
+    tickets_sold INTEGER NOT NULL DEFAULT 0,  -- vé đang 'confirmed'
+    revenue REAL NOT NULL DEFAULT 0,          -- tổng giá các vé đang 'confirmed'
+    cancellations INTEGER NOT NULL DEFAULT 0, -- vé 'cancelled'
+    PRIMARY KEY (movie_id, show_date)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_revenue_daily_date ON revenue_daily(show_date);
+
+-- ===== LƯU GHẾ THƯA (migration 7, xem backend-python/seat_map.py) =====
+-- Suất chiếu có seat_rows/seats_per_row chỉ lưu các ghế đang giữ/đã đặt
+CREATE UNIQUE INDEX IF NOT EXISTS idx_theaters_name ON theaters(name);
+INSERT OR IGNORE INTO theaters (name, seat_rows, seats_per_row, total_seats) VALUES
+    ('Rạp 1', 5, 10, 50), ('Rạp 2', 5, 10, 50), ('Rạp 3', 5, 10, 50);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_seats_showtime_seat ON seats(showtime_id, seat_number);
+DROP INDEX IF EXISTS idx_seats_showtime;
+
+PRAGMA user_version = 7;